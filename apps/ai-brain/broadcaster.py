@@ -0,0 +1,174 @@
+import json
+import time
+import asyncio
+from collections import deque
+
+BROADCAST_QUEUE_SIZE = 64      # Số message tối đa chờ gửi cho mỗi client
+SEND_TIMEOUT = 5.0             # Giây: một lần ws.send lâu hơn -> coi là client treo
+SLOW_CONSUMER_TIMEOUT = 10.0   # Giây: hàng đợi đầy liên tục quá lâu -> ngắt client
+BROADCAST_HARD_LIMIT = 2       # x max_queue: reliable vượt mức này -> ngắt client ngay (không bỏ âm thầm)
+
+# Chính sách theo loại message:
+#   drop     - chỉ giữ bản mới nhất, được phép mất (telemetry)
+#   coalesce - gộp theo key, bản mới thay bản cũ còn trong hàng đợi (trạng thái)
+#   reliable - luôn giao, đúng thứ tự (lời thoại, sự kiện)
+MESSAGE_POLICIES = {
+    "telemetry": "drop",
+    "station_status": "coalesce",
+    "set_emotion": "coalesce",
+    "voice_response": "reliable",
+    "voice_response_chunk": "reliable",
+    "event": "reliable",
+}
+
+
+def _policy_for(kind):
+    return MESSAGE_POLICIES.get(kind, "reliable")
+
+
+class ClientChannel:
+    """Hàng đợi gửi + writer task riêng cho một WebSocket client"""
+
+    def __init__(self, ws, on_evict, max_queue=BROADCAST_QUEUE_SIZE):
+        self.ws = ws
+        self.max_queue = max_queue
+        self._on_evict = on_evict
+        self._queue = deque()   # [key, payload]
+        self._index = {}        # key -> entry còn trong hàng đợi (drop/coalesce)
+        self._ready = asyncio.Event()
+        self._full_since = None
+        self.closed = False
+        self.stats = {
+            "sent": 0, "dropped": 0, "coalesced": 0,
+            "max_depth": 0, "send_ms_avg": 0.0, "send_ms_max": 0.0,
+        }
+        self.writer = asyncio.create_task(self._run())
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+    def offer(self, payload, kind=None, key=None, resync=None):
+        """Đưa message vào hàng đợi; trả về False nếu đã thay thế/bỏ một message trước đó"""
+        if self.closed:
+            return False
+        policy = _policy_for(kind)
+        key = key or kind
+
+        if policy in ("drop", "coalesce") and key in self._index:
+            entry = self._index[key]
+            # Bản cũ chưa kịp gửi: thay bằng bản mới (delta bị mất thì gửi lại full frame)
+            entry[1] = resync() if resync is not None else payload
+            self.stats["coalesced" if policy == "coalesce" else "dropped"] += 1
+            return False
+
+        if len(self._queue) >= self.max_queue:
+            if policy == "drop":
+                self.stats["dropped"] += 1
+                return False
+            if len(self._queue) >= self.max_queue * BROADCAST_HARD_LIMIT:
+                self.evict("queue overflow")
+                return False
+            if self._full_since is None:
+                self._full_since = time.monotonic()
+            elif time.monotonic() - self._full_since > SLOW_CONSUMER_TIMEOUT:
+                self.evict("queue full")
+                return False
+        else:
+            self._full_since = None
+
+        entry = [key, payload]
+        self._queue.append(entry)
+        if policy in ("drop", "coalesce"):
+            self._index[key] = entry
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self._queue))
+        self._ready.set()
+        return True
+
+    def evict(self, reason):
+        if self.closed:
+            return
+        print(f"🐢 Evicting slow client {getattr(self.ws, 'remote_address', '?')}: {reason}")
+        self.close()
+        asyncio.create_task(self.ws.close())
+        self._on_evict(self.ws)
+
+    def close(self):
+        self.closed = True
+        self._queue.clear()
+        self._index.clear()
+        if self.writer is not asyncio.current_task():
+            self.writer.cancel()
+
+    async def _run(self):
+        while not self.closed:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            entry = self._queue.popleft()
+            if self._index.get(entry[0]) is entry:
+                del self._index[entry[0]]
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(self.ws.send(entry[1]), SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.evict("send timeout")
+                return
+            except Exception:
+                self.close()
+                self._on_evict(self.ws)
+                return
+            ms = (time.monotonic() - started) * 1000
+            self.stats["sent"] += 1
+            self.stats["send_ms_avg"] = round(self.stats["send_ms_avg"] * 0.9 + ms * 0.1, 2)
+            self.stats["send_ms_max"] = round(max(self.stats["send_ms_max"], ms), 2)
+
+
+class Broadcaster:
+    """Quản lý các client WebSocket: gửi đồng thời, không để một client chậm chặn cả Hub"""
+
+    def __init__(self, max_queue=BROADCAST_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self.channels = {}
+        self.on_evict = None  # Hook: dọn dẹp thêm khi client bị ngắt
+
+    def __bool__(self):
+        return bool(self.channels)
+
+    def add(self, ws):
+        channel = ClientChannel(ws, self._evicted, self.max_queue)
+        self.channels[ws] = channel
+        return channel
+
+    def remove(self, ws):
+        channel = self.channels.pop(ws, None)
+        if channel:
+            channel.close()
+
+    def _evicted(self, ws):
+        self.channels.pop(ws, None)
+        if self.on_evict:
+            self.on_evict(ws)
+
+    def send(self, ws, payload, kind=None, key=None, resync=None):
+        channel = self.channels.get(ws)
+        if channel is None:
+            return False
+        return channel.offer(payload, kind, key, resync)
+
+    def publish(self, data):
+        """Serialise một lần và đưa vào hàng đợi của mọi client"""
+        if not self.channels:
+            return
+        kind = data.get("type")
+        key = f"{kind}:{data.get('station_id', '')}"
+        message = json.dumps(data)
+        for channel in list(self.channels.values()):
+            channel.offer(message, kind, key)
+
+    def metrics(self):
+        return {
+            str(getattr(ws, "remote_address", id(ws))): {"depth": ch.depth, **ch.stats}
+            for ws, ch in self.channels.items()
+        }
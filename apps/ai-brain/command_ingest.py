@@ -0,0 +1,293 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from db_client import db_gateway, get_async_db
+
+# --- Config ---
+COMMAND_TARGET = "ev3_robot"
+INGEST_MODE = os.getenv("COMMAND_INGEST_MODE", "realtime")  # "realtime" | "poll"
+POLL_MIN_INTERVAL = 0.05   # Khi có lệnh: poll nhanh như cũ
+POLL_MAX_INTERVAL = 2.0    # Khi rảnh: giãn dần tới 2s
+SAFETY_SWEEP_INTERVAL = 30.0  # Realtime mode: quét bù định kỳ phòng lỡ sự kiện
+REALTIME_RETRY_INTERVAL = 60.0
+BURST_LIMIT = 5  # Quá 5 lệnh tồn đọng -> chỉ giữ 3 lệnh mới nhất
+BURST_KEEP = 3
+ACK_BATCH_SIZE = 20       # Đủ 20 trạng thái -> ghi ngay
+ACK_FLUSH_INTERVAL = 0.2  # Hoặc tối đa 200ms sau trạng thái đầu tiên
+ACK_MAX_ATTEMPTS = 3
+ACK_RETRY_BASE = 0.5  # Giây chờ trước lần ghi lại đầu tiên, nhân đôi mỗi lần thất bại
+ACK_RETRY_MAX = 5.0
+COMMAND_MAX_AGE = float(os.getenv("COMMAND_MAX_AGE", "30"))  # Giây: lệnh pending cũ hơn -> "expired", không chạy lại
+
+
+def _parse_ts(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _created_at(row):
+    created = _parse_ts(row.get("created_at"))
+    if created and created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return created
+
+
+class AckBatcher:
+    """Gom các cập nhật trạng thái command_queue thành một lệnh update lọc theo in_("id", ...)"""
+
+    def __init__(self, max_batch=ACK_BATCH_SIZE, flush_interval=ACK_FLUSH_INTERVAL):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending = {}   # status -> [id, ...]
+        self._attempts = {}  # id -> số lần ghi thất bại
+        self._has_items = asyncio.Event()
+        self._full = asyncio.Event()
+        self.history = deque(maxlen=50)  # Kết quả từng batch gần nhất
+        self.abandoned = deque(maxlen=50)  # ID đã bỏ ghi trạng thái sau ACK_MAX_ATTEMPTS (vẫn "pending" trên DB)
+        self.stats = {"batches": 0, "rows": 0, "failed_batches": 0, "dropped_rows": 0}
+
+    def mark(self, cmd_id, status):
+        self._pending.setdefault(status, []).append(cmd_id)
+        self._has_items.set()
+        if sum(len(ids) for ids in self._pending.values()) >= self.max_batch:
+            self._full.set()
+
+    async def run(self):
+        while True:
+            await self._has_items.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        self._has_items.clear()
+        self._full.clear()
+        for status, ids in pending.items():
+            started = time.monotonic()
+            query = db_gateway.table("command_queue").update({"status": status}).in_("id", ids)
+            try:
+                await db_gateway.execute(query)
+                ok, error = True, None
+                for cmd_id in ids:
+                    self._attempts.pop(cmd_id, None)
+            except Exception as e:
+                ok, error = False, str(e)
+                self.stats["failed_batches"] += 1
+                self._requeue(status, ids)
+                print(f"⚠️ Ack batch failed ({status} x{len(ids)}): {e}")
+
+            self.stats["batches"] += 1
+            self.stats["rows"] += len(ids) if ok else 0
+            self.history.append({
+                "status": status,
+                "count": len(ids),
+                "ok": ok,
+                "error": error,
+                "ms": round((time.monotonic() - started) * 1000, 1),
+                "at": time.time(),
+            })
+
+    def _requeue(self, status, ids):
+        for cmd_id in ids:
+            attempts = self._attempts.get(cmd_id, 0) + 1
+            if attempts >= ACK_MAX_ATTEMPTS:
+                self._attempts.pop(cmd_id, None)
+                self.stats["dropped_rows"] += 1
+                self.abandoned.append({"id": cmd_id, "status": status, "at": time.time()})
+                print(f"❌ Ack given up: command {cmd_id} -> {status} (row stays pending)")
+                continue
+            self._attempts[cmd_id] = attempts
+            # Back-off luỹ thừa: không dồn cả ACK_MAX_ATTEMPTS lần ghi vào cùng một sự cố mạng
+            delay = min(ACK_RETRY_BASE * 2 ** (attempts - 1), ACK_RETRY_MAX)
+            asyncio.get_running_loop().call_later(delay, self.mark, cmd_id, status)
+
+
+class CommandIngestor:
+    """Nhận lệnh từ bảng command_queue: ưu tiên Realtime (push), dự phòng polling thích ứng"""
+
+    def __init__(self, dispatch, target=COMMAND_TARGET, mode=INGEST_MODE):
+        self.dispatch = dispatch  # dispatch(command, params) -> gửi ra MQTT
+        self.target = target
+        self.mode = mode
+        self._inbox = asyncio.Queue()
+        self._handled = OrderedDict()  # Chống xử lý trùng giữa Realtime và quét bù
+        self._async_db = None
+        self._channel = None
+        self._channel_failed = False
+        self.acks = AckBatcher()
+        self.stats = {
+            "mode": mode,
+            "db_queries": 0,
+            "realtime_events": 0,
+            "dispatched": 0,
+            "skipped": 0,
+            "expired": 0,  # Lệnh quá COMMAND_MAX_AGE (vd. tồn từ lần chạy trước): bỏ, không phát lại
+            "stale_rows": 0,  # Dòng vẫn pending nhưng đã xử lý (ack chưa ghi được)
+            "last_latency_ms": None,
+        }
+
+    async def run(self):
+        print(f"📋 Command Ingestor Active (mode: {self.mode})")
+        await asyncio.gather(self._ingest(), self.acks.run())
+
+    async def _ingest(self):
+        while True:
+            if self.mode == "realtime" and await self._subscribe():
+                await self._run_realtime()
+                await self._unsubscribe()
+                print("⚠️ Realtime channel lost, falling back to polling")
+            await self._run_poll(retry_realtime=self.mode == "realtime")
+
+    # --- Realtime (push) ---
+    async def _subscribe(self):
+        try:
+            if self._async_db is None:
+                self._async_db = await get_async_db()
+            self._channel_failed = False
+            self._channel = self._async_db.channel(f"command_queue:{self.target}")
+            self._channel.on_postgres_changes(
+                "INSERT",
+                self._on_insert,
+                table="command_queue",
+                schema="public",
+                filter=f"target=eq.{self.target}",
+            )
+            await self._channel.subscribe(self._on_channel_state)
+            self.stats["mode"] = "realtime"
+            print("⚡ Realtime subscribed: command_queue")
+            return True
+        except Exception as e:
+            print(f"⚠️ Realtime unavailable: {e}")
+            self._channel = None
+            return False
+
+    async def _unsubscribe(self):
+        if self._channel is not None:
+            try:
+                await self._async_db.remove_channel(self._channel)
+            except Exception:
+                pass
+            self._channel = None
+
+    def _on_insert(self, payload):
+        record = payload.get("data", {}).get("record")
+        if record and record.get("status") == "pending":
+            self.stats["realtime_events"] += 1
+            self._inbox.put_nowait(record)
+
+    def _on_channel_state(self, state, error=None):
+        if str(getattr(state, "value", state)) in ("CHANNEL_ERROR", "TIMED_OUT", "CLOSED"):
+            self._channel_failed = True
+            self._inbox.put_nowait(None)  # Đánh thức vòng lặp
+            if error:
+                print(f"⚠️ Realtime channel error: {error}")
+
+    async def _run_realtime(self):
+        # Quét bù lệnh đã vào hàng đợi trước khi subscribe xong
+        await self._sweep()
+        while not self._channel_failed:
+            try:
+                first = await asyncio.wait_for(self._inbox.get(), timeout=SAFETY_SWEEP_INTERVAL)
+            except asyncio.TimeoutError:
+                await self._sweep()
+                continue
+
+            # Gom các lệnh đến cùng lúc (burst) để áp dụng logic bỏ lệnh cũ
+            rows = [first] if first else []
+            while not self._inbox.empty():
+                row = self._inbox.get_nowait()
+                if row:
+                    rows.append(row)
+            await self._process(rows)
+
+    # --- Polling (fallback) ---
+    async def _run_poll(self, retry_realtime=False):
+        self.stats["mode"] = "poll"
+        interval = POLL_MIN_INTERVAL
+        started = time.monotonic()
+        while True:
+            if retry_realtime and time.monotonic() - started > REALTIME_RETRY_INTERVAL:
+                return
+            try:
+                new_rows = await self._process(await self._fetch_pending())
+                # Back-off: rảnh thì giãn chu kỳ, có lệnh mới thì quay lại poll nhanh
+                # (dòng pending đã xử lý nhưng ack lỗi không tính là có lệnh)
+                interval = POLL_MIN_INTERVAL if new_rows else min(interval * 2, POLL_MAX_INTERVAL)
+                await asyncio.sleep(interval)
+            except Exception as e:
+                print(f"⚠️ Supabase Error: {e}")
+                await asyncio.sleep(1)
+
+    # --- Shared ---
+    async def _sweep(self):
+        try:
+            await self._process(await self._fetch_pending())
+        except Exception as e:
+            print(f"⚠️ Supabase Error: {e}")
+
+    async def _fetch_pending(self):
+        query = (
+            db_gateway.table("command_queue")
+            .select("*")
+            .eq("status", "pending")
+            .eq("target", self.target)
+            .order("created_at")
+        )
+        self.stats["db_queries"] += 1
+        response = await db_gateway.execute(query)
+        return response.data or []
+
+    def _mark_handled(self, cmd_id):
+        self._handled[cmd_id] = True
+        while len(self._handled) > 512:
+            self._handled.popitem(last=False)
+
+    async def _process(self, rows):
+        """Dispatch các lệnh chưa xử lý; trả về số lệnh mới"""
+        total = len(rows)
+        rows = [r for r in rows if r["id"] not in self._handled]
+        self.stats["stale_rows"] += total - len(rows)
+        if not rows:
+            return 0
+        new_rows = len(rows)
+        rows.sort(key=lambda r: r.get("created_at") or "")
+        for r in rows:
+            self._mark_handled(r["id"])
+
+        # Lệnh cũ (khởi động lại sau khi tắt, ack chưa ghi được) không được phát lại cho robot
+        now = datetime.now(timezone.utc)
+        fresh = []
+        for r in rows:
+            created = _created_at(r)
+            if created and (now - created).total_seconds() > COMMAND_MAX_AGE:
+                self.acks.mark(r["id"], "expired")
+                self.stats["expired"] += 1
+            else:
+                fresh.append(r)
+        if len(fresh) < len(rows):
+            print(f"⏱️ Expired {len(rows) - len(fresh)} command(s) older than {COMMAND_MAX_AGE}s")
+        rows = fresh
+
+        if len(rows) > BURST_LIMIT:
+            to_skip = rows[:-BURST_KEEP]
+            rows = rows[-BURST_KEEP:]
+            for s in to_skip:
+                self.acks.mark(s["id"], "skipped")
+            self.stats["skipped"] += len(to_skip)
+
+        for cmd in rows:
+            self.dispatch(cmd["command"], cmd.get("params") or {})
+            self.stats["dispatched"] += 1
+            created = _created_at(cmd)
+            if created:
+                latency = (datetime.now(timezone.utc) - created).total_seconds() * 1000
+                self.stats["last_latency_ms"] = round(latency, 1)
+            self.acks.mark(cmd["id"], "completed")
+        return new_rows
@@ -1,15 +1,28 @@
 import os
-import time
+import sys
 import json
 import asyncio
 import socket
+import uuid
 import websockets
-import paho.mqtt.client as mqtt
-from db_client import db
+from db_client import db_gateway
 from dotenv import load_dotenv
-from threading import Thread
 import traceback
-from gemini_service import gemini_service
+from gemini_service import gemini_service, GEMINI_STREAM
+from intent_engine import intent_engine
+from response_parser import response_parser
+from command_ingest import CommandIngestor
+from profile_cache import profile_cache, build_config_message
+from telemetry_stream import TelemetryStream
+from broadcaster import Broadcaster
+from mqtt_bridge import MqttBridge
+from mqtt_hub import AsyncMqttHub
+from command_scheduler import CommandScheduler, classify_command
+from site_approach import SiteApproach
+
+# Codec lệnh dùng chung với EV3 (nguồn duy nhất: hardware/ev3/command_codec.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "hardware", "ev3"))
+import command_codec
 
 # Load env
 load_dotenv()
@@ -20,8 +33,12 @@ MQTT_PORT = 1883
 MQTT_TOPIC_TELEMETRY = "robot/+/telemetry"
 MQTT_TOPIC_STATUS = "robot/+/status"
 MQTT_TOPIC_CFG = "wro/robot/config"
+CONFIG_PUBLISH_TIMEOUT = 10.0  # Giây chờ broker nhận config (mất broker: outbox báo lỗi sau MQTT_OUTBOX_TTL)
+MQTT_TOPIC_VISION = "wro/vision/events"  # site_discovered / marker_pose từ vision_service.py
+VISION_LANG = os.getenv("VISION_LANG", "vi-VN")  # Ngôn ngữ kể chuyện khi vision tự phát hiện di sản
 WS_PORT = 8765
 DEFAULT_MOBILE_ROBOT = "mobile_guide"
+EV3_WIRE_FORMAT = os.getenv("EV3_WIRE_FORMAT", "text")  # "text" | "binary"
 
 # Global Telemetry State
 current_telemetry = {
@@ -43,126 +60,215 @@ def get_local_ip():
         s.close()
     return ip
 
-# Init MQTT
-mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-
-def on_connect(client, userdata, flags, reason_code, properties=None):
-    if reason_code == 0:
-        print(f"✅ Connected to MQTT Broker")
-        client.subscribe(MQTT_TOPIC_TELEMETRY)
-        client.subscribe(MQTT_TOPIC_STATUS)
-        send_current_config()
-    else:
-        print(f"❌ MQTT Connect Failed: {reason_code}")
+# Init MQTT (aiomqtt, chạy chung event loop với WebSocket server)
+async def on_mqtt_connect():
+    # Broker có thể đã khởi động lại và mất retained config -> publish lại
+    await send_current_config(force=True)
 
-def on_message(client, userdata, msg):
-    global current_telemetry
+def on_message(topic, payload):
+    """Parse message MQTT rồi chuyển cho MqttBridge (gộp telemetry, phát trạng thái)"""
     try:
-        topic = msg.topic
-        payload_str = msg.payload.decode()
-        data = json.loads(payload_str)
-        
-        if "telemetry" in topic:
-            current_telemetry.update(data)
-        elif "status" in topic:
-            target_id = topic.split('/')[1]
-            print(f"🔔 Status from [{target_id}]: {data}")
-            # Broadcast to web dashboard
-            asyncio.run_coroutine_threadsafe(
-                broadcast_event({
-                    "type": "station_status",
-                    "station_id": target_id,
-                    "status": data.get("status"),
-                    "action": data.get("action")
-                }), 
-                asyncio.get_event_loop()
-            )
+        mqtt_bridge.submit(topic, json.loads(payload.decode()))
     except Exception as e:
-        print(f"⚠️ MQTT Msg Error [{msg.topic}]: {e}")
+        print(f"⚠️ MQTT Msg Error [{topic}]: {e}")
 
-mqtt_client.on_connect = on_connect
-mqtt_client.on_message = on_message
+def on_station_status(target_id, data):
+    """Chạy trên event loop: phát trạng thái trạm tới web dashboard"""
+    print(f"🔔 Status from [{target_id}]: {data}")
+    broadcaster.publish({
+        "type": "station_status",
+        "station_id": target_id,
+        "status": data.get("status"),
+        "action": data.get("action")
+    })
 
-try:
-    mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    mqtt_client.loop_start()
-except Exception as e:
-    print(f"⚠️ MQTT Offline: {e}")
+mqtt_bridge = MqttBridge(current_telemetry, on_station_status)
+mqtt_hub = AsyncMqttHub(
+    MQTT_BROKER,
+    MQTT_PORT,
+    [MQTT_TOPIC_TELEMETRY, MQTT_TOPIC_STATUS, MQTT_TOPIC_VISION],
+    on_message,
+    on_connect=on_mqtt_connect,
+)
 
-def get_active_profile():
-    try:
-        response = db.table("robot_profiles").select("*").eq("is_active", True).single().execute()
-        return response.data
-    except:
-        return None
+async def get_active_profile():
+    return await profile_cache.get()
 
-def send_current_config():
-    profile = get_active_profile()
-    if profile:
-        config_msg = json.dumps({
-            "name": profile.get("name", "Robot"),
-            "motor_ports": profile.get('motor_ports', {}),
-            "sensor_config": profile.get('sensor_config', {}),
-            "speeds": profile.get('speed_profile', {})
-        })
-        mqtt_client.publish(MQTT_TOPIC_CFG, config_msg, retain=True)
-        print(f"⚙️ Sync Profile: {profile['name']}")
+async def send_current_config(force=False):
+    """Publish cấu hình (retained) chỉ khi nội dung thay đổi, tránh EV3 khởi tạo lại motor"""
+    profile = await get_active_profile()
+    if profile and profile_cache.needs_publish(profile, force):
+        config_msg = build_config_message(profile)
+        try:
+            published = await asyncio.wait_for(
+                mqtt_hub.publish(MQTT_TOPIC_CFG, config_msg, qos=1, retain=True), CONFIG_PUBLISH_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            published = False
+        if published:
+            profile_cache.mark_published(profile)
+            print(f"⚙️ Sync Profile: {profile['name']}")
 
-def publish_to_robot(target_id, message):
+def publish_to_robot(target_id, message, urgent=False):
     """Gửi lệnh tới một robot hoặc trạm cụ thể qua MQTT"""
     # topic = f"robot/{target_id}/command"
     topic = "wro/robot/commands" # Fixed topic for current EV3 Code
     payload = json.dumps(message) if isinstance(message, dict) else message
-    mqtt_client.publish(topic, payload)
+    # Không chặn: nếu broker đang mất kết nối, lệnh nằm trong outbox và gửi khi kết nối lại
+    future = mqtt_hub.publish(topic, payload, urgent=urgent)
     print(f"📡 MQTT [OUT] -> {topic}: {payload}")
+    return future
+
+def encode_ev3_command(cmd, params=None):
+    """Mã hoá lệnh cho EV3 qua command_codec; None nếu tham số không hợp lệ"""
+    if cmd not in command_codec.COMMANDS:
+        return cmd  # Lệnh ngoài bảng codec: giữ nguyên tên như trước
+    try:
+        return command_codec.encode(cmd, params, binary=EV3_WIRE_FORMAT == "binary")
+    except command_codec.CommandError as e:
+        print(f"⚠️ Invalid EV3 command [{cmd}]: {e}")
+        return None
+
+# Gộp lệnh move dồn dập (bàn phím/joystick), stop/emergency luôn đi thẳng
+command_scheduler = CommandScheduler(
+    publish_to_robot,
+    send_urgent=lambda target_id, payload: publish_to_robot(target_id, payload, urgent=True),
+)
 
-def execute_mqtt(mqtt_msg, target_id=DEFAULT_MOBILE_ROBOT):
-    """Hàm tương thích ngược, mặc định gửi tới mobile robot"""
-    publish_to_robot(target_id, mqtt_msg)
+def schedule_ev3_command(cmd, params=None, target_id=DEFAULT_MOBILE_ROBOT):
+    payload = encode_ev3_command(cmd, params)
+    if payload is not None:
+        command_scheduler.submit(target_id, classify_command(cmd, params), payload)
+
+# Tiếp cận di sản theo khoảng cách từ camera (VISION_APPROACH_SPEED=0: dừng ngay như cũ)
+site_approach = SiteApproach(
+    move=lambda speed: schedule_ev3_command("move", {"direction": "forward", "speed": speed}),
+    stop=lambda: schedule_ev3_command("stop"),
+)
 
 # --- WebSocket Server (High Speed Bridge) ---
-connected_clients = set()
+# Mỗi client có hàng đợi + writer riêng (xem broadcaster.py)
+broadcaster = Broadcaster()
 
-async def broadcast_telemetry():
-    print("📡 Telemetry Broadcaster Started")
-    global current_telemetry
-    while True:
-        if connected_clients:
-            telemetry = json.dumps({
-                "type": "telemetry",
-                "battery": current_telemetry["battery"],
-                "pos": current_telemetry["pos"],
-                "latency": current_telemetry["latency"]
-            })
-            
-            # Broadcast to all
-            disconnected = set()
-            active_clients = list(connected_clients) # Snapshot
-            for ws in active_clients:
-                try:
-                    await ws.send(telemetry)
-                except Exception as e:
-                    disconnected.add(ws)
-            
-            for ws in disconnected:
-                connected_clients.discard(ws)
-                
-        await asyncio.sleep(1.0) # Send every 1s
+# Telemetry: delta + tần số riêng từng client (xem telemetry_stream.py)
+telemetry_stream = TelemetryStream(current_telemetry, broadcaster)
+broadcaster.on_evict = telemetry_stream.unsubscribe
 
 async def broadcast_event(data):
-    """Gửi một sự kiện tới tất cả các client đang kết nối WebSocket"""
-    if not connected_clients:
+    """Gửi một sự kiện tới tất cả các client (chỉ xếp hàng, không chờ client chậm)"""
+    broadcaster.publish(data)
+
+def spawn_ai_task(tasks, coro):
+    task = asyncio.create_task(coro)
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    return task
+
+async def narrate_site(site_id, site_name, lang, arrived=None):
+    """Kể chuyện về di sản rồi kích hoạt trạm tương ứng (chờ robot dừng hẳn nếu có arrived)"""
+    ai_data = await gemini_service.describe_site(site_name, lang)
+    if arrived is not None:
+        await arrived.wait()  # Lời kể đã tải sẵn trong lúc robot còn đang tiến tới
+    if ai_data and ai_data.get("text"):
+        await broadcast_event({
+            "type": "voice_response",
+            "text": ai_data["text"]
+        })
+
+    # 🤖 TRIGGER STATION ACTION (Phase 7 Orchestration)
+    # Giả sử tên trạm phần cứng trùng với site_id
+    publish_to_robot(site_id, {"action": "perform_intro"})
+
+async def announce_site(site_id, site_name, lang, tasks, arrived=None, **extra):
+    """Phát sự kiện phát hiện di sản (Quiz & Map) và kể chuyện chạy nền"""
+    print(f"📍 Station Discovered: {site_id}")
+    await broadcast_event({
+        "type": "event",
+        "event": "site_discovered",
+        "station_id": site_id,
+        "site_name": site_name,
+        **extra
+    })
+    # 💡 Automated AI Storytelling + station action chạy nền (không chặn lệnh khác)
+    spawn_ai_task(tasks, narrate_site(site_id, site_name, lang, arrived))
+
+vision_tasks = set()  # Lượt kể chuyện khởi phát từ camera (không thuộc client WebSocket nào)
+
+def on_vision_event(data):
+    """Chạy trên event loop (MqttBridge): sự kiện có cấu trúc từ vision_service.py"""
+    if data.get("type") == "marker_pose":
+        site_approach.on_pose(data.get("site_id"), data.get("distance_m"))
+    elif data.get("type") == "site_discovered":
+        site_id = data.get("site_id")
+        distance = data.get("distance_m")
+        arrived = site_approach.start(site_id, distance)
+        spawn_ai_task(vision_tasks, announce_site(
+            site_id, data.get("site_name", site_id), VISION_LANG, vision_tasks, arrived,
+            source="vision", marker_id=data.get("marker_id"),
+            distance_m=distance, bearing_deg=data.get("bearing_deg"),
+        ))
+
+mqtt_bridge.route(MQTT_TOPIC_VISION, on_vision_event)
+
+def execute_move_intent(move_intent):
+    """Thực thi ý định di chuyển từ câu trả lời AI (nếu có)"""
+    if move_intent in ["forward", "backward", "stop"]:
+        schedule_ev3_command("move", {"direction": move_intent, "speed": 100})
+
+async def answer_voice_command(text, lang, history):
+    """Hỏi Gemini, thực thi ý định di chuyển (nếu có) và phát câu trả lời cho Tablet TTS"""
+    if GEMINI_STREAM:
+        await stream_voice_answer(text, lang, history)
         return
-    message = json.dumps(data)
-    for client in connected_clients.copy():
-        try:
-            await client.send(message)
-        except:
-            connected_clients.discard(client)
+
+    ai_data = await gemini_service.get_response(text, lang, history)
+    if ai_data:
+        response_text = ai_data.get("text", "")
+        execute_move_intent(ai_data.get("robot_move"))
+        
+        # Broadcast text response for Tablet TTS
+        if response_text:
+            await broadcast_event({
+                "type": "voice_response",
+                "text": response_text
+            })
+
+async def stream_voice_answer(text, lang, history):
+    """Chế độ stream: gửi từng câu (voice_response_chunk) để Tablet nói ngay câu đầu,
+    cuối cùng gửi voice_response đầy đủ (streamed=True) cho phụ đề/lịch sử và client cũ"""
+    stream_id = uuid.uuid4().hex[:8]
+    seq = 0
+    moved = False
+    async for kind, value in gemini_service.stream_response(text, lang, history):
+        if kind == "move" and not moved:
+            moved = True
+            execute_move_intent(value)
+        elif kind == "text":
+            await broadcast_event({
+                "type": "voice_response_chunk",
+                "stream_id": stream_id,
+                "seq": seq,
+                "text": value
+            })
+            seq += 1
+        elif kind == "done":
+            if not moved:
+                execute_move_intent(value.get("robot_move"))
+            if value.get("text"):
+                await broadcast_event({
+                    "type": "voice_response",
+                    "text": value["text"],
+                    "emotion": value.get("emotion"),
+                    "stream_id": stream_id,
+                    "streamed": seq > 0
+                })
 
 async def ws_handler(websocket):
     print(f"🔗 Client Connected: {websocket.remote_address}")
-    connected_clients.add(websocket)
+    broadcaster.add(websocket)
+    telemetry_stream.subscribe(websocket)
+    ai_tasks = set()     # Các lượt AI đang chạy của client này (huỷ khi client ngắt)
+    voice_tasks = set()  # Riêng lượt hỏi đáp bằng giọng nói (huỷ khi có lệnh dừng khẩn)
     try:
         async for message in websocket:
             try:
@@ -170,39 +276,14 @@ async def ws_handler(websocket):
                 cmd = data.get('command')
                 params = data.get('params', {})
                 
-                # Biến đổi lệnh JSON thành chuỗi MQTT EV3
-                mqtt_msg = f"{cmd}"
-                if cmd == "move":
-                    mqtt_msg = f"move:{params.get('direction', 'stop')}:{params.get('speed', 100)}"
-                elif cmd == "aux_move":
-                    mqtt_msg = f"aux_move:{params.get('port', 'aux1')}:{params.get('value', 0)}:{params.get('unit', 'rotations')}"
-                elif cmd == "site_discovered":
+                if cmd == "site_discovered":
                     # Broadcast the site discovery event to all clients (Quiz & Map)
                     site_id = params.get('site_id')
                     site_name = params.get('site_name', site_id)
                     lang = params.get('lang', 'vi-VN')
-                    
-                    print(f"📍 Station Discovered: {site_id}")
-                    await broadcast_event({
-                        "type": "event",
-                        "event": "site_discovered",
-                        "station_id": site_id,
-                        "site_name": site_name
-                    })
-                    
-                    # 💡 Trigger Automated AI Storytelling
-                    ai_data = await gemini_service.get_response(f"Describe the heritage site: {site_name}", lang)
-                    if ai_data and ai_data.get("text"):
-                        await broadcast_event({
-                            "type": "voice_response",
-                            "text": ai_data["text"]
-                        })
-                    
-                    # 🤖 TRIGGER STATION ACTION (Phase 7 Orchestration)
-                    # Giả sử tên trạm phần cứng trùng với site_id
-                    publish_to_robot(site_id, {"action": "perform_intro"})
+                    await announce_site(site_id, site_name, lang, ai_tasks)
                         
-                    mqtt_msg = "stop" # Auto-stop robot when site discovered
+                    cmd, params = "stop", {} # Auto-stop robot when site discovered
                 elif cmd == "voice_command":
                     text = params.get('text', '').lower()
                     lang = params.get('lang', 'vi-VN')
@@ -210,35 +291,73 @@ async def ws_handler(websocket):
                     
                     # 1. HARD KEYWORDS (Priority/Safety - Bypass AI)
                     if any(kw in text for kw in ["dừng", "đứng lại", "stop", "halt", "emergency", "cấp cứu"]):
-                        execute_mqtt("stop")
+                        site_approach.cancel()
+                        schedule_ev3_command("stop")
+                        # Huỷ các câu trả lời AI đang chờ để không ra lệnh di chuyển sau khi đã dừng
+                        for task in voice_tasks:
+                            task.cancel()
                         await broadcast_event({
                             "type": "voice_response",
                             "text": "Đã dừng robot khẩn cấp." if "vi" in lang else "Emergency stop executed."
                         })
                     
-                    # 2. SMART AI ROUTING (Gemini)
+                    # 2. LOCAL INTENTS - lệnh rõ ràng (tiến/lùi/rẽ, cảm xúc) xử lý ngay, không cần mạng
+                    elif (intent := intent_engine.classify(text, lang)):
+                        print(f"⚡ Local intent: {intent}")
+                        # Lệnh mới thay thế các câu trả lời AI còn chờ (tránh AI ra lệnh di chuyển cũ)
+                        for task in voice_tasks:
+                            task.cancel()
+                        if intent["intent"] == "move":
+                            site_approach.cancel()
+                            schedule_ev3_command("move", {"direction": intent["direction"], "speed": intent["speed"]})
+                        else:
+                            await broadcast_event({
+                                "type": "set_emotion",
+                                "command": "set_emotion",
+                                "emotion": intent["emotion"]
+                            })
+                        await broadcast_event({
+                            "type": "voice_response",
+                            "text": intent["text"]
+                        })
+
+                    # 3. SMART AI ROUTING (Gemini) - chạy nền để "dừng" vẫn được xử lý ngay
                     else:
                         history = params.get('history', [])
-                        ai_data = await gemini_service.get_response(text, lang, history)
-                        if ai_data:
-                            response_text = ai_data.get("text", "")
-                            move_intent = ai_data.get("robot_move")
-                            
-                            # Execute move if intent found
-                            if move_intent in ["forward", "backward", "stop"]:
-                                # Map backward to backward, etc.
-                                direction = "forward" if move_intent == "forward" else "backward" if move_intent == "backward" else "stop"
-                                execute_mqtt(f"move:{direction}:100")
-                            
-                            # Broadcast text response for Tablet TTS
-                            if response_text:
-                                await broadcast_event({
-                                    "type": "voice_response",
-                                    "text": response_text
-                                })
+                        spawn_ai_task(voice_tasks, answer_voice_command(text, lang, history))
                                 
                     continue # Voice command handles its own MQTT/Response
                 
+                elif cmd == "subscribe_telemetry":
+                    # VD: {"command": "subscribe_telemetry", "params": {"rate_hz": 20, "delta": true}}
+                    rate = telemetry_stream.subscribe(
+                        websocket,
+                        params.get('rate_hz', 1),
+                        bool(params.get('delta', False))
+                    )
+                    print(f"📈 Telemetry subscription: {websocket.remote_address} @ {rate} Hz")
+                    continue
+
+                elif cmd == "get_metrics":
+                    # Chẩn đoán: độ sâu hàng đợi, độ trễ gửi từng client + bộ đếm Hub
+                    broadcaster.send(websocket, json.dumps({
+                        "type": "metrics",
+                        "clients": broadcaster.metrics(),
+                        "telemetry": telemetry_stream.stats,
+                        "mqtt": mqtt_hub.stats,
+                        "mqtt_bridge": mqtt_bridge.stats,
+                        "scheduler": command_scheduler.stats,
+                        "approach": site_approach.stats,
+                        "ingest": command_ingestor.stats,
+                        "acks": {**command_ingestor.acks.stats, "abandoned": list(command_ingestor.acks.abandoned)},
+                        "db": db_gateway.stats,
+                        "gemini_keys": gemini_service.keys.metrics(),
+                        "intents": intent_engine.stats,
+                        "ai_parser": response_parser.stats,
+                        "gemini_latency": {m: h.snapshot() for m, h in gemini_service.latency.items()},
+                    }))
+                    continue
+
                 elif cmd == "set_emotion":
                     # Broadcast emotion command to all clients (Robot Face)
                     emotion = params.get('emotion', 'neutral')
@@ -249,15 +368,21 @@ async def ws_handler(websocket):
                         "emotion": emotion
                     })
                     
-                execute_mqtt(mqtt_msg)
+                # Lệnh lái tay thay thế việc tự tiếp cận di sản
+                if cmd in ("move", "stop", "emergency"):
+                    site_approach.cancel()
+                # Biến đổi lệnh JSON thành payload MQTT EV3 và đưa vào bộ lập lịch
+                schedule_ev3_command(cmd, params)
             except Exception as e:
                 print(f"⚠️ WS Msg Error: {e}")
                 traceback.print_exc()
     except websockets.exceptions.ConnectionClosed:
         pass
     finally:
-        if websocket in connected_clients:
-            connected_clients.discard(websocket)
+        for task in ai_tasks | voice_tasks:
+            task.cancel()
+        telemetry_stream.unsubscribe(websocket)
+        broadcaster.remove(websocket)
         print(f"🔌 Client Disconnected: {websocket.remote_address}")
 
 async def start_ws():
@@ -265,44 +390,29 @@ async def start_ws():
     async with websockets.serve(ws_handler, "0.0.0.0", WS_PORT):
         await asyncio.Future() # Keep running
 
-# --- Supabase Listener (Legacy/General) ---
-async def supabase_poll():
-    print("📋 Supabase Listener Active")
-    last_config_check = 0
+# --- Supabase Command Queue (Realtime push, fallback: adaptive polling) ---
+def dispatch_queued_command(c, p):
+    """Chuyển lệnh từ command_queue thành payload MQTT EV3 và gửi đi"""
+    schedule_ev3_command(c, p)
+
+command_ingestor = CommandIngestor(dispatch_queued_command)
+
+async def config_sync():
+    """Đồng bộ cấu hình robot: khi profile đổi (Realtime) hoặc hết TTL cache"""
+    await profile_cache.watch()
     while True:
         try:
-            if time.time() - last_config_check > 10:
-                send_current_config()
-                last_config_check = time.time()
-
-            response = db.table("command_queue").select("*").eq("status", "pending").eq("target", "ev3_robot").order("created_at").execute()
-            pending_cmds = response.data
-            
-            if pending_cmds:
-                if len(pending_cmds) > 5:
-                    to_skip = pending_cmds[:-3]
-                    for s in to_skip:
-                        db.table("command_queue").update({"status": "skipped"}).eq("id", s['id']).execute()
-                    pending_cmds = pending_cmds[-3:]
-
-                for cmd in pending_cmds:
-                    c = cmd['command']
-                    p = cmd['params']
-                    mqtt_msg = f"{c}"
-                    if c == "move":
-                        mqtt_msg = f"move:{p.get('direction', 'stop')}:{p.get('speed', 100)}"
-                    elif c == "aux_move":
-                        mqtt_msg = f"aux_move:{p.get('port', 'aux1')}:{p.get('value', 0)}:{p.get('unit', 'rotations')}"
-                    
-                    execute_mqtt(mqtt_msg)
-                    db.table("command_queue").update({"status": "completed"}).eq("id", cmd['id']).execute()
-            
-            await asyncio.sleep(0.05)
+            await send_current_config()
         except Exception as e:
-            print(f"⚠️ Supabase Error: {e}")
-            await asyncio.sleep(1)
+            print(f"⚠️ Config Sync Error: {e}")
+        try:
+            await asyncio.wait_for(profile_cache.changed.wait(), timeout=profile_cache.ttl)
+        except asyncio.TimeoutError:
+            pass
+        profile_cache.changed.clear()
 
 async def main():
+    mqtt_bridge.attach(asyncio.get_running_loop())
     local_ip = get_local_ip()
     print("\n" + "="*50)
     print(f"📢  AI BRAIN HUB IS STARTING")
@@ -313,23 +423,25 @@ async def main():
     # Auto-update Hub IP in Supabase for active profile
     try:
         # ⚠️ DISABLED AUTO-SYNC for Ngrok Tunnel Mode
-        # db.table("robot_profiles").update({"hub_ip": local_ip}).eq("is_active", True).execute()
+        # await db_gateway.execute(db_gateway.table("robot_profiles").update({"hub_ip": local_ip}).eq("is_active", True))
         # print(f"📡  Supabase: Hub IP synced to {local_ip} (Zero-Config Active)")
         print(f"⚠️  Supabase Sync SKIPPED (Manual/Ngrok Mode active)")
     except Exception as e:
         print(f"⚠️  Supabase Sync Failed: {e}")
     
-    # Chạy song song WebSocketBroadcaster, WS Server và Supabase Polling
+    # Chạy song song WebSocketBroadcaster, WS Server và Supabase Command Ingestor
     await asyncio.gather(
         start_ws(),
-        supabase_poll(),
-        broadcast_telemetry()
+        mqtt_hub.run(),
+        command_ingestor.run(),
+        config_sync(),
+        mqtt_bridge.run(),
+        telemetry_stream.run()
     )
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        mqtt_client.loop_stop()
         print("👋 Shutdown")
 
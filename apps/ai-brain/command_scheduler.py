@@ -0,0 +1,108 @@
+import os
+import time
+import asyncio
+from collections import deque
+
+MOVE_COALESCE_WINDOW = float(os.getenv("MOVE_COALESCE_WINDOW", "0.05"))  # Giây gom lệnh move liên tiếp
+COMMAND_MIN_INTERVAL = float(os.getenv("COMMAND_MIN_INTERVAL", "0.1"))   # Tối đa ~10 lệnh/s mỗi robot
+MOVE_DUPLICATE_TTL = 1.0  # Giây: move trùng lệnh vừa gửi mới bị bỏ (robot có thể đã dừng theo đường khác)
+
+URGENT = "urgent"    # stop/emergency: gửi ngay, huỷ mọi lệnh đang chờ của robot
+MOTION = "motion"    # move: chỉ lệnh mới nhất có ý nghĩa (latest-wins)
+ORDERED = "ordered"  # aux_move, lệnh khác: giữ nguyên thứ tự, không gộp
+
+
+def classify_command(command, params=None):
+    if command in ("stop", "emergency"):
+        return URGENT
+    if command == "move":
+        if (params or {}).get("direction", "stop") == "stop":
+            return URGENT
+        return MOTION
+    return ORDERED
+
+
+class _Lane:
+    def __init__(self):
+        self.motion = None       # Lệnh move mới nhất đang chờ
+        self.ordered = deque()
+        self.last_sent_at = 0
+        self.last_motion = None  # Lệnh move đã gửi gần nhất (bỏ qua nếu trùng trong MOVE_DUPLICATE_TTL)
+        self.last_motion_at = 0
+        self.wake = asyncio.Event()
+        self.task = None
+
+
+class CommandScheduler:
+    """Lập lịch lệnh theo từng robot: gộp move liên tiếp, stop đi thẳng, giới hạn tần suất"""
+
+    def __init__(self, send, window=MOVE_COALESCE_WINDOW, min_interval=COMMAND_MIN_INTERVAL, send_urgent=None):
+        self.send = send  # send(target_id, payload)
+        self.send_urgent = send_urgent or send  # stop/emergency: đường gửi không hết hạn khi mất broker
+        self.window = window
+        self.min_interval = min_interval
+        self._lanes = {}
+        self.stats = {"submitted": 0, "sent": 0, "urgent": 0, "superseded": 0, "duplicates": 0, "flushed": 0}
+
+    def submit(self, target_id, kind, payload):
+        self.stats["submitted"] += 1
+        lane = self._lane(target_id)
+
+        if kind == URGENT:
+            # Dừng khẩn cấp: bỏ mọi lệnh đang chờ (move và aux_move/lệnh khác), gửi ngay không qua rate-limit
+            if lane.motion is not None:
+                self.stats["superseded"] += 1
+            self.stats["flushed"] += len(lane.ordered)
+            lane.motion = None
+            lane.ordered.clear()
+            lane.last_motion = None
+            self.stats["urgent"] += 1
+            self._send(lane, target_id, payload, urgent=True)
+            return
+
+        if kind == MOTION:
+            if lane.motion is not None:
+                self.stats["superseded"] += 1
+            lane.motion = payload
+        else:
+            lane.ordered.append(payload)
+        lane.wake.set()
+
+    def _lane(self, target_id):
+        lane = self._lanes.get(target_id)
+        if lane is None:
+            lane = _Lane()
+            lane.task = asyncio.create_task(self._run_lane(target_id, lane))
+            self._lanes[target_id] = lane
+        return lane
+
+    def _send(self, lane, target_id, payload, urgent=False):
+        lane.last_sent_at = time.monotonic()
+        self.stats["sent"] += 1
+        (self.send_urgent if urgent else self.send)(target_id, payload)
+
+    async def _run_lane(self, target_id, lane):
+        while True:
+            await lane.wake.wait()
+            lane.wake.clear()
+
+            # Cửa sổ gom: chờ thêm một chút để lệnh move mới hơn thay thế lệnh cũ
+            if lane.motion is not None and self.window > 0:
+                await asyncio.sleep(self.window)
+
+            while lane.ordered or lane.motion is not None:
+                wait = lane.last_sent_at + self.min_interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                if lane.ordered:
+                    self._send(lane, target_id, lane.ordered.popleft())
+                    continue
+                payload, lane.motion = lane.motion, None
+                if payload is None:
+                    break  # Đã bị stop huỷ trong lúc chờ
+                if payload == lane.last_motion and time.monotonic() - lane.last_motion_at < MOVE_DUPLICATE_TTL:
+                    self.stats["duplicates"] += 1
+                    continue
+                lane.last_motion = payload
+                lane.last_motion_at = time.monotonic()
+                self._send(lane, target_id, payload)
@@ -0,0 +1,126 @@
+import os
+import asyncio
+import hashlib
+from collections import OrderedDict
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))  # Token tối đa cho lịch sử hội thoại
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "4"))         # Luôn giữ nguyên vài lượt gần nhất
+HISTORY_BLOCK_TURNS = 6         # Tóm tắt theo khối lượt cố định để prefix ổn định giữa các request
+MEMORY_TOKEN_SHARE = 0.3        # Phần ngân sách tối đa dành cho bản tóm tắt
+EXTRACT_CHARS = 80              # Tóm tắt tạm (chưa có bản LLM): giữ đầu mỗi lượt
+SUMMARY_CACHE_SIZE = 256
+SUMMARY_MAX_PENDING = 2         # Số lượt tóm tắt LLM chạy nền cùng lúc (tránh tốn quota)
+
+SUMMARY_PROMPT = (
+    "Summarise this part of a conversation between a visitor and the 'Heritage Keeper' robot guide "
+    "in at most 2 short sentences, keeping names, places and open questions. "
+    "Reply in the conversation's language, plain text only.\n\n{transcript}"
+)
+
+
+def estimate_tokens(text):
+    """Ước lượng token không cần gọi API (~3 ký tự/token, tiếng Việt có dấu tốn hơn tiếng Anh)"""
+    return len(text) // 3 + 1
+
+
+def turn_text(turn):
+    parts = turn.get("parts") or []
+    return " ".join(p if isinstance(p, str) else str(p.get("text", "")) for p in parts)
+
+
+class HistoryManager:
+    """Giữ lịch sử gửi cho Gemini dưới ngân sách token: lượt gần nhất giữ nguyên,
+    lượt cũ được gộp thành một mục 'bộ nhớ' ngắn (tóm tắt bằng LLM chạy nền, có cache)"""
+
+    def __init__(self, summarize=None, budget=HISTORY_TOKEN_BUDGET, keep_turns=HISTORY_KEEP_TURNS,
+                 block_turns=HISTORY_BLOCK_TURNS):
+        self.summarize = summarize  # coroutine summarize(prompt) -> text, None = chỉ tóm tắt trích đoạn
+        self.budget = budget
+        self.keep_turns = keep_turns
+        self.block_turns = block_turns
+        self._summaries = OrderedDict()  # hash khối lượt -> bản tóm tắt LLM
+        self._pending = set()
+        self._tasks = set()  # Giữ tham chiếu task tóm tắt nền (tránh bị GC giữa chừng)
+        self.stats = {
+            "requests": 0, "compacted": 0, "turns_summarised": 0, "tokens_saved": 0,
+            "llm_summaries": 0, "summary_errors": 0,
+        }
+
+    def compact(self, history):
+        """Trả về danh sách turn đã rút gọn (mục bộ nhớ + các lượt gần nhất)"""
+        self.stats["requests"] += 1
+        turns = [t for t in history or [] if isinstance(t, dict) and "role" in t and "parts" in t]
+        costs = [estimate_tokens(turn_text(t)) for t in turns]
+        if sum(costs) <= self.budget:
+            return turns
+
+        # Cắt theo ranh giới khối: bỏ ít khối cũ nhất sao cho phần còn lại vừa ngân sách
+        recent_budget = self.budget * (1 - MEMORY_TOKEN_SHARE)
+        limit = max(len(turns) - self.keep_turns, 0)
+        cut = 0
+        while cut < limit and sum(costs[cut:]) > recent_budget:
+            cut = min(cut + self.block_turns, limit)
+        if cut == 0:
+            return turns
+
+        memory = self._memory(turns[:cut])
+        compacted = [{"role": "user", "parts": [f"Conversation so far (summary): {memory}"]}] + turns[cut:]
+        self.stats["compacted"] += 1
+        self.stats["turns_summarised"] += cut
+        self.stats["tokens_saved"] += sum(costs[:cut]) - estimate_tokens(memory)
+        return compacted
+
+    def _memory(self, old_turns):
+        pieces = []
+        for start in range(0, len(old_turns), self.block_turns):
+            block = old_turns[start:start + self.block_turns]
+            key = hashlib.sha1(repr([(t["role"], turn_text(t)) for t in block]).encode()).hexdigest()
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._extract(block)
+                self._schedule(key, block)
+            pieces.append(summary)
+
+        # Bản tóm tắt quá dài: bỏ bớt phần cũ nhất
+        max_tokens = self.budget * MEMORY_TOKEN_SHARE
+        while len(pieces) > 1 and estimate_tokens(" ".join(pieces)) > max_tokens:
+            pieces.pop(0)
+        return " ".join(pieces)
+
+    @staticmethod
+    def _extract(block):
+        lines = []
+        for t in block:
+            text = turn_text(t).strip().replace("\n", " ")
+            if text:
+                lines.append(f"{t['role']}: {text[:EXTRACT_CHARS]}")
+        return " | ".join(lines)
+
+    def _schedule(self, key, block):
+        """Tóm tắt khối bằng LLM ở nền; request hiện tại dùng bản trích đoạn"""
+        if self.summarize is None or key in self._pending or len(self._pending) >= SUMMARY_MAX_PENDING:
+            return
+        self._pending.add(key)
+        transcript = "\n".join(f"{t['role']}: {turn_text(t)}" for t in block)
+        task = asyncio.create_task(self._summarise(key, SUMMARY_PROMPT.format(transcript=transcript)))
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ History summary task crashed: {task.exception()!r}")
+
+    async def _summarise(self, key, prompt):
+        try:
+            summary = (await self.summarize(prompt)).strip()
+            if summary:
+                self._summaries[key] = summary
+                while len(self._summaries) > SUMMARY_CACHE_SIZE:
+                    self._summaries.popitem(last=False)
+                self.stats["llm_summaries"] += 1
+        except Exception as e:
+            self.stats["summary_errors"] += 1
+            print(f"⚠️ History summary failed: {e}")
+        finally:
+            self._pending.discard(key)
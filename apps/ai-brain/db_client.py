@@ -1,6 +1,8 @@
 import os
-from supabase import create_client, Client
-from supabase.client import create_client as create_async_client, AsyncClient
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from supabase import create_client, Client, ClientOptions
+from supabase import acreate_client, AsyncClient
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -12,10 +14,67 @@ key: str = os.getenv("SUPABASE_KEY")
 if not url or not key:
     raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env file")
 
-db: Client = create_client(url, key)
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "4"))   # Số truy vấn chạy song song tối đa
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "5"))          # Giây
+
+# Client sync giữ một httpx session dùng lại kết nối (keep-alive) cho mọi truy vấn
+db: Client = create_client(url, key, options=ClientOptions(postgrest_client_timeout=DB_TIMEOUT))
+
+
+class AsyncDBGateway:
+    """Chạy truy vấn Supabase trên thread-pool riêng để không chặn event loop của Hub"""
+
+    def __init__(self, client: Client, max_workers=DB_MAX_WORKERS, timeout=DB_TIMEOUT):
+        self.client = client
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="supabase")
+        self._limit = None
+        self._max_workers = max_workers
+        self.stats = {"calls": 0, "errors": 0, "timeouts": 0, "in_flight": 0}
+
+    def table(self, table_name: str):
+        return self.client.table(table_name)
+
+    async def execute(self, query, timeout=None):
+        """Thực thi một query builder (đã dựng sẵn, chưa .execute()) và trả về response"""
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self._max_workers)
+        await self._limit.acquire()
+        self.stats["calls"] += 1
+        self.stats["in_flight"] += 1
+        loop = asyncio.get_running_loop()
+        # Timeout không dừng được thread đang chạy truy vấn: chỉ nhả slot khi truy vấn thật sự xong,
+        # để các lần timeout liên tiếp không vượt quá max_workers truy vấn đồng thời
+        future = self._executor.submit(query.execute)
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._finished))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+    def _finished(self):
+        self.stats["in_flight"] -= 1
+        self._limit.release()
+
+
+db_gateway = AsyncDBGateway(db)
+
+_async_db: AsyncClient = None
+_async_db_lock = None
 
 async def get_async_db() -> AsyncClient:
-    return await create_async_client(url, key)
+    """Trả về một AsyncClient dùng chung (tạo một lần, dùng lại cho Realtime)"""
+    global _async_db, _async_db_lock
+    if _async_db_lock is None:
+        _async_db_lock = asyncio.Lock()
+    async with _async_db_lock:
+        if _async_db is None:
+            _async_db = await acreate_client(url, key)
+    return _async_db
 
 if __name__ == "__main__":
     print(f"Supabase Client initialized for: {url}")
@@ -1,10 +1,24 @@
 import os
-import json
+import time
+import asyncio
 import google.generativeai as genai
 from dotenv import load_dotenv
+from response_cache import ResponseCache
+from json_stream import PartialJsonExtractor, SentenceChunker
+from key_pool import ApiKeyPool
+from latency_stats import LatencyHistogram
+from conversation_memory import HistoryManager
+from response_parser import response_parser, normalize_move
 
 load_dotenv()
 
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "15"))  # Giây cho mỗi lần gọi model
+GEMINI_STREAM = os.getenv("GEMINI_STREAM", "1") == "1"    # Stream câu trả lời hỏi đáp giọng nói
+GEMINI_POLICY = os.getenv("GEMINI_POLICY", "hedged")       # hedged | sequential | primary
+GEMINI_HEDGE_AFTER = float(os.getenv("GEMINI_HEDGE_AFTER", "3"))  # Giây chờ Flash trước khi chạy song song model dự phòng
+SITE_PROMPT = "Describe the heritage site: {site_name}"
+_MISSING = object()
+
 class GeminiService:
     def __init__(self):
         # Thu thập tất cả các API Key có sẵn
@@ -19,98 +33,277 @@ class GeminiService:
         if default_key and default_key not in self.api_keys:
             self.api_keys.insert(0, default_key)
             
-        self.current_key_index = 0
+        # Mỗi request mượn key khoẻ nhất từ pool, client riêng theo key (không genai.configure toàn cục)
+        self.keys = ApiKeyPool(self.api_keys)
         self.primary_model = "gemini-2.0-flash" # Note: Adjusted to 2.0 as 2.5 is not yet public, but can use user's string
         self.fallback_model = "gemini-1.5-pro" # Note: Adjusted to 1.5-pro as 3 is not yet public
         
         # Override with exact user requests
         self.primary_model = "gemini-2.5-flash"
         self.fallback_model = "gemini-3-pro-preview"
+        self.timeout = GEMINI_TIMEOUT
+        self.policy = GEMINI_POLICY
+        self.hedge_after = GEMINI_HEDGE_AFTER
+        self.latency = {}  # model -> LatencyHistogram
+        self._system_prompts = {}  # lang -> system prompt
+        self._models = {}          # (model, key, system prompt) -> GenerativeModel dùng lại
+        self._shared_client = False  # SDK không hỗ trợ client theo key: đã genai.configure toàn cục
+        self.history = HistoryManager(self._summarize)
+        self.cache = ResponseCache()
         
         if not self.api_keys:
             print("⚠️ WARNING: No Gemini API keys found in .env")
 
-    def _rotate_key(self):
-        """Xoay vòng API key để tránh vượt quota"""
-        if not self.api_keys:
-            return
-        self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-        genai.configure(api_key=self.api_keys[self.current_key_index])
-
     async def get_response(self, user_input, lang="vi-VN", history=[]):
         if not self.api_keys:
             return None
 
-        self._rotate_key()
-        
-        system_prompt = f"""
+        contents = self._build_contents(user_input, lang, history)
+
+        try:
+            return await self._infer(contents, self._system_prompt(lang))
+        except Exception as e:
+            import traceback
+            print(f"❌ Gemini Error: {e}")
+            traceback.print_exc()
+            return {
+                "text": "Xin lỗi, tôi gặp chút trục trặc khi suy nghĩ.",
+                "robot_move": None,
+                "error": True
+            } if "vi" in lang else {
+                "text": "Sorry, I had a little trouble thinking.",
+                "robot_move": None,
+                "error": True
+            }
+
+    async def _infer(self, contents, system=None):
+        """Gọi model theo GEMINI_POLICY, trả về dict câu trả lời (JSON hợp lệ đầu tiên)"""
+        if self.policy != "hedged":
+            try:
+                # 🚀 Thử với model Flash trước
+                return await self._attempt(self.primary_model, contents, system, strict=False)
+            except Exception as e:
+                if self.policy != "sequential":
+                    raise
+                print(f"❌ Gemini Flash Error: {e}")
+                print(f"🔄 Falling back to {self.fallback_model}...")
+                return await self._attempt(self.fallback_model, contents, system, strict=False)
+
+        # Hedged: Flash chạy trước; quá ngân sách trễ hoặc lỗi thì chạy song song model dự phòng,
+        # lấy JSON hợp lệ về trước, huỷ request còn lại
+        primary = asyncio.create_task(self._attempt(self.primary_model, contents, system))
+        pending = {primary}
+        hedged = False
+        backup = None  # Câu trả lời không phải JSON (chỉ dùng nếu không có gì tốt hơn)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=None if hedged else self.hedge_after,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        print(f"❌ Gemini Error: {error}")
+                        continue
+                    data, valid = task.result()
+                    if valid:
+                        self.latency[self.primary_model if task is primary else self.fallback_model].stats["wins"] += 1
+                        return data
+                    backup = backup or data
+                if not hedged and (not done or not pending):
+                    hedged = True
+                    reason = "failed" if done else f"slower than {self.hedge_after}s"
+                    print(f"🔄 Flash {reason}, hedging with {self.fallback_model}...")
+                    pending.add(asyncio.create_task(self._attempt(self.fallback_model, contents, system)))
+        finally:
+            for task in pending:
+                task.cancel()
+        if backup is not None:
+            return backup
+        raise error
+
+    async def _attempt(self, model_name, contents, system=None, strict=True):
+        """Một lần gọi model, ghi độ trễ vào histogram; strict -> trả (dict, có phải JSON hợp lệ)"""
+        histogram = self.latency.setdefault(model_name, LatencyHistogram())
+        started = time.monotonic()
+        try:
+            text = await self._generate(model_name, contents, system)
+        except asyncio.CancelledError:
+            histogram.stats["cancelled"] += 1
+            raise
+        except Exception:
+            histogram.stats["errors"] += 1
+            raise
+        histogram.record((time.monotonic() - started) * 1000)
+        if not strict:
+            return response_parser.parse(text)
+        try:
+            return response_parser.parse(text, strict=True), True
+        except ValueError:
+            return response_parser.salvage(text), False
+
+    async def describe_site(self, site_name, lang="vi-VN"):
+        """Lời kể khi phát hiện di sản: prompt cố định nên lấy từ cache nếu có"""
+        prompt = SITE_PROMPT.format(site_name=site_name)
+        # Khoá theo di sản + ngôn ngữ (không theo model): model nào trả lời cũng dùng chung cache
+        key = ResponseCache.make_key(prompt, lang)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return cached
+
+        data = await self.get_response(prompt, lang)
+        # Chỉ cache câu trả lời hợp lệ, không cache câu xin lỗi khi lỗi
+        if data and data.get("text") and not data.get("error"):
+            await asyncio.to_thread(self.cache.put, key, data)
+        return data
+
+    async def prewarm_sites(self, site_names, langs=("vi-VN", "en-US")):
+        """Sinh sẵn lời kể cho mọi di sản trên sa bàn trước khi chạy (đủ số biến thể)"""
+        warmed = 0
+        for site_name in site_names:
+            for lang in langs:
+                key = ResponseCache.make_key(SITE_PROMPT.format(site_name=site_name), lang)
+                for _ in range(self.cache.max_variants):
+                    if await asyncio.to_thread(self.cache.variant_count, key) >= self.cache.max_variants:
+                        break
+                    data = await self.describe_site(site_name, lang)
+                    if not data or data.get("error"):
+                        print(f"⚠️ Prewarm failed: {site_name} [{lang}]")
+                        break
+                    warmed += 1
+        return warmed
+
+    def _system_prompt(self, lang):
+        """System prompt cố định theo ngôn ngữ: gửi qua system_instruction (prefix giống hệt mọi
+        request -> Gemini tự cache), model được tạo sẵn và dùng lại theo (model, key, ngôn ngữ)"""
+        prompt = self._system_prompts.get(lang)
+        if prompt is None:
+            # robot_move/emotion đứng trước text để chế độ stream biết ý định di chuyển sớm
+            prompt = self._system_prompts[lang] = f"""
         Role: 'Heritage Keeper' AI for WRO 2026.
         Constraint: Short responses (1-2 sentences). Strict JSON output.
         Language: {lang}.
 
         JSON Schema:
         {{
-            "text": "spoken response",
             "robot_move": "forward" | "backward" | "stop" | null,
-            "emotion": "happy" | "thinking" | "sad" | "neutral"
+            "emotion": "happy" | "thinking" | "sad" | "neutral",
+            "text": "spoken response"
         }}
         """
+        return prompt
 
-        # Construct full prompt with history
-        contents = [
-            {"role": "user", "parts": [system_prompt]}
-        ]
-        
-        # Add valid history
-        if history and isinstance(history, list):
-            for turn in history:
-                if "role" in turn and "parts" in turn:
-                    contents.append(turn)
+    def _build_contents(self, user_input, lang, history):
+        # Lịch sử dài được rút gọn: lượt cũ -> một mục tóm tắt, giữ nguyên các lượt gần nhất
+        contents = self.history.compact(history) if isinstance(history, list) else []
 
         # Add current user input
         contents.append({"role": "user", "parts": [f"User: {user_input}"]})
+        return contents
 
-        try:
-            # 🚀 Thử với model Flash trước
-            model = genai.GenerativeModel(self.primary_model)
-            response = model.generate_content(contents)
-            return self._parse_json(response.text)
-        except Exception as e:
-            import traceback
-            print(f"❌ Gemini Flash Error: {e}")
-            
-            # 🔄 Fallback sang model Pro nếu Flash lỗi (404 hoặc quota)
-            if "404" in str(e) or "quota" in str(e).lower():
-                try:
-                    print(f"🔄 Falling back to {self.fallback_model}...")
-                    model_pro = genai.GenerativeModel(self.fallback_model)
-                    response = model_pro.generate_content(contents)
-                    return self._parse_json(response.text)
-                except Exception as e2:
-                    print(f"❌ Gemini Fallback Error: {e2}")
-                    traceback.print_exc()
+    async def _summarize(self, prompt):
+        """Tóm tắt lịch sử cho HistoryManager (không system prompt, không JSON)"""
+        return await self._generate(self.primary_model, [{"role": "user", "parts": [prompt]}])
 
-            traceback.print_exc()
-            return {
-                "text": "Xin lỗi, tôi gặp chút trục trặc khi suy nghĩ.",
-                "robot_move": None
-            } if "vi" in lang else {
-                "text": "Sorry, I had a little trouble thinking.",
-                "robot_move": None
-            }
+    async def stream_response(self, user_input, lang="vi-VN", history=[]):
+        """Stream câu trả lời: yield ("move", hướng) ngay khi đọc được, ("text", câu) theo từng câu,
+        cuối cùng ("done", dict đầy đủ như get_response). Lỗi trước khi có chữ -> dùng get_response."""
+        if not self.api_keys:
+            return
+
+        contents = self._build_contents(user_input, lang, history)
+        # Cùng luật schema với parse(): bỏ qua JSON ví dụ, đọc tiếp tới đối tượng câu trả lời thật
+        extractor = PartialJsonExtractor("text", accept=response_parser.matches)
+        chunker = SentenceChunker()
+        raw = []
+        emitted = moved = False
 
-    def _parse_json(self, text):
-        """Trích xuất JSON từ phản hồi của AI"""
         try:
-            clean_text = text
-            if "```json" in text:
-                clean_text = text.split("```json")[1].split("```")[0].strip()
-            elif "```" in text:
-                clean_text = text.split("```")[1].split("```")[0].strip()
-            return json.loads(clean_text)
+            async for delta in self._generate_stream(self.primary_model, contents, self._system_prompt(lang)):
+                raw.append(delta)
+                text, completed = extractor.feed(delta)
+                if "robot_move" in completed:
+                    moved = True
+                    yield "move", normalize_move(completed["robot_move"])
+                for sentence in chunker.feed(text):
+                    emitted = True
+                    yield "text", sentence
         except Exception as e:
-            print(f"⚠️ JSON Parse Error: {e}")
-            # Fallback nếu AI trả text trần
-            return {"text": text[:200], "robot_move": None}
+            print(f"❌ Gemini Stream Error: {e}")
+            if not emitted:
+                # Chưa nói gì: chuyển sang đường không stream (có fallback model)
+                data = await self.get_response(user_input, lang, history)
+                if data:
+                    if data.get("robot_move"):
+                        yield "move", data["robot_move"]
+                    if data.get("text"):
+                        yield "text", data["text"]
+                    yield "done", data
+                return
+
+        for sentence in chunker.flush():
+            emitted = True
+            yield "text", sentence
+
+        # Kết quả cuối luôn qua parse() (cùng kiểm tra schema + sửa JSON bị cắt như get_response);
+        # phần stream chưa đọc được (JSON hỏng, không có JSON) thì phát bù
+        data = response_parser.parse("".join(raw))
+        if data.get("robot_move") and not moved:
+            yield "move", data["robot_move"]
+        if data.get("text") and not emitted:
+            yield "text", data["text"]
+        yield "done", data
+
+    async def _generate_stream(self, model_name, contents, system=None):
+        """Như _generate nhưng yield từng đoạn text; timeout áp cho mỗi đoạn"""
+        async with await self.keys.acquire(model_name) as key:
+            model = self._model(model_name, key, system)
+            try:
+                response = await asyncio.wait_for(
+                    model.generate_content_async(contents, stream=True), timeout=self.timeout
+                )
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        return
+                    yield chunk.text
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{model_name} stream timed out after {self.timeout}s")
+
+    async def _generate(self, model_name, contents, system=None):
+        """Gọi model bất đồng bộ (không chặn event loop), có timeout; huỷ task = huỷ request"""
+        async with await self.keys.acquire(model_name) as key:
+            model = self._model(model_name, key, system)
+            try:
+                response = await asyncio.wait_for(model.generate_content_async(contents), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{model_name} timed out after {self.timeout}s")
+            return response.text
+
+    def _model(self, model_name, key, system=None):
+        cache_key = (model_name, key.secret, system)
+        model = self._models.get(cache_key)
+        if model is None:
+            model = genai.GenerativeModel(model_name, system_instruction=system)
+            self._bind_client(model, key)
+            self._models[cache_key] = model
+        return model
+
+    def _bind_client(self, model, key):
+        """Gắn client của key đã mượn cho model (request song song không dùng chung cấu hình toàn cục).
+        SDK không có API công khai cho việc này: chỉ gán khi thuộc tính client lười của
+        google-generativeai 0.8.x còn đúng dạng, SDK khác thì dùng client chung (genai.configure)."""
+        if getattr(model, "_async_client", _MISSING) is None:
+            model._async_client = key.client
+            return True
+        if not self._shared_client:
+            print("⚠️ Gemini SDK: per-key client unsupported, using shared client (no key rotation)")
+            genai.configure(api_key=key.secret)
+            self._shared_client = True
+        return False
 
 gemini_service = GeminiService()
@@ -0,0 +1,145 @@
+import re
+import time
+import unicodedata
+
+INTENT_MAX_WORDS = 7  # Câu dài hơn coi là hội thoại, để Gemini xử lý
+
+# Cụm từ theo ý định. Mỗi cụm được khớp trên văn bản có dấu; cụm nhiều từ còn được khớp
+# cả dạng không dấu (nhận dạng giọng nói/bàn phím hay mất dấu). Từ đơn không dấu dễ nhầm
+# ("dung" = dừng/dùng/đúng) nên không khớp dạng không dấu.
+# Lệnh di chuyển chỉ khớp cụm mệnh lệnh: từ chỉ hướng đứng trong câu thường là hội thoại
+# ("all right", "look forward to it", "tôi tên là Tiến").
+MOVE_PHRASES = {
+    "forward": ["tiến lên", "tiến tới", "đi tiến", "đi thẳng", "đi tới", "đi lên",
+                "go forward", "move forward", "go ahead", "go straight", "drive forward"],
+    "backward": ["lùi lại", "đi lùi", "go back", "move back", "back up", "go backward", "move backward"],
+    "left": ["rẽ trái", "quay trái", "sang trái", "qua trái", "turn left", "go left"],
+    "right": ["rẽ phải", "quay phải", "sang phải", "qua phải", "turn right", "go right"],
+}
+# Từ đơn chỉ hướng: chỉ nhận khi là toàn bộ câu nói ("tiến", "left")
+MOVE_WORDS = {
+    "forward": ["tiến", "forward", "ahead"],
+    "backward": ["lùi", "backward", "backwards", "reverse"],
+    "left": ["left"],
+    "right": ["right"],
+}
+EMOTION_PHRASES = {
+    "happy": ["vui lên", "cười lên", "cười đi", "smile", "be happy"],
+    "sad": ["buồn đi", "be sad"],
+    "love": ["yêu bạn", "thương bạn", "love you"],
+    "angry": ["giận đi", "be angry"],
+    "sleepy": ["đi ngủ", "ngủ đi", "go to sleep"],
+    "celebrate": ["ăn mừng", "celebrate"],
+}
+SPEED_PHRASES = {
+    100: ["nhanh lên", "nhanh", "fast", "faster", "quickly"],
+    40: ["chậm lại", "từ từ", "chậm", "slow", "slowly"],
+}
+# Phủ định hoặc ngữ cảnh không phải mệnh lệnh ("đừng đi tiến", "go back to the story") -> để Gemini hiểu.
+# Khớp trên văn bản đã normalize ("don't" -> "don t")
+NEGATION_PATTERN = re.compile(
+    r"(?<!\w)(?:đừng|không|chưa|don t|dont|do not|not|never)(?!\w)|(?<!\w)back to \w+"
+)
+# Dấu hiệu câu hỏi mở -> không tự xử lý
+QUESTION_PHRASES = ["?", "là gì", "tại sao", "vì sao", "như thế nào", "thế nào", "bao nhiêu", "ở đâu",
+                    "có phải", "kể", "giới thiệu", "what", "why", "how", "where", "who", "when",
+                    "tell me", "can you", "could you", "should"]
+
+REPLIES = {
+    "move": {"vi": "Đã rõ, tôi {label}.", "en": "Okay, {label}."},
+    "emotion": {"vi": "Được thôi!", "en": "Sure!"},
+}
+MOVE_LABELS = {
+    "forward": {"vi": "tiến lên", "en": "moving forward"},
+    "backward": {"vi": "lùi lại", "en": "backing up"},
+    "left": {"vi": "rẽ trái", "en": "turning left"},
+    "right": {"vi": "rẽ phải", "en": "turning right"},
+}
+
+
+def strip_accents(text):
+    text = text.replace("đ", "d").replace("Đ", "D")
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFC", text.lower())
+    return " ".join(re.sub(r"[^\w?]+", " ", text).split())
+
+
+def _compile(table):
+    """Gộp mọi cụm thành một regex (alternation) với group tên = ý định; cụm dài thử trước"""
+    accented, plain = [], []
+    for i, (intent, phrases) in enumerate(table.items()):
+        group = f"i{i}"
+        ordered = sorted(phrases, key=len, reverse=True)
+        accented.append(f"(?P<{group}>{'|'.join(re.escape(p) for p in ordered)})")
+        multi = [strip_accents(p) for p in ordered if " " in p]
+        if multi:
+            plain.append(f"(?P<{group}>{'|'.join(re.escape(p) for p in multi)})")
+    names = {f"i{i}": intent for i, intent in enumerate(table)}
+
+    def build(parts):
+        return re.compile(r"(?<!\w)(?:" + "|".join(parts) + r")(?!\w)") if parts else None
+    return names, build(accented), build(plain)
+
+
+class IntentEngine:
+    """Nhận diện cục bộ (không cần mạng) các lệnh rõ ràng: di chuyển, cảm xúc.
+    Câu hỏi mở hoặc câu mơ hồ trả về None để chuyển cho Gemini."""
+
+    def __init__(self):
+        self._move = _compile(MOVE_PHRASES)
+        self._move_words = {word: intent for intent, words in MOVE_WORDS.items() for word in words}
+        self._emotion = _compile(EMOTION_PHRASES)
+        self._speed = _compile({str(k): v for k, v in SPEED_PHRASES.items()})
+        self._question = re.compile("|".join(
+            re.escape(p) if not p[0].isalpha() else rf"(?<!\w){re.escape(p)}(?!\w)" for p in QUESTION_PHRASES
+        ))
+        self.stats = {"local": 0, "escalated": 0, "us_last": 0.0, "us_max": 0.0}
+
+    def classify(self, text, lang="vi-VN"):
+        """Trả về dict ý định ({"intent": "move"|"emotion", ...}) hoặc None nếu cần hỏi Gemini"""
+        started = time.perf_counter()
+        result = self._classify(normalize(text), "vi" if "vi" in lang else "en")
+        us = (time.perf_counter() - started) * 1e6
+        self.stats["us_last"] = round(us, 1)
+        self.stats["us_max"] = round(max(self.stats["us_max"], us), 1)
+        self.stats["local" if result else "escalated"] += 1
+        return result
+
+    def _classify(self, text, lang):
+        if not text or len(text.split()) > INTENT_MAX_WORDS or self._question.search(text):
+            return None
+        if NEGATION_PATTERN.search(text):
+            return None
+        plain = strip_accents(text)
+
+        moves = {self._move_words[text]} if text in self._move_words else self._find(self._move, text, plain)
+        emotions = self._find(self._emotion, text, plain)
+        if len(moves) == 1 and not emotions:
+            direction = moves.pop()
+            speeds = self._find(self._speed, text, plain)
+            return {
+                "intent": "move",
+                "direction": direction,
+                "speed": int(speeds.pop()) if len(speeds) == 1 else 100,
+                "text": REPLIES["move"][lang].format(label=MOVE_LABELS[direction][lang]),
+            }
+        if len(emotions) == 1 and not moves:
+            return {"intent": "emotion", "emotion": emotions.pop(), "text": REPLIES["emotion"][lang]}
+        return None  # Không có hoặc nhiều ý định mâu thuẫn ("tiến rồi lùi") -> để Gemini hiểu
+
+    @staticmethod
+    def _find(compiled, text, plain):
+        names, accented, unaccented = compiled
+        found = set()
+        for pattern, source in ((accented, text), (unaccented, plain)):
+            if pattern is None:
+                continue
+            for match in pattern.finditer(source):
+                found.add(names[match.lastgroup])
+        return found
+
+
+intent_engine = IntentEngine()
@@ -0,0 +1,176 @@
+import re
+
+SENTENCE_END = re.compile(r'[.!?…。]+["\')\]]*\s')  # Hết câu: dấu câu rồi khoảng trắng
+SOFT_BREAK = re.compile(r'[,;:]\s')
+CHUNK_MAX_CHARS = 160  # Câu quá dài thì cắt ở dấu phẩy gần nhất để TTS bắt đầu sớm
+CHUNK_MIN_CHARS = 12   # Không gửi mảnh quá ngắn ("Vâng.") riêng lẻ
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class PartialJsonExtractor:
+    """Đọc JSON trả về dạng stream, lấy giá trị các trường cấp 1 ngay khi chúng xuất hiện
+
+    Trường chuỗi được đọc dần từng ký tự (stream_field, thường là "text"); các trường
+    khác chỉ được báo khi đã đọc xong giá trị. Bỏ qua mọi thứ trước dấu '{' đầu tiên
+    (ví dụ rào ```json của Markdown). accept(fields): đối tượng đã đóng mà không được nhận
+    (vd. JSON ví dụ trong lời giải thích) bị bỏ, tiếp tục tìm đối tượng sau.
+    """
+
+    def __init__(self, stream_field="text", accept=None):
+        self.stream_field = stream_field
+        self.accept = accept
+        self.skipped = 0      # Số đối tượng đã bỏ qua
+        self.fields = {}      # Các trường đã đọc xong
+        self._buf = ""
+        self._pos = 0
+        self._started = False
+        self._key = None      # Tên trường đang đọc giá trị
+        self._expect = "key"  # key | colon | value | string | scalar | comma
+        self._value = []
+        self._escape = None   # None, "" (vừa gặp '\'), hoặc các chữ số hex của \uXXXX
+        self.done = False
+
+    def feed(self, delta):
+        """Nạp thêm một đoạn; trả về (phần text mới, {trường vừa hoàn tất: giá trị})"""
+        self._buf += delta
+        text_out = []
+        completed = {}
+        buf = self._buf
+        while self._pos < len(buf) and not self.done:
+            ch = buf[self._pos]
+            self._pos += 1
+            if not self._started:
+                self._started = ch == "{"
+                continue
+            state = self._expect
+            if state == "string":
+                piece = self._read_string_char(ch)
+                if piece is None:
+                    # Kết thúc chuỗi
+                    value = "".join(self._value)
+                    if self._key is None:
+                        self._key = value
+                        self._expect = "colon"
+                    else:
+                        completed[self._key] = self.fields[self._key] = value
+                        self._key = None
+                        self._expect = "comma"
+                    self._value = []
+                elif piece:
+                    self._value.append(piece)
+                    if self._key == self.stream_field:
+                        text_out.append(piece)
+            elif state == "scalar":
+                if ch in ",}" or ch.isspace():
+                    completed[self._key] = self.fields[self._key] = _scalar("".join(self._value))
+                    self._key = None
+                    self._value = []
+                    self._expect = "comma"
+                    self._pos -= 1  # Xử lý lại ký tự kết thúc ở trạng thái comma
+                else:
+                    self._value.append(ch)
+            elif ch.isspace():
+                continue
+            elif state == "key":
+                if ch == '"':
+                    self._expect = "string"
+                elif ch == "}":
+                    self._close()
+            elif state == "colon":
+                if ch == ":":
+                    self._expect = "value"
+            elif state == "value":
+                if ch == '"':
+                    self._expect = "string"
+                else:
+                    self._expect = "scalar"
+                    self._value = [ch]
+            elif state == "comma":
+                if ch == ",":
+                    self._expect = "key"
+                elif ch == "}":
+                    self._close()
+        # Giữ lại buffer để _pos luôn đúng; phản hồi ngắn nên không cần cắt
+        return "".join(text_out), completed
+
+    def _close(self):
+        if self.accept is None or self.accept(self.fields):
+            self.done = True
+            return
+        self.skipped += 1
+        self.fields = {}
+        self._started = False
+        self._key = None
+        self._expect = "key"
+        self._value = []
+
+    def _read_string_char(self, ch):
+        """Trả về ký tự đã giải mã, "" nếu đang giữa escape, None nếu gặp dấu đóng chuỗi"""
+        if self._escape is None:
+            if ch == "\\":
+                self._escape = ""
+                return ""
+            if ch == '"':
+                return None
+            return ch
+        if self._escape == "":
+            if ch == "u":
+                self._escape = "u"
+                return ""
+            self._escape = None
+            return _ESCAPES.get(ch, ch)
+        self._escape += ch
+        if len(self._escape) < 5:
+            return ""
+        code, self._escape = self._escape[1:], None
+        try:
+            return chr(int(code, 16))
+        except ValueError:
+            return ""
+
+
+def _scalar(raw):
+    raw = raw.strip()
+    if raw == "null":
+        return None
+    if raw in ("true", "false"):
+        return raw == "true"
+    try:
+        return float(raw) if any(c in raw for c in ".eE") else int(raw)
+    except ValueError:
+        return raw
+
+
+class SentenceChunker:
+    """Gom text stream thành từng câu để gửi cho TTS"""
+
+    def __init__(self, max_chars=CHUNK_MAX_CHARS, min_chars=CHUNK_MIN_CHARS):
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+        self._buf = ""
+
+    def feed(self, text):
+        self._buf += text
+        chunks = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            chunk, self._buf = self._buf[:cut].strip(), self._buf[cut:]
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self):
+        chunk, self._buf = self._buf.strip(), ""
+        return [chunk] if chunk else []
+
+    def _find_cut(self):
+        for match in SENTENCE_END.finditer(self._buf):
+            if match.end() >= self.min_chars:
+                return match.end()
+        if len(self._buf) > self.max_chars:
+            breaks = [m.end() for m in SOFT_BREAK.finditer(self._buf, 0, self.max_chars)]
+            return breaks[-1] if breaks else self.max_chars
+        return None
@@ -0,0 +1,160 @@
+import os
+import re
+import time
+import asyncio
+from collections import deque
+from google.ai import generativelanguage as glm
+from google.api_core import exceptions as gexc
+
+KEY_RPM_LIMIT = int(os.getenv("GEMINI_KEY_RPM", "15"))                  # Request/phút mỗi key, mỗi model
+KEY_COOLDOWN_BASE = float(os.getenv("GEMINI_KEY_COOLDOWN", "20"))       # Giây nghỉ sau 429 đầu tiên
+KEY_COOLDOWN_MAX = float(os.getenv("GEMINI_KEY_COOLDOWN_MAX", "300"))
+KEY_DAILY_COOLDOWN = float(os.getenv("GEMINI_KEY_DAILY_COOLDOWN", "3600"))  # Hết quota theo ngày
+KEY_MAX_WAIT = float(os.getenv("GEMINI_KEY_MAX_WAIT", "1.0"))           # Chờ tối đa khi mọi key đang đủ RPM
+
+_RETRY_DELAY = re.compile(r"retry(?:_delay)?\D{0,30}?(\d+(?:\.\d+)?)", re.IGNORECASE)  # "retry in 37s" / retry_delay {seconds: 37}
+
+
+class NoKeyAvailable(RuntimeError):
+    """Mọi key đều đang nghỉ/bị khoá: báo lỗi ngay thay vì gọi một request chắc chắn thất bại"""
+
+
+class ApiKey:
+    def __init__(self, secret):
+        self.secret = secret
+        self.label = f"…{secret[-4:]}"
+        self.disabled = False      # Key sai/bị thu hồi: bỏ hẳn
+        self.in_flight = 0
+        self.failures = 0          # 429 liên tiếp (tính cooldown tăng dần)
+        self.cooldown_until = {}   # model -> monotonic (quota Gemini tính theo từng model)
+        self.recent = {}           # model -> deque thời điểm gửi trong 60 s gần nhất
+        self.last_used = 0
+        self._client = None
+        self.stats = {
+            "requests": 0, "ok": 0, "errors": 0, "rate_limited": 0,
+            "latency_ms_avg": 0.0, "last_error": None,
+        }
+
+    @property
+    def client(self):
+        """Client async riêng của key này (không dùng genai.configure toàn cục)"""
+        if self._client is None:
+            self._client = glm.GenerativeServiceAsyncClient(client_options={"api_key": self.secret})
+        return self._client
+
+    def window(self, model, now):
+        recent = self.recent.setdefault(model, deque())
+        while recent and now - recent[0] > 60:
+            recent.popleft()
+        return recent
+
+    def ready_at(self, model, now):
+        """Thời điểm sớm nhất key này dùng được cho model (now = dùng được ngay)"""
+        at = self.cooldown_until.get(model, 0)
+        recent = self.window(model, now)
+        if len(recent) >= KEY_RPM_LIMIT:
+            at = max(at, recent[0] + 60)
+        return max(at, now)
+
+
+class _Lease:
+    def __init__(self, pool, key, model):
+        self.pool = pool
+        self.key = key
+        self.model = model
+        self.started = 0
+
+    async def __aenter__(self):
+        self.started = time.monotonic()
+        return self.key
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.pool.release(self.key, self.model, exc, time.monotonic() - self.started)
+        return False
+
+
+class ApiKeyPool:
+    """Chọn key khoẻ nhất cho từng request: theo dõi RPM, 429, cooldown và lỗi của từng key"""
+
+    def __init__(self, secrets):
+        self.keys = [ApiKey(s) for s in secrets]
+        self.stats = {"leases": 0, "no_key": 0, "waited": 0}
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def lease(self, model):
+        """Mượn key ngay (NoKeyAvailable nếu không có): `async with pool.lease(model) as key:`"""
+        return _Lease(self, self._pick(model), model)
+
+    async def acquire(self, model):
+        """Như lease() nhưng chờ ngắn (KEY_MAX_WAIT) nếu mọi key chỉ đang chạm giới hạn RPM"""
+        now = time.monotonic()
+        usable = [k for k in self.keys if not k.disabled]
+        if usable:
+            wait = min(k.ready_at(model, now) for k in usable) - now
+            if 0 < wait <= KEY_MAX_WAIT:
+                self.stats["waited"] += 1
+                await asyncio.sleep(wait)
+        return self.lease(model)
+
+    def _pick(self, model):
+        now = time.monotonic()
+        candidates = [k for k in self.keys if not k.disabled and k.ready_at(model, now) <= now]
+        if not candidates:
+            self.stats["no_key"] += 1
+            raise NoKeyAvailable(f"No Gemini key available for {model}")
+        # Ít request đang chạy, ít lỗi gần đây, còn nhiều quota trong phút, lâu chưa dùng
+        key = min(candidates, key=lambda k: (
+            k.in_flight, k.failures, len(k.window(model, now)), k.last_used,
+        ))
+        key.in_flight += 1
+        key.last_used = now
+        key.window(model, now).append(now)
+        key.stats["requests"] += 1
+        self.stats["leases"] += 1
+        return key
+
+    def release(self, key, model, exc, elapsed):
+        key.in_flight -= 1
+        if exc is None:
+            key.failures = 0
+            key.stats["ok"] += 1
+            ms = elapsed * 1000
+            key.stats["latency_ms_avg"] = round(key.stats["latency_ms_avg"] * 0.8 + ms * 0.2, 1)
+            return
+        if isinstance(exc, (asyncio.CancelledError, GeneratorExit)):
+            return  # Bị huỷ (client ngắt, dừng khẩn): không phải lỗi của key
+
+        key.stats["errors"] += 1
+        key.stats["last_error"] = str(exc)[:200]
+        message = str(exc).lower()
+        if isinstance(exc, (gexc.ResourceExhausted, gexc.TooManyRequests)) or "429" in message or "quota" in message:
+            key.stats["rate_limited"] += 1
+            key.failures += 1
+            key.cooldown_until[model] = time.monotonic() + self._cooldown(key, message)
+            print(f"⏳ Gemini key {key.label} cooling down for {model}")
+        elif isinstance(exc, (gexc.PermissionDenied, gexc.Unauthenticated)) or "api key not valid" in message:
+            key.disabled = True
+            print(f"🚫 Gemini key {key.label} disabled: {exc}")
+
+    @staticmethod
+    def _cooldown(key, message):
+        if "per day" in message or "perday" in message:
+            return KEY_DAILY_COOLDOWN
+        match = _RETRY_DELAY.search(message)
+        if match:
+            return min(float(match.group(1)) + 1, KEY_COOLDOWN_MAX)
+        return min(KEY_COOLDOWN_BASE * 2 ** (key.failures - 1), KEY_COOLDOWN_MAX)
+
+    def metrics(self):
+        now = time.monotonic()
+        keys = {}
+        for k in self.keys:
+            keys[k.label] = dict(
+                k.stats,
+                in_flight=k.in_flight,
+                disabled=k.disabled,
+                cooldown_s={m: round(t - now, 1) for m, t in k.cooldown_until.items() if t > now},
+            )
+        return {**self.stats, "keys": keys}
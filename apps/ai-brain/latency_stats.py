@@ -0,0 +1,47 @@
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+
+class LatencyHistogram:
+    """Histogram độ trễ theo bucket cố định (ms) + đếm lỗi/huỷ, đủ rẻ để ghi mỗi request"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Bucket cuối: > bucket lớn nhất
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.stats = {"ok": 0, "errors": 0, "cancelled": 0, "wins": 0}
+
+    def record(self, ms):
+        self.stats["ok"] += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        for i, bound in enumerate(self.buckets):
+            if ms <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def percentile(self, p):
+        """Ước lượng phân vị (cận trên của bucket chứa nó)"""
+        n = sum(self.counts)
+        if not n:
+            return None
+        rank = p / 100 * n
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else round(self.max_ms)
+        return round(self.max_ms)
+
+    def snapshot(self):
+        n = sum(self.counts)
+        labels = [f"<={b}" for b in self.buckets] + [f">{self.buckets[-1]}"]
+        return {
+            **self.stats,
+            "avg_ms": round(self.total_ms / n, 1) if n else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "max_ms": round(self.max_ms, 1),
+            "buckets": dict(zip(labels, self.counts)),
+        }
@@ -0,0 +1,129 @@
+import os
+from collections import deque
+import numpy as np
+import cv2
+
+LOCK_WINDOW = int(os.getenv("LOCK_WINDOW", "8"))            # M: số khung gần nhất dùng để bỏ phiếu
+LOCK_VOTES = int(os.getenv("LOCK_VOTES", "5"))              # N: số khung (trong M) phải thấy mã để khoá
+LOCK_MIN_CONFIDENCE = float(os.getenv("LOCK_MIN_CONFIDENCE", "0.5"))
+LOCK_RELEASE_FRAMES = int(os.getenv("LOCK_RELEASE_FRAMES", "15"))  # Mất mã liên tục N khung mới nhả khoá
+LOCK_REARM_SECONDS = float(os.getenv("LOCK_REARM_SECONDS", "5"))   # Cùng ID phải vắng chừng này mới tính lượt tiếp cận mới
+LOCK_FULL_AREA = 3000.0     # px² (ở 640x480): mã lớn cỡ này trở lên được điểm diện tích tối đa
+LOCK_SHAPE_TOLERANCE = 0.08 # Sai khác hình dạng góc (đã chuẩn hoá) giữa 2 khung coi là rung mạnh
+
+SEARCHING, CANDIDATE, LOCKED = "searching", "candidate", "locked"
+
+
+def _shape(corners):
+    """Góc 4x2 đã bỏ tịnh tiến và tỉ lệ: so sánh hình dạng khi robot đang tiến lại gần"""
+    centered = corners - corners.mean(axis=0)
+    scale = np.sqrt((centered ** 2).sum(axis=1).mean())
+    return centered / scale if scale > 0 else centered
+
+
+class LockOnStateMachine:
+    """Khoá mục tiêu từ kết quả detect theo thứ tự khung: searching -> candidate -> locked
+
+    - Bỏ phiếu N-trong-M khung, mỗi phiếu kèm độ tin cậy (diện tích mã + độ ổn định góc).
+    - Trễ theo từng ID: khoá cần N phiếu, nhả khoá chỉ sau LOCK_RELEASE_FRAMES khung mất liên tục;
+      ID đã báo chỉ được báo lại khi vắng mặt ít nhất LOCK_REARM_SECONDS.
+    - update() trả về sự kiện phát hiện (một lần cho mỗi lượt tiếp cận) hoặc None.
+    """
+
+    def __init__(self, window=LOCK_WINDOW, votes=LOCK_VOTES, min_confidence=LOCK_MIN_CONFIDENCE,
+                 release_frames=LOCK_RELEASE_FRAMES, rearm_seconds=LOCK_REARM_SECONDS):
+        self.window = window
+        self.votes = votes
+        self.min_confidence = min_confidence
+        self.release_frames = release_frames
+        self.rearm_seconds = rearm_seconds
+        self.state = SEARCHING
+        self.locked_id = None
+        self._frames = deque(maxlen=window)  # Mỗi khung: {marker_id: confidence}
+        self._shapes = {}                    # marker_id -> hình dạng góc khung trước
+        self._last_seen = {}                 # marker_id -> thời điểm thấy gần nhất
+        self._reported = set()               # ID đã báo trong lượt tiếp cận hiện tại
+        self._missing = 0
+        self.stats = {"frames": 0, "locks": 0, "switches": 0, "suppressed": 0, "released": 0}
+
+    def confidence(self, marker_id, corners):
+        """0..1: trung bình điểm diện tích và điểm ổn định hình dạng so với khung trước"""
+        area = cv2.contourArea(corners)
+        area_score = min(1.0, area / LOCK_FULL_AREA)
+        shape = _shape(corners)
+        previous = self._shapes.get(marker_id)
+        self._shapes[marker_id] = shape
+        if previous is None:
+            stability = 0.5  # Lần đầu thấy: chưa biết
+        else:
+            drift = float(np.abs(shape - previous).mean())
+            stability = max(0.0, 1.0 - drift / LOCK_SHAPE_TOLERANCE)
+        return 0.5 * area_score + 0.5 * stability
+
+    def update(self, ids, corners, now):
+        """ids/corners như kết quả detectMarkers; now: thời điểm chụp khung (giây)"""
+        self.stats["frames"] += 1
+        seen = {}
+        if ids is not None:
+            for i in range(len(ids)):
+                marker_id = int(ids[i][0])
+                score = self.confidence(marker_id, corners[i].reshape(4, 2).astype(np.float32))
+                seen[marker_id] = max(score, seen.get(marker_id, 0.0))
+        for marker_id in list(self._shapes):
+            if marker_id not in seen:
+                del self._shapes[marker_id]  # Mất mã: lần sau tính ổn định lại từ đầu
+
+        # Hết thời gian vắng: ID được phép báo lại ở lượt tiếp cận sau
+        for marker_id in list(self._reported):
+            if marker_id not in seen and now - self._last_seen.get(marker_id, now) >= self.rearm_seconds:
+                self._reported.discard(marker_id)
+        for marker_id in seen:
+            self._last_seen[marker_id] = now
+        self._frames.append(seen)
+
+        winner, votes, score = self._tally()
+
+        if self.state == LOCKED:
+            if self.locked_id in seen:
+                self._missing = 0
+            else:
+                self._missing += 1
+            if winner is not None and winner != self.locked_id and self.locked_id not in seen:
+                self.stats["switches"] += 1  # Mã khác đủ phiếu trong khi mã đang khoá đã mất
+                return self._lock(winner, votes, score)
+            if self._missing >= self.release_frames:
+                self.stats["released"] += 1
+                self.state, self.locked_id = SEARCHING, None
+            return None
+
+        if winner is None:
+            self.state = CANDIDATE if seen else SEARCHING
+            return None
+        return self._lock(winner, votes, score)
+
+    def _tally(self):
+        """ID đạt N phiếu và độ tin cậy trung bình đủ cao (nhiều phiếu nhất thắng)"""
+        totals = {}
+        for frame in self._frames:
+            for marker_id, score in frame.items():
+                count, total = totals.get(marker_id, (0, 0.0))
+                totals[marker_id] = (count + 1, total + score)
+        best = None
+        for marker_id, (count, total) in totals.items():
+            mean = total / count
+            if count >= self.votes and mean >= self.min_confidence:
+                if best is None or (count, mean) > best[1:]:
+                    best = (marker_id, count, mean)
+        return best if best is not None else (None, 0, 0.0)
+
+    def _lock(self, marker_id, votes, score):
+        self.state, self.locked_id, self._missing = LOCKED, marker_id, 0
+        if marker_id in self._reported:
+            self.stats["suppressed"] += 1  # Vẫn là lượt tiếp cận cũ (mã vừa khuất rồi hiện lại)
+            return None
+        self._reported.add(marker_id)
+        self.stats["locks"] += 1
+        return {"marker_id": marker_id, "votes": votes, "confidence": round(score, 2)}
+
+    def metrics(self):
+        return {"lock_state": self.state, "locked_id": self.locked_id, **{f"lock_{k}": v for k, v in self.stats.items()}}
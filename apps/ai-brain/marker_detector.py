@@ -0,0 +1,261 @@
+import os
+import time
+import threading
+import numpy as np
+import cv2
+import cv2.aruco as aruco
+
+FRAME_SIZE = (640, 480)
+TRACK_FULL_EVERY = int(os.getenv("VISION_FULL_EVERY", "15"))  # Cứ N khung tracking thì quét lại toàn khung
+TRACK_MARGIN = 0.6       # ROI = khung bao của mã, nới thêm 60% kích thước mỗi phía
+TRACK_MIN_ROI = 64       # px, ROI không nhỏ hơn
+
+
+# Bộ tham số theo loại mã. phone_screen là bộ gốc (mã hiển thị trên điện thoại, dễ lóa)
+PROFILES = {
+    "phone_screen": {
+        "adaptiveThreshWinSizeMin": 3, "adaptiveThreshWinSizeMax": 23, "adaptiveThreshWinSizeStep": 5,
+        "adaptiveThreshConstant": 7, "minMarkerPerimeterRate": 0.05, "polygonalApproxAccuracyRate": 0.05,
+    },
+    # Mã in giấy: biên sắc nét, ít thang ngưỡng hơn, bắt được mã nhỏ hơn
+    "printed": {
+        "adaptiveThreshWinSizeMin": 3, "adaptiveThreshWinSizeMax": 23, "adaptiveThreshWinSizeStep": 10,
+        "adaptiveThreshConstant": 7, "minMarkerPerimeterRate": 0.03, "polygonalApproxAccuracyRate": 0.03,
+    },
+    # Thiếu sáng: cửa sổ ngưỡng lớn, hằng số thấp, chấp nhận vùng tương phản kém
+    "low_light": {
+        "adaptiveThreshWinSizeMin": 5, "adaptiveThreshWinSizeMax": 35, "adaptiveThreshWinSizeStep": 10,
+        "adaptiveThreshConstant": 3, "minMarkerPerimeterRate": 0.04, "polygonalApproxAccuracyRate": 0.06,
+        "minOtsuStdDev": 2.0,
+    },
+    # Trong ROI quanh mã đã khoá: mã chiếm phần lớn ảnh, 2 thang ngưỡng là đủ, bỏ contour vụn
+    "roi": {
+        "adaptiveThreshWinSizeMin": 5, "adaptiveThreshWinSizeMax": 15, "adaptiveThreshWinSizeStep": 10,
+        "adaptiveThreshConstant": 7, "minMarkerPerimeterRate": 0.2, "polygonalApproxAccuracyRate": 0.05,
+    },
+}
+SCAN_PROFILES = ("phone_screen", "printed", "low_light")
+DEFAULT_PROFILE = os.getenv("VISION_PROFILE", "phone_screen")
+PYRAMID_SCALE = float(os.getenv("VISION_PYRAMID_SCALE", "0.5"))  # Lượt quét nhanh ở ảnh thu nhỏ, 1 = tắt
+PROFILE_WINDOW = 30        # Số lần quét có ứng viên để đánh giá một profile
+PROFILE_MIN_HIT_RATE = 0.4 # Thấp hơn: thử profile khác
+LOW_LIGHT_LEVEL = 60       # Độ sáng trung bình (0-255) coi là thiếu sáng
+MARKER_SIZE_M = float(os.getenv("VISION_MARKER_SIZE", "0.10"))  # Cạnh mã thật (m), cho ước lượng khoảng cách
+CAMERA_HFOV_DEG = float(os.getenv("VISION_HFOV", "60"))         # Góc nhìn ngang webcam khi chưa hiệu chuẩn
+
+
+def build_detector(profile=DEFAULT_PROFILE):
+    """ArUco detector theo profile tham số"""
+    aruco_dict = aruco.getPredefinedDictionary(aruco.DICT_4X4_50)
+    parameters = aruco.DetectorParameters()
+    for name, value in PROFILES[profile].items():
+        setattr(parameters, name, value)
+    return aruco.ArucoDetector(aruco_dict, parameters)
+
+
+def camera_matrix(frame_size=FRAME_SIZE, hfov_deg=CAMERA_HFOV_DEG):
+    """Ma trận camera xấp xỉ từ góc nhìn (tâm ảnh ở giữa, pixel vuông, không méo)"""
+    w, h = frame_size
+    focal = (w / 2) / np.tan(np.deg2rad(hfov_deg) / 2)
+    return np.array([[focal, 0, w / 2], [0, focal, h / 2], [0, 0, 1]], dtype=np.float64)
+
+
+def estimate_pose(corners, matrix, marker_size=MARKER_SIZE_M):
+    """solvePnP cho một mã (góc ở toạ độ FRAME_SIZE) -> (khoảng cách m, góc lệch độ; dương = bên phải)"""
+    half = marker_size / 2
+    # Thứ tự góc của ArUco: trên-trái, trên-phải, dưới-phải, dưới-trái (IPPE_SQUARE yêu cầu đúng thứ tự này)
+    object_points = np.array([[-half, half, 0], [half, half, 0], [half, -half, 0], [-half, -half, 0]],
+                             dtype=np.float64)
+    ok, _, tvec = cv2.solvePnP(object_points, corners.reshape(4, 2).astype(np.float64), matrix, None,
+                               flags=cv2.SOLVEPNP_IPPE_SQUARE)
+    if not ok:
+        return None
+    x, _, z = tvec.ravel()
+    return float(np.linalg.norm(tvec)), float(np.degrees(np.arctan2(x, z)))
+
+
+class ProfileSelector:
+    """Chọn profile theo tỉ lệ giải mã thành công trên các lần quét có ứng viên gần đây"""
+
+    def __init__(self, profile=DEFAULT_PROFILE):
+        self.profile = profile
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._tries = 0
+        self.rates = {}  # profile -> tỉ lệ thành công lần đánh giá gần nhất
+        self.switches = 0
+
+    def record(self, hit, had_candidates, brightness):
+        with self._lock:
+            dark_ok = self.rates.get("low_light", 1) >= PROFILE_MIN_HIT_RATE
+            if brightness < LOW_LIGHT_LEVEL and self.profile != "low_light" and not hit and dark_ok:
+                self._switch("low_light")
+                return
+            if not hit and not had_candidates:
+                return  # Không có gì trong khung: không đánh giá được profile
+            self._tries += 1
+            self._hits += hit
+            if self._tries < PROFILE_WINDOW:
+                return
+            rate = self._hits / self._tries
+            self.rates[self.profile] = round(rate, 2)
+            if rate < PROFILE_MIN_HIT_RATE:
+                # Thử profile chưa đánh giá, hoặc profile tốt nhất từng thấy
+                untried = [p for p in SCAN_PROFILES if p not in self.rates]
+                best = untried[0] if untried else max(self.rates, key=self.rates.get)
+                if best == self.profile:
+                    best = SCAN_PROFILES[(SCAN_PROFILES.index(self.profile) + 1) % len(SCAN_PROFILES)]
+                self._switch(best)
+            else:
+                self._hits = self._tries = 0
+
+    def _switch(self, profile):
+        print(f"🎛️ Vision profile: {self.profile} -> {profile}")
+        self.profile = profile
+        self.switches += 1
+        self._hits = self._tries = 0
+
+
+class MarkerDetector:
+    """Detect ArUco với chế độ tracking: khi đã khoá mã, các khung sau chỉ tìm trong ROI dự đoán
+    bằng bộ tham số rẻ; quét toàn khung định kỳ (TRACK_FULL_EVERY) hoặc khi mất mã.
+    Quét toàn khung đi từ ảnh thu nhỏ lên ảnh đầy đủ, với profile tham số tự chọn theo tỉ lệ trúng.
+
+    detect() chạy song song trên các worker; observe() được gọi theo thứ tự khung để cập nhật ROI.
+    """
+
+    def __init__(self, tracking=True, full_every=TRACK_FULL_EVERY, pyramid_scale=PYRAMID_SCALE,
+                 profile=DEFAULT_PROFILE, adaptive=True):
+        self.tracking = tracking
+        self.full_every = full_every
+        self.pyramid_scale = pyramid_scale
+        self.selector = ProfileSelector(profile)
+        self.adaptive = adaptive  # False: giữ cố định profile (benchmark/tinh chỉnh)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._track = None       # (marker_id, corners 4x2 float, velocity 2) của mã đang theo
+        self._since_full = 0
+        self._stats_lock = threading.Lock()  # detect() chạy trên nhiều worker cùng lúc
+        self.stats = {"full": 0, "roi_hits": 0, "roi_misses": 0, "pyramid_hits": 0, "escalations": 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _detector(self, profile):
+        detectors = getattr(self._local, "detectors", None)
+        if detectors is None:
+            detectors = self._local.detectors = {}
+        if profile not in detectors:
+            detectors[profile] = build_detector(profile)
+        return detectors[profile]
+
+    def detect(self, original_frame):
+        """Trả về dict {corners, ids, view, mode, prep_ms}"""
+        started = time.perf_counter()
+        # Resize nhẹ để cân bằng giữa tốc độ và độ chính xác
+        frame = cv2.resize(original_frame, FRAME_SIZE)
+
+        # Chuyển xám đơn giản (Bỏ equalizeHist vì gây lóa trên màn hình điện thoại)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        prep_ms = (time.perf_counter() - started) * 1000
+
+        roi = self._predict_roi(gray.shape)
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            corners, ids, _ = self._detector("roi").detectMarkers(gray[y0:y1, x0:x1])
+            if ids is not None:
+                self._count("roi_hits")
+                offset = np.array([x0, y0], dtype=np.float32)
+                corners = tuple(c + offset for c in corners)
+                return {"corners": corners, "ids": ids, "view": frame, "mode": "roi", "prep_ms": prep_ms}
+            self._count("roi_misses")  # Mất mã trong ROI: quét lại toàn khung ngay
+
+        self._count("full")
+        profile = self.selector.profile
+        detector = self._detector(profile)
+        corners, ids, had_candidates, mode = self._scan(detector, gray)
+        if self.adaptive:
+            self.selector.record(ids is not None, had_candidates, float(gray.mean()))
+        return {"corners": corners, "ids": ids, "view": frame, "mode": mode, "profile": profile, "prep_ms": prep_ms}
+
+    def _scan(self, detector, gray):
+        """Quét ảnh thu nhỏ trước; chỉ quét độ phân giải đầy đủ khi lượt nhỏ không giải mã được"""
+        had_candidates = False
+        if self.pyramid_scale < 1:
+            small = cv2.resize(gray, None, fx=self.pyramid_scale, fy=self.pyramid_scale,
+                               interpolation=cv2.INTER_AREA)
+            corners, ids, rejected = detector.detectMarkers(small)
+            if ids is not None:
+                self._count("pyramid_hits")
+                scale = np.float32(1 / self.pyramid_scale)
+                corners = tuple(self._refine(gray, c * scale) for c in corners)
+                return corners, ids, True, "pyramid"
+            had_candidates = len(rejected) > 0
+            self._count("escalations")
+
+        corners, ids, rejected = detector.detectMarkers(gray)
+        return corners, ids, had_candidates or len(rejected) > 0 or ids is not None, "full"
+
+    @staticmethod
+    def _refine(gray, corners):
+        """Tinh chỉnh góc đã phóng to về độ phân giải đầy đủ (cần cho ước lượng pose)"""
+        points = corners.reshape(-1, 1, 2).astype(np.float32)
+        cv2.cornerSubPix(gray, points, (3, 3), (-1, -1),
+                         (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 0.05))
+        return points.reshape(corners.shape)
+
+    def metrics(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {**stats, "profile": self.selector.profile, "profile_rates": self.selector.rates,
+                "profile_switches": self.selector.switches}
+
+    def _predict_roi(self, shape):
+        if not self.tracking:
+            return None
+        with self._lock:
+            if self._track is None or self._since_full >= self.full_every:
+                self._since_full = 0
+                return None
+            self._since_full += 1
+            _, corners, velocity = self._track
+        # Dự đoán vị trí theo vận tốc khung trước, nới rộng để chịu rung/đổi kích thước
+        predicted = corners + velocity
+        (x0, y0), (x1, y1) = predicted.min(axis=0), predicted.max(axis=0)
+        h, w = shape
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        if not (0 <= cx < w and 0 <= cy < h):
+            return None  # Tâm dự đoán đã ra ngoài khung: quét toàn khung
+        # Mã nhỏ/ở xa: nới ROI lên tối thiểu TRACK_MIN_ROI quanh tâm dự đoán thay vì bỏ tracking
+        half = max(max(x1 - x0, y1 - y0) * (0.5 + TRACK_MARGIN), TRACK_MIN_ROI / 2)
+        (x0, x1), (y0, y1) = self._clamp(cx, half, w), self._clamp(cy, half, h)
+        return x0, y0, x1, y1
+
+    @staticmethod
+    def _clamp(center, half, limit):
+        """Đoạn [center-half, center+half] dời vào trong [0, limit] (giữ kích thước nếu đủ chỗ)"""
+        size = min(int(round(2 * half)), limit)
+        start = min(max(0, int(round(center - half))), limit - size)
+        return start, start + size
+
+    def observe(self, result):
+        """Cập nhật mã đang theo từ kết quả đã quyết định (gọi theo thứ tự khung)"""
+        ids, corners = result["ids"], result["corners"]
+        with self._lock:
+            if ids is None:
+                self._track = None
+                return
+            # Ưu tiên mã đang theo, nếu không có thì theo mã lớn nhất (gần nhất)
+            index = None
+            if self._track is not None:
+                matches = [i for i in range(len(ids)) if int(ids[i][0]) == self._track[0]]
+                index = matches[0] if matches else None
+            if index is None:
+                index = max(range(len(ids)), key=lambda i: cv2.contourArea(corners[i].reshape(4, 2)))
+            marker_id = int(ids[index][0])
+            current = corners[index].reshape(4, 2).astype(np.float32)
+            velocity = np.zeros(2, dtype=np.float32)
+            if self._track is not None and self._track[0] == marker_id:
+                velocity = (current - self._track[1]).mean(axis=0)
+            self._track = (marker_id, current, velocity)
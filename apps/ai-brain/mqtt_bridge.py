@@ -0,0 +1,100 @@
+import time
+import asyncio
+import threading
+from collections import deque
+
+MQTT_BRIDGE_QUEUE_SIZE = 256  # Số sự kiện trạng thái tối đa chờ xử lý
+
+
+class MqttBridge:
+    """Đưa message MQTT vào event loop của Hub (an toàn khi gọi từ thread khác)
+
+    Telemetry được gộp (chỉ giữ giá trị mới nhất mỗi trường), sự kiện trạng thái
+    đi qua hàng đợi có giới hạn và được xử lý theo đúng thứ tự nhận.
+    """
+
+    def __init__(self, telemetry_state, on_status, maxsize=MQTT_BRIDGE_QUEUE_SIZE):
+        self.telemetry_state = telemetry_state
+        self.on_status = on_status  # on_status(target_id, data) chạy trên event loop
+        self.routes = {}            # topic -> handler(data) riêng (vd. sự kiện vision), thay cho on_status
+        self.loop = None
+        self._lock = threading.Lock()
+        self._events = deque()
+        self._maxsize = maxsize
+        self._telemetry = {}
+        self._telemetry_at = None
+        self._ready = None
+        self._wake_pending = False
+        self.stats = {
+            "received": 0, "coalesced": 0, "dropped": 0,
+            "latency_ms_last": 0.0, "latency_ms_avg": 0.0, "latency_ms_max": 0.0,
+        }
+
+    def attach(self, loop):
+        """Gắn event loop đang chạy (gọi một lần trong main)"""
+        self._ready = asyncio.Event()
+        with self._lock:
+            self.loop = loop
+            if self._events or self._telemetry:
+                self._wake_pending = True
+                self._ready.set()
+
+    def route(self, topic, handler):
+        """Message trên topic này gọi handler(data) trên event loop thay vì on_status"""
+        self.routes[topic] = handler
+
+    def submit(self, topic, data):
+        """Chỉ đẩy vào buffer và đánh thức consumer (gọi được từ bất kỳ thread nào)"""
+        received_at = time.monotonic()
+        with self._lock:
+            self.stats["received"] += 1
+            if "telemetry" in topic:
+                if self._telemetry:
+                    self.stats["coalesced"] += 1
+                else:
+                    self._telemetry_at = received_at
+                self._telemetry.update(data)
+            else:
+                if len(self._events) >= self._maxsize:
+                    self._events.popleft()
+                    self.stats["dropped"] += 1
+                self._events.append((received_at, topic, data))
+            if self.loop is None or self._wake_pending:
+                return
+            self._wake_pending = True
+        self.loop.call_soon_threadsafe(self._ready.set)
+
+    async def run(self):
+        print("🌉 MQTT Bridge Started")
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            with self._lock:
+                self._wake_pending = False
+                telemetry, self._telemetry = self._telemetry, {}
+                telemetry_at = self._telemetry_at
+                events = list(self._events)
+                self._events.clear()
+
+            if telemetry:
+                self.telemetry_state.update(telemetry)
+                self._record_latency(telemetry_at)
+
+            for received_at, topic, data in events:
+                try:
+                    handler = self.routes.get(topic)
+                    if handler:
+                        handler(data)
+                    else:
+                        self.on_status(topic.split('/')[1], data)
+                except Exception as e:
+                    print(f"⚠️ MQTT Bridge Error [{topic}]: {e}")
+                self._record_latency(received_at)
+
+    def _record_latency(self, received_at):
+        if received_at is None:
+            return
+        ms = (time.monotonic() - received_at) * 1000
+        self.stats["latency_ms_last"] = round(ms, 2)
+        self.stats["latency_ms_avg"] = round(self.stats["latency_ms_avg"] * 0.9 + ms * 0.1, 2)
+        self.stats["latency_ms_max"] = round(max(self.stats["latency_ms_max"], ms), 2)
@@ -0,0 +1,137 @@
+import time
+import random
+import asyncio
+from collections import deque
+import aiomqtt
+
+MQTT_RECONNECT_MIN = 1.0    # Giây
+MQTT_RECONNECT_MAX = 30.0
+MQTT_OUTBOX_SIZE = 200      # Số message tối đa giữ lại khi broker mất kết nối
+MQTT_OUTBOX_TTL = 5.0       # Giây: lệnh cũ hơn không gửi lại (tránh robot chạy lệnh đã lỗi thời)
+                            # Lệnh khẩn (stop/emergency) không bao giờ hết hạn: robot đang chạy phải dừng được
+
+
+class AsyncMqttHub:
+    """Client MQTT chạy thẳng trên event loop của Hub: tự kết nối lại, giữ outbox khi broker mất"""
+
+    def __init__(self, host, port, subscriptions, on_message, on_connect=None, client_id="ai_brain_hub"):
+        self.host = host
+        self.port = port
+        self.subscriptions = subscriptions
+        self.on_message = on_message  # on_message(topic, payload_bytes)
+        self.on_connect = on_connect  # coroutine function, chạy mỗi lần kết nối thành công
+        self.client_id = client_id
+        self.connected = False
+        self._outbox = deque()  # [topic, payload, qos, retain, queued_at, future, urgent]
+        self._outbox_ready = asyncio.Event()
+        self._expirer = None
+        self._on_connect_task = None
+        self.stats = {
+            "published": 0, "expired": 0, "dropped": 0,
+            "reconnects": 0, "outbox": 0, "last_error": None,
+        }
+
+    def publish(self, topic, payload, qos=0, retain=False, urgent=False):
+        """Không chặn: xếp vào outbox, trả về Future = True khi broker đã nhận (QoS>0: đã PUBACK).
+        urgent=True (stop/emergency): không hết hạn, không bị bỏ khi outbox đầy."""
+        future = asyncio.get_running_loop().create_future()
+        if len(self._outbox) >= MQTT_OUTBOX_SIZE:
+            # Bỏ message thường cũ nhất; chỉ toàn lệnh khẩn thì bỏ lệnh khẩn cũ nhất (giữ lệnh mới nhất)
+            index = next((i for i, entry in enumerate(self._outbox) if not entry[6]), 0)
+            dropped = self._outbox[index]
+            del self._outbox[index]
+            self._resolve(dropped[5], False)
+            self.stats["dropped"] += 1
+        self._outbox.append([topic, payload, qos, retain, time.monotonic(), future, urgent])
+        self.stats["outbox"] = len(self._outbox)
+        self._outbox_ready.set()
+        return future
+
+    async def run(self):
+        delay = MQTT_RECONNECT_MIN
+        # Khi mất broker, _sender không chạy: vẫn phải báo lỗi cho lệnh quá hạn trong outbox
+        self._expirer = asyncio.create_task(self._expire_offline())
+        try:
+            while True:
+                try:
+                    async with aiomqtt.Client(self.host, self.port, identifier=self.client_id, keepalive=60) as client:
+                        self.connected = True
+                        delay = MQTT_RECONNECT_MIN
+                        print(f"✅ Connected to MQTT Broker")
+                        for topic in self.subscriptions:
+                            await client.subscribe(topic)
+                        tasks = [
+                            asyncio.create_task(self._reader(client)),
+                            asyncio.create_task(self._sender(client)),
+                        ]
+                        if self.on_connect:
+                            self._on_connect_task = asyncio.create_task(self.on_connect())
+                        try:
+                            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+                            for task in done:
+                                task.result()
+                        finally:
+                            for task in tasks:
+                                task.cancel()
+                except aiomqtt.MqttError as e:
+                    self.stats["last_error"] = str(e)
+                    print(f"⚠️ MQTT Offline: {e}")
+                finally:
+                    self.connected = False
+
+                # Back-off có jitter để nhiều client không cùng dồn vào broker vừa khởi động lại
+                self.stats["reconnects"] += 1
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                delay = min(delay * 2, MQTT_RECONNECT_MAX)
+        finally:
+            self._expirer.cancel()
+
+    async def _reader(self, client):
+        async for message in client.messages:
+            try:
+                self.on_message(message.topic.value, message.payload)
+            except Exception as e:
+                print(f"⚠️ MQTT Msg Error [{message.topic.value}]: {e}")
+
+    async def _sender(self, client):
+        while True:
+            if not self._outbox:
+                self._outbox_ready.clear()
+                await self._outbox_ready.wait()
+                continue
+            if self._expire():
+                continue
+            topic, payload, qos, retain, queued_at, future, _ = self._outbox[0]
+            # Lỗi ở đây làm rớt kết nối; message vẫn nằm đầu outbox để gửi lại sau khi kết nối
+            await client.publish(topic, payload, qos=qos, retain=retain)
+            self._outbox.popleft()
+            self.stats["published"] += 1
+            self.stats["outbox"] = len(self._outbox)
+            self._resolve(future, True)
+
+    async def _expire_offline(self):
+        while True:
+            await asyncio.sleep(MQTT_OUTBOX_TTL / 5)
+            if not self.connected:
+                self._expire()
+
+    def _expire(self):
+        """Bỏ các message thường quá MQTT_OUTBOX_TTL (future -> False), giữ lệnh khẩn; trả về số message bỏ"""
+        now = time.monotonic()
+        kept = deque()
+        for entry in self._outbox:
+            if not entry[6] and now - entry[4] > MQTT_OUTBOX_TTL:
+                self._resolve(entry[5], False)
+            else:
+                kept.append(entry)
+        expired = len(self._outbox) - len(kept)
+        if expired:
+            self._outbox = kept
+            self.stats["expired"] += expired
+            self.stats["outbox"] = len(self._outbox)
+        return expired
+
+    @staticmethod
+    def _resolve(future, ok):
+        if not future.done():
+            future.set_result(ok)
@@ -0,0 +1,30 @@
+"""
+Pre-warm lời kể di sản cho WRO 2026
+Chạy trước mỗi lượt thi để `site_discovered` lấy lời kể từ cache thay vì gọi Gemini.
+    python prewarm_narration.py [vi-VN en-US ...]
+"""
+import os
+import sys
+import json
+import asyncio
+from gemini_service import gemini_service
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../packages/shared-config/config.json")
+
+
+def load_site_names():
+    with open(CONFIG_PATH, encoding="utf-8") as f:
+        config = json.load(f)
+    return [site["name"] for site in config.get("heritage_info", {}).values()]
+
+
+async def main():
+    langs = sys.argv[1:] or ["vi-VN", "en-US"]
+    sites = load_site_names()
+    print(f"🔥 Pre-warming {len(sites)} sites x {len(langs)} languages...")
+    warmed = await gemini_service.prewarm_sites(sites, langs)
+    print(f"✅ Generated {warmed} new narrations. Cache stats: {gemini_service.cache.stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+import os
+import time
+import json
+import asyncio
+import hashlib
+from db_client import db_gateway, get_async_db
+
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "30"))  # Giây
+
+
+def build_config_message(profile):
+    """Dựng payload cấu hình gửi EV3 (chỉ các trường robot thực sự dùng)"""
+    return json.dumps({
+        "name": profile.get("name", "Robot"),
+        "motor_ports": profile.get('motor_ports', {}),
+        "sensor_config": profile.get('sensor_config', {}),
+        "speeds": profile.get('speed_profile', {})
+    })
+
+
+def config_hash(profile):
+    # Hash nội dung thay vì updated_at: dashboard ghi đè cả updated_at cũ khi lưu profile
+    canonical = json.dumps(json.loads(build_config_message(profile)), sort_keys=True)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+class ProfileCache:
+    """Cache profile robot đang active, chỉ báo cần publish khi nội dung cấu hình đổi"""
+
+    def __init__(self, ttl=PROFILE_CACHE_TTL):
+        self.ttl = ttl
+        self.profile = None
+        self.fetched_at = 0
+        self.published_hash = None
+        self.changed = asyncio.Event()
+        self.stats = {"hits": 0, "fetches": 0, "errors": 0, "publishes": 0, "suppressed": 0}
+
+    def invalidate(self):
+        """Bỏ cache để lần đọc kế tiếp lấy từ DB (gọi khi profile bị sửa)"""
+        self.fetched_at = 0
+        self.changed.set()
+
+    async def get(self):
+        if self.profile is not None and time.monotonic() - self.fetched_at < self.ttl:
+            self.stats["hits"] += 1
+            return self.profile
+        try:
+            query = db_gateway.table("robot_profiles").select("*").eq("is_active", True).single()
+            response = await db_gateway.execute(query)
+            self.stats["fetches"] += 1
+            self.profile = response.data
+            self.fetched_at = time.monotonic()
+        except Exception as e:
+            # Lỗi mạng: dùng tạm profile cũ nếu có
+            self.stats["errors"] += 1
+            print(f"⚠️ Profile fetch failed: {e}")
+        return self.profile
+
+    def needs_publish(self, profile, force=False):
+        digest = config_hash(profile)
+        if not force and digest == self.published_hash:
+            self.stats["suppressed"] += 1
+            return False
+        return True
+
+    def mark_published(self, profile):
+        self.published_hash = config_hash(profile)
+        self.stats["publishes"] += 1
+
+    async def watch(self):
+        """Nghe thay đổi robot_profiles qua Realtime để cập nhật ngay (không có thì dựa vào TTL)"""
+        try:
+            client = await get_async_db()
+            channel = client.channel("robot_profiles:watch")
+            channel.on_postgres_changes(
+                "*",
+                lambda payload: self.invalidate(),
+                table="robot_profiles",
+                schema="public",
+            )
+            await channel.subscribe()
+            print("⚡ Realtime subscribed: robot_profiles")
+        except Exception as e:
+            print(f"⚠️ Profile watch unavailable, using TTL {self.ttl}s: {e}")
+
+
+profile_cache = ProfileCache()
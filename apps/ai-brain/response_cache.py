@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import hashlib
+from collections import OrderedDict
+
+RESPONSE_CACHE_PATH = os.getenv(
+    "RESPONSE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "gemini_responses.sqlite3"),
+)
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))  # Giây
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))            # Số key giữ trong RAM
+RESPONSE_CACHE_VARIANTS = int(os.getenv("RESPONSE_CACHE_VARIANTS", "1"))      # >1: xoay vòng nhiều lời kể
+
+
+class ResponseCache:
+    """Cache câu trả lời AI: LRU trong RAM + SQLite trên đĩa, khoá theo (prompt, ngôn ngữ)
+
+    Các hàm truy cập SQLite là blocking: gọi từ event loop qua asyncio.to_thread (an toàn đa luồng).
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, ttl=RESPONSE_CACHE_TTL,
+                 max_entries=RESPONSE_CACHE_SIZE, max_variants=RESPONSE_CACHE_VARIANTS):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_variants = max(1, max_variants)
+        self._lru = OrderedDict()  # key -> {"variants": [...], "created": ts, "next": i}
+        self._db = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    @staticmethod
+    def make_key(prompt, lang):
+        """Không gồm model: câu trả lời từ model dự phòng vẫn dùng chung key"""
+        return hashlib.sha256(f"{lang}\n{prompt}".encode()).hexdigest()
+
+    def get(self, key):
+        """Trả về một biến thể đã cache, hoặc None nếu chưa có/đã hết hạn/chưa đủ số biến thể"""
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key):
+        entry = self._lru.get(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                self.stats["disk_hits"] += 1
+                self._remember(key, entry)
+        if entry is None or time.time() - entry["created"] > self.ttl:
+            self.stats["misses"] += 1
+            return None
+        if len(entry["variants"]) < self.max_variants:
+            # Chưa đủ biến thể: để caller sinh thêm một lời kể mới
+            self.stats["misses"] += 1
+            return None
+        self._lru.move_to_end(key)
+        self.stats["hits"] += 1
+        value = entry["variants"][entry["next"] % len(entry["variants"])]
+        entry["next"] += 1
+        return dict(value)
+
+    def put(self, key, value):
+        with self._lock:
+            self._put(key, value)
+
+    def _put(self, key, value):
+        entry = self._lru.get(key) or self._load(key)
+        if entry is None or time.time() - entry["created"] > self.ttl:
+            entry = {"variants": [], "created": time.time(), "next": 0}
+        if value not in entry["variants"]:
+            entry["variants"].append(value)
+            del entry["variants"][:-self.max_variants]
+        self._remember(key, entry)
+        self._save(key, entry)
+        self.stats["stores"] += 1
+
+    def variant_count(self, key):
+        with self._lock:
+            return self._variant_count(key)
+
+    def _variant_count(self, key):
+        entry = self._lru.get(key) or self._load(key)
+        if entry is None or time.time() - entry["created"] > self.ttl:
+            return 0
+        return len(entry["variants"])
+
+    def _remember(self, key, entry):
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    # --- SQLite ---
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)  # Dùng từ worker của to_thread
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, variants TEXT, created REAL)"
+            )
+        return self._db
+
+    def _load(self, key):
+        try:
+            row = self._conn().execute(
+                "SELECT variants, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️ Response cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        return {"variants": json.loads(row[0]), "created": row[1], "next": 0}
+
+    def _save(self, key, entry):
+        try:
+            with self._conn() as db:
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, variants, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(entry["variants"], ensure_ascii=False), entry["created"]),
+                )
+        except sqlite3.Error as e:
+            print(f"⚠️ Response cache write failed: {e}")
@@ -0,0 +1,145 @@
+import re
+import json
+
+ROBOT_MOVES = ("forward", "backward", "stop")
+EMOTIONS = ("happy", "thinking", "sad", "neutral")
+MAX_PLAIN_TEXT = 300  # Phản hồi không có JSON: giới hạn độ dài lời nói
+SCHEMA_FIELDS = ("text", "robot_move", "emotion")
+
+_FIELD = re.compile(r'"(robot_move|emotion)"\s*:\s*"?(\w+)"?')
+_FENCE = re.compile(r"```(?:json)?")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def scan_objects(text):
+    """Một lượt duyệt: trả về các đoạn {...} cấp ngoài cùng (đếm ngoặc, bỏ qua ngoặc trong chuỗi).
+    Đoạn cuối chưa đóng (phản hồi bị cắt) được trả kèm cờ complete=False."""
+    objects = []
+    depth = 0
+    start = None
+    in_string = False
+    escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = depth > 0
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == "}" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                objects.append((text[start:i + 1], True))
+    if depth > 0:
+        objects.append((text[start:], False))
+    return objects
+
+
+def _repair(candidate, complete):
+    """Sửa lỗi hay gặp: dấu phẩy thừa, None/True kiểu Python, JSON bị cắt giữa chừng"""
+    fixed = _TRAILING_COMMA.sub(r"\1", candidate)
+    fixed = re.sub(r"\bNone\b", "null", fixed)
+    fixed = re.sub(r"\bTrue\b", "true", re.sub(r"\bFalse\b", "false", fixed))
+    if not complete:
+        closers = []
+        in_string = escape = False
+        for ch in fixed:
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch in "{[":
+                closers.append("}" if ch == "{" else "]")
+            elif ch in "}]" and closers:
+                closers.pop()
+        fixed = fixed.rstrip()
+        if in_string:
+            fixed += '"'
+        fixed = _TRAILING_COMMA.sub(r"\1", fixed.rstrip(",:") + "".join(reversed(closers)))
+    return fixed
+
+
+def normalize_move(value):
+    """'Forward' -> 'forward'; giá trị ngoài ROBOT_MOVES -> None"""
+    move = value.strip().lower() if isinstance(value, str) else None
+    return move if move in ROBOT_MOVES else None
+
+
+class ResponseParser:
+    """Trích xuất + kiểm tra schema câu trả lời {text, robot_move, emotion} của model"""
+
+    def __init__(self):
+        self.stats = {"clean": 0, "repaired": 0, "salvaged": 0, "failed": 0, "invalid_fields": 0}
+
+    def parse(self, text, strict=False):
+        """Trả về dict đã chuẩn hoá. strict=True: ValueError nếu không có JSON hợp lệ với "text"
+        khác rỗng (caller tự quyết định thử model khác) thay vì trả lời bằng văn bản trần.
+        Đối tượng JSON không theo schema (vd. ví dụ trong lời giải thích) bị bỏ qua."""
+        text = text or ""
+        for candidate, complete in scan_objects(text):
+            data = self._loads(candidate) if complete else None
+            outcome = "clean"
+            if data is None:
+                data = self._loads(_repair(candidate, complete))
+                outcome = "repaired"
+            if data is not None and self.matches(data, strict):
+                self.stats[outcome] += 1
+                return self.validate(data)
+
+        if strict:
+            raise ValueError("no JSON object in model response")
+        return self.salvage(text)
+
+    def salvage(self, text):
+        """Không có JSON: vẫn giữ ý định di chuyển/cảm xúc nếu thấy, phần còn lại là lời nói"""
+        fields = {name: value for name, value in _FIELD.findall(text)}
+        plain = _FENCE.sub("", _FIELD.sub("", text)).strip(" \n\t{},")
+        self.stats["salvaged" if fields or plain else "failed"] += 1
+        return self.validate({"text": plain[:MAX_PLAIN_TEXT], **fields})
+
+    def validate(self, data):
+        """Ép dữ liệu về đúng schema; giá trị lạ -> mặc định an toàn (không di chuyển)"""
+        text = data.get("text")
+        if not isinstance(text, str):
+            text = "" if text is None else str(text)
+        raw_move = data.get("robot_move")
+        move = normalize_move(raw_move)
+        emotion = data.get("emotion")
+        emotion = emotion.strip().lower() if isinstance(emotion, str) else "neutral"
+        if (move is None and raw_move not in (None, "", "null", "none")) or emotion not in EMOTIONS:
+            self.stats["invalid_fields"] += 1
+        return {
+            "text": text.strip(),
+            "robot_move": move,
+            "emotion": emotion if emotion in EMOTIONS else "neutral",
+        }
+
+    @staticmethod
+    def matches(data, strict=False):
+        """Đối tượng có phải câu trả lời theo schema không (dùng chung cho parse và stream)"""
+        if strict:
+            return isinstance(data.get("text"), str) and bool(data["text"].strip())
+        return any(field in data for field in SCHEMA_FIELDS)
+
+    @staticmethod
+    def _loads(candidate):
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+
+response_parser = ResponseParser()
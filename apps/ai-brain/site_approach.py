@@ -0,0 +1,85 @@
+import os
+import asyncio
+import time
+
+APPROACH_SPEED = int(os.getenv("VISION_APPROACH_SPEED", "0"))        # 0 = dừng ngay khi phát hiện (như cũ)
+APPROACH_MIN_SPEED = int(os.getenv("VISION_APPROACH_MIN_SPEED", "20"))
+APPROACH_STOP_DISTANCE = float(os.getenv("VISION_STOP_DISTANCE", "0.3"))  # m: dừng trước mã
+APPROACH_SLOWDOWN_RANGE = 1.0  # m: bắt đầu giảm tốc tuyến tính khi còn cách điểm dừng chừng này
+APPROACH_POSE_TIMEOUT = 1.0    # Giây không có cập nhật khoảng cách -> dừng (an toàn)
+
+
+class SiteApproach:
+    """Điều tốc robot khi tiến tới di sản vừa phát hiện, theo khoảng cách từ vision service
+
+    start() trả về asyncio.Event được set khi robot đã dừng (đến nơi, mất tín hiệu hoặc bị huỷ),
+    để phần kể chuyện đã tải trước chỉ phát khi robot đứng yên trước di sản.
+    """
+
+    def __init__(self, move, stop, speed=APPROACH_SPEED, stop_distance=APPROACH_STOP_DISTANCE):
+        self.move = move    # move(speed): tiến về phía trước
+        self.stop = stop    # stop(): dừng robot
+        self.speed = speed
+        self.stop_distance = stop_distance
+        self.site_id = None
+        self._arrived = None
+        self._pose_at = 0
+        self._speed_sent = None
+        self._watchdog = None
+        self.stats = {"approaches": 0, "arrived": 0, "timeouts": 0, "cancelled": 0}
+
+    def start(self, site_id, distance):
+        """Bắt đầu tiếp cận site_id; khoảng cách None (không ước lượng được) -> dừng ngay"""
+        self._finish("cancelled")
+        arrived = self._arrived = asyncio.Event()
+        self.site_id = site_id
+        self.stats["approaches"] += 1
+        if not self.speed or distance is None or distance <= self.stop_distance:
+            self._finish("arrived")
+            return arrived
+        self._pose_at = time.monotonic()
+        self._speed_sent = None
+        self.on_pose(site_id, distance)
+        self._watchdog = asyncio.create_task(self._watch())
+        return arrived
+
+    def on_pose(self, site_id, distance):
+        """Cập nhật khoảng cách (marker_pose) trong lúc tiếp cận"""
+        if self._arrived is None or site_id != self.site_id or distance is None:
+            return
+        self._pose_at = time.monotonic()
+        if distance <= self.stop_distance:
+            self._finish("arrived")
+            return
+        ratio = min(1.0, (distance - self.stop_distance) / APPROACH_SLOWDOWN_RANGE)
+        speed = max(APPROACH_MIN_SPEED, int(self.speed * ratio) // 10 * 10)
+        if speed != self._speed_sent:
+            self._speed_sent = speed
+            self.move(speed)
+
+    def cancel(self):
+        """Người điều khiển ra lệnh khác (dừng khẩn/joystick): bỏ tiếp cận, không gửi lệnh dừng thêm"""
+        if self._arrived is not None:
+            self.stats["cancelled"] += 1
+            self._release()
+
+    async def _watch(self):
+        while self._arrived is not None:
+            await asyncio.sleep(APPROACH_POSE_TIMEOUT / 4)
+            if self._arrived is not None and time.monotonic() - self._pose_at > APPROACH_POSE_TIMEOUT:
+                print(f"⚠️ Approach [{self.site_id}]: lost marker pose, stopping")
+                self._finish("timeouts")
+
+    def _finish(self, outcome):
+        if self._arrived is None:
+            return
+        self.stop()
+        self.stats[outcome] += 1
+        self._release()
+
+    def _release(self):
+        arrived, self._arrived = self._arrived, None
+        arrived.set()
+        if self._watchdog is not None and self._watchdog is not asyncio.current_task():
+            self._watchdog.cancel()
+        self._watchdog = None
@@ -0,0 +1,129 @@
+import json
+import time
+import asyncio
+
+# Các mức tần số được hỗ trợ: client cùng mức dùng chung một frame đã serialise
+TELEMETRY_RATES = (1, 2, 5, 10, 20)  # Hz
+TELEMETRY_DEFAULT_HZ = 1             # Client cũ (không subscribe) nhận full frame 1 Hz như trước
+KEYFRAME_INTERVAL = 5.0              # Giây: gửi lại full frame định kỳ cho client nhận delta
+
+
+def quantize_rate(rate_hz):
+    try:
+        rate_hz = float(rate_hz)
+    except (TypeError, ValueError):
+        return TELEMETRY_DEFAULT_HZ
+    return min(TELEMETRY_RATES, key=lambda r: abs(r - rate_hz))
+
+
+class _Subscriber:
+    def __init__(self, ws, rate_hz, delta):
+        self.ws = ws
+        self.rate_hz = rate_hz
+        self.delta = delta
+        self.needs_keyframe = True
+        self.last_keyframe = 0
+
+
+class _Tier:
+    def __init__(self, rate_hz):
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self.next_due = 0
+        self.last = {}
+        self.seq = 0
+
+
+class TelemetryStream:
+    """Phát telemetry qua WebSocket: serialise mỗi frame một lần, gửi delta, tần số riêng từng client"""
+
+    def __init__(self, state, broadcaster):
+        self.state = state  # dict telemetry dùng chung (được MQTT cập nhật)
+        self.broadcaster = broadcaster  # Hàng đợi gửi của từng client (policy "drop")
+        self._subs = {}
+        self._tiers = {}
+        self._has_subs = asyncio.Event()
+        self.stats = {"ticks": 0, "serialized": 0, "offered": 0, "resyncs": 0}
+
+    def subscribe(self, ws, rate_hz=TELEMETRY_DEFAULT_HZ, delta=False):
+        """Đăng ký (hoặc đổi tần số) cho một client"""
+        rate_hz = quantize_rate(rate_hz)
+        sub = self._subs.get(ws)
+        if sub is None:
+            sub = _Subscriber(ws, rate_hz, delta)
+            self._subs[ws] = sub
+        else:
+            sub.rate_hz = rate_hz
+            sub.delta = delta
+            sub.needs_keyframe = True
+        if rate_hz not in self._tiers:
+            self._tiers[rate_hz] = _Tier(rate_hz)
+        self._prune_tiers()
+        self._has_subs.set()
+        return rate_hz
+
+    def unsubscribe(self, ws):
+        self._subs.pop(ws, None)
+        self._prune_tiers()
+        if not self._subs:
+            self._has_subs.clear()
+
+    def _prune_tiers(self):
+        active_rates = {s.rate_hz for s in self._subs.values()}
+        for rate in list(self._tiers):
+            if rate not in active_rates:
+                del self._tiers[rate]
+
+    async def run(self):
+        print("📡 Telemetry Stream Started")
+        while True:
+            await self._has_subs.wait()
+            now = time.monotonic()
+            for tier in list(self._tiers.values()):
+                if now >= tier.next_due:
+                    tier.next_due = now + tier.period
+                    self._tick(tier, now)
+            if self._tiers:
+                wait = min(t.next_due for t in self._tiers.values()) - time.monotonic()
+                await asyncio.sleep(max(wait, 0))
+
+    def _tick(self, tier, now):
+        self.stats["ticks"] += 1
+        snapshot = dict(self.state)
+        changed = {k: v for k, v in snapshot.items() if tier.last.get(k) != v}
+        tier.last = snapshot
+        tier.seq += 1
+
+        frames = {}
+
+        def full_frame():
+            if "full" not in frames:
+                frames["full"] = json.dumps({"type": "telemetry", "seq": tier.seq, **snapshot})
+                self.stats["serialized"] += 1
+            return frames["full"]
+
+        def delta_frame():
+            if "delta" not in frames:
+                frames["delta"] = json.dumps({"type": "telemetry", "delta": True, "seq": tier.seq, **changed})
+                self.stats["serialized"] += 1
+            return frames["delta"]
+
+        for sub in list(self._subs.values()):
+            if sub.rate_hz != tier.rate_hz:
+                continue
+            if not sub.delta:
+                self._offer(sub, full_frame())
+            elif sub.needs_keyframe or now - sub.last_keyframe > KEYFRAME_INTERVAL:
+                sub.needs_keyframe = False
+                sub.last_keyframe = now
+                self._offer(sub, full_frame())
+            elif changed:
+                self._offer(sub, delta_frame(), full_frame)
+
+    def _offer(self, sub, frame, resync=None):
+        self.stats["offered"] += 1
+        if not self.broadcaster.send(sub.ws, frame, "telemetry", resync=resync):
+            # Frame cũ bị thay/bỏ ở client chậm: lần sau gửi full frame để đồng bộ lại
+            if sub.delta:
+                sub.needs_keyframe = True
+                self.stats["resyncs"] += 1
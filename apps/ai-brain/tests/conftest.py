@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Các module của ai-brain là module phẳng (chạy trực tiếp từ thư mục này)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Codec lệnh dùng chung với EV3 (như command_listener)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "hardware", "ev3"))
+
+# db_client tạo client Supabase khi import; test thay db_gateway bằng bản giả, không gọi mạng
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
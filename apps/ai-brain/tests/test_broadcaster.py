@@ -0,0 +1,31 @@
+import asyncio
+from broadcaster import Broadcaster, BROADCAST_HARD_LIMIT
+
+
+class StuckSocket:
+    """Client không bao giờ nhận xong message"""
+    remote_address = ("10.0.0.9", 1234)
+
+    async def send(self, payload):
+        await asyncio.Event().wait()
+
+    async def close(self):
+        pass
+
+
+def test_reliable_queue_is_capped_by_disconnecting_slow_client():
+    async def scenario():
+        evicted = []
+        broadcaster = Broadcaster(max_queue=8)
+        broadcaster.on_evict = evicted.append
+        ws = StuckSocket()
+        channel = broadcaster.add(ws)
+        await asyncio.sleep(0)
+        for i in range(100):
+            broadcaster.publish({"type": "voice_response", "text": f"câu {i}"})
+        return channel, broadcaster, evicted, ws
+    channel, broadcaster, evicted, ws = asyncio.run(scenario())
+    assert channel.closed
+    assert channel.stats["max_depth"] <= 8 * BROADCAST_HARD_LIMIT
+    assert ws not in broadcaster.channels
+    assert evicted == [ws]
@@ -0,0 +1,75 @@
+import struct
+import pytest
+import command_codec
+from command_codec import BINARY_MAGIC, CommandError, decode, encode
+
+CASES = [
+    ("move", {"direction": "forward", "speed": 60}, ("forward", 60)),
+    ("move", {"direction": "right"}, ("right", 100)),
+    ("aux_move", {"port": "aux2", "value": -1.5, "unit": "degrees"}, ("aux2", -1.5, "degrees")),
+    ("stop", None, ()),
+    ("emergency", {}, ()),
+]
+
+
+@pytest.mark.parametrize("binary", [False, True])
+@pytest.mark.parametrize("command, params, values", CASES)
+def test_round_trip(command, params, values, binary):
+    assert decode(encode(command, params, binary=binary)) == (command, values)
+
+
+def test_text_format():
+    assert encode("move", {"direction": "forward", "speed": 60}) == "move:forward:60"
+    assert encode("stop") == "stop"
+    assert decode(b"move:left:30") == ("move", ("left", 30))
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_speed_is_clamped(binary):
+    assert decode(encode("move", {"direction": "forward", "speed": 250}, binary=binary))[1] == ("forward", 100)
+    assert decode(encode("move", {"direction": "forward", "speed": -5}, binary=binary))[1] == ("forward", 0)
+    assert decode("move:forward:999") == ("move", ("forward", 100))
+
+
+def test_enum_encoded_as_index():
+    frame = encode("move", {"direction": "left", "speed": 10}, binary=True)
+    assert frame == struct.pack(">BBBh", BINARY_MAGIC, 1, command_codec.DIRECTIONS.index("left"), 10)
+    frame = encode("aux_move", {"port": "aux2", "unit": "degrees"}, binary=True)
+    assert frame[2] == 1 and frame[-1] == command_codec.UNITS.index("degrees")
+
+
+def test_invalid_params_rejected():
+    with pytest.raises(CommandError):
+        encode("move", {"direction": "up"})
+    with pytest.raises(CommandError):
+        encode("move", {"direction": "forward", "speed": "fast"})
+    with pytest.raises(CommandError):
+        encode("jump")
+
+
+@pytest.mark.parametrize("frame", [
+    bytes([BINARY_MAGIC]),                                   # Thiếu opcode
+    bytes([BINARY_MAGIC, 99]),                               # Opcode lạ
+    encode("move", {"direction": "forward"}, binary=True)[:-1],  # Bị cắt
+    encode("stop", binary=True) + b"\x00",                   # Thừa byte
+    struct.pack(">BBBh", BINARY_MAGIC, 1, 9, 50),             # Chỉ số enum ngoài bảng
+])
+def test_bad_binary_frames_rejected(frame):
+    with pytest.raises(CommandError):
+        decode(frame)
+
+
+def test_garbage_bytes_rejected():
+    with pytest.raises(CommandError):
+        decode(b"\xff\xfe\x00garbage")
+
+
+@pytest.mark.parametrize("payload", ["move:forward", "move:forward:50:1", "move:up:50", "move:forward:abc"])
+def test_bad_text_frames_rejected(payload):
+    with pytest.raises(CommandError):
+        decode(payload)
+
+
+def test_unknown_text_command_is_ignored():
+    assert decode("dance:now") == (None, ())
+    assert decode(b"") == (None, ())
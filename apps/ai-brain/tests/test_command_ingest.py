@@ -0,0 +1,96 @@
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import command_ingest
+from command_ingest import CommandIngestor
+
+
+class FakeQuery:
+    def __init__(self, table):
+        self.table = table
+        self.kind = None
+
+    def select(self, *args):
+        self.kind = "select"
+        return self
+
+    def update(self, values):
+        self.kind = "update"
+        self.status = values["status"]
+        return self
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self  # eq/order/in_ ...
+
+
+class FakeGateway:
+    """Đếm truy vấn; bảng luôn trả về cùng một dòng pending, ghi trạng thái luôn lỗi"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = {"select": 0, "update": 0}
+        self.updates = []  # (thời điểm, trạng thái)
+
+    def table(self, name):
+        return FakeQuery(name)
+
+    async def execute(self, query):
+        self.calls[query.kind] += 1
+        if query.kind == "update":
+            self.updates.append((time.monotonic(), query.status))
+            raise RuntimeError("network down")
+        return SimpleNamespace(data=list(self.rows))
+
+
+def row(age=0.0):
+    created = datetime.now(timezone.utc) - timedelta(seconds=age)
+    return {"id": 1, "command": "stop", "params": {}, "created_at": created.isoformat()}
+
+
+def run_poll(monkeypatch, seconds, rows=None):
+    gateway = FakeGateway(rows or [row()])
+    monkeypatch.setattr(command_ingest, "db_gateway", gateway)
+    monkeypatch.setattr(command_ingest, "POLL_MAX_INTERVAL", 0.4)
+    monkeypatch.setattr(command_ingest, "ACK_RETRY_BASE", 0.1)
+    dispatched = []
+
+    async def scenario():
+        ingestor = CommandIngestor(lambda cmd, params: dispatched.append(cmd), mode="poll")
+        ingestor.acks.flush_interval = 0.01
+        task = asyncio.create_task(ingestor.run())
+        await asyncio.sleep(seconds)
+        task.cancel()
+        return ingestor
+    return asyncio.run(scenario()), gateway, dispatched
+
+
+def test_stuck_pending_row_does_not_keep_fast_polling(monkeypatch):
+    ingestor, gateway, dispatched = run_poll(monkeypatch, 1.5)
+    assert dispatched == ["stop"]
+    # Không back-off: ~30 truy vấn ở chu kỳ 50 ms; có back-off: 0.05 -> 0.1 -> 0.2 -> 0.4 ...
+    assert gateway.calls["select"] <= 8
+    assert ingestor.stats["stale_rows"] >= 1
+
+
+def test_abandoned_acks_are_reported(monkeypatch):
+    ingestor, gateway, _ = run_poll(monkeypatch, 0.8)
+    assert gateway.calls["update"] == command_ingest.ACK_MAX_ATTEMPTS
+    assert [a["id"] for a in ingestor.acks.abandoned] == [1]
+    assert ingestor.acks.stats["dropped_rows"] == 1
+
+
+def test_ack_retries_back_off(monkeypatch):
+    _, gateway, _ = run_poll(monkeypatch, 0.8)
+    times = [at for at, _ in gateway.updates]
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    # ACK_RETRY_BASE = 0.1: chờ ~0.1 s rồi ~0.2 s giữa các lần ghi lại
+    assert len(gaps) == 2
+    assert gaps[0] >= 0.1 and gaps[1] >= 0.2
+
+
+def test_old_pending_rows_expire_instead_of_replaying(monkeypatch):
+    ingestor, gateway, dispatched = run_poll(monkeypatch, 0.3, rows=[row(age=command_ingest.COMMAND_MAX_AGE + 60)])
+    assert dispatched == []
+    assert ingestor.stats["expired"] == 1
+    assert gateway.updates[0][1] == "expired"
@@ -0,0 +1,67 @@
+import asyncio
+import command_scheduler
+from command_scheduler import CommandScheduler, URGENT, MOTION, ORDERED
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_emergency_flushes_queued_ordered_commands():
+    async def scenario():
+        sent = []
+        scheduler = CommandScheduler(lambda target, payload: sent.append(payload), window=0, min_interval=0.05)
+        scheduler.submit("ev3", MOTION, "move:forward:100")
+        scheduler.submit("ev3", ORDERED, "aux_move:1")
+        scheduler.submit("ev3", ORDERED, "aux_move:2")
+        await asyncio.sleep(0.01)  # Lane gửi được lệnh đầu, các lệnh sau chờ rate-limit
+        scheduler.submit("ev3", URGENT, "emergency")
+        await asyncio.sleep(0.2)
+        return sent, scheduler.stats
+    sent, stats = run(scenario())
+    assert sent[-1] == "emergency"
+    assert "aux_move:2" not in sent
+    assert stats["flushed"] >= 1
+
+
+def test_duplicate_move_is_resent_after_ttl(monkeypatch):
+    monkeypatch.setattr(command_scheduler, "MOVE_DUPLICATE_TTL", 0.05)
+
+    async def scenario():
+        sent = []
+        scheduler = CommandScheduler(lambda target, payload: sent.append(payload), window=0, min_interval=0)
+        scheduler.submit("ev3", MOTION, "move:forward:100")
+        await asyncio.sleep(0.01)
+        scheduler.submit("ev3", MOTION, "move:forward:100")  # Trùng ngay: bỏ
+        await asyncio.sleep(0.1)
+        scheduler.submit("ev3", MOTION, "move:forward:100")  # Robot có thể đã dừng theo đường khác: gửi lại
+        await asyncio.sleep(0.01)
+        return sent, scheduler.stats
+    sent, stats = run(scenario())
+    assert sent == ["move:forward:100", "move:forward:100"]
+    assert stats["duplicates"] == 1
+
+
+def test_stop_resets_duplicate_check():
+    async def scenario():
+        sent = []
+        scheduler = CommandScheduler(lambda target, payload: sent.append(payload), window=0, min_interval=0)
+        scheduler.submit("ev3", MOTION, "move:forward:100")
+        await asyncio.sleep(0.01)
+        scheduler.submit("ev3", URGENT, "stop")
+        scheduler.submit("ev3", MOTION, "move:forward:100")
+        await asyncio.sleep(0.01)
+        return sent
+    assert run(scenario()) == ["move:forward:100", "stop", "move:forward:100"]
+
+
+def test_urgent_commands_use_urgent_path():
+    async def scenario():
+        sent, urgent = [], []
+        scheduler = CommandScheduler(lambda target, payload: sent.append(payload), window=0, min_interval=0,
+                                     send_urgent=lambda target, payload: urgent.append(payload))
+        scheduler.submit("ev3", MOTION, "move:forward:100")
+        await asyncio.sleep(0.01)
+        scheduler.submit("ev3", URGENT, "stop")
+        return sent, urgent
+    assert run(scenario()) == (["move:forward:100"], ["stop"])
@@ -0,0 +1,71 @@
+import asyncio
+from conversation_memory import HistoryManager, estimate_tokens, turn_text
+
+
+def conversation(turns, words=20):
+    return [{"role": "user" if i % 2 == 0 else "model", "parts": [f"turn {i} " + "lorem " * words]}
+            for i in range(turns)]
+
+
+def test_under_budget_is_unchanged():
+    history = conversation(4)
+    manager = HistoryManager(budget=10_000)
+    assert manager.compact(history) == history
+    assert manager.stats["compacted"] == 0
+
+
+def test_over_budget_replaces_old_turns_with_summary():
+    history = conversation(16)
+    manager = HistoryManager(budget=300, keep_turns=4, block_turns=6)
+    compacted = manager.compact(history)
+    memory, recent = compacted[0], compacted[1:]
+    assert memory["role"] == "user" and turn_text(memory).startswith("Conversation so far (summary):")
+    # ~43 token/lượt: cắt 2 khối 6 lượt (khối đầu chưa đủ), 4 lượt gần nhất giữ nguyên
+    assert recent == history[-4:]
+    assert "turn 0" not in " ".join(turn_text(t) for t in recent)
+    assert sum(estimate_tokens(turn_text(t)) for t in compacted) < sum(estimate_tokens(turn_text(t)) for t in history)
+    assert manager.stats["compacted"] == 1 and manager.stats["turns_summarised"] == 12
+
+
+def test_keeps_recent_turns_even_when_over_budget():
+    history = conversation(5, words=200)
+    compacted = HistoryManager(budget=100, keep_turns=4, block_turns=6).compact(history)
+    assert compacted[-4:] == history[-4:]
+
+
+def test_llm_summary_replaces_extract_and_task_is_released():
+    prompts = []
+
+    async def summarize(prompt):
+        prompts.append(prompt)
+        return "Visitor asked about the citadel."
+
+    async def scenario():
+        manager = HistoryManager(summarize, budget=300, keep_turns=4, block_turns=6)
+        history = conversation(16)
+        first = manager.compact(history)
+        assert len(manager._tasks) > 0
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        second = manager.compact(history)
+        return manager, first, second
+
+    manager, first, second = asyncio.run(scenario())
+    assert "Visitor asked about the citadel." not in turn_text(first[0])
+    assert "Visitor asked about the citadel." in turn_text(second[0])
+    assert manager._tasks == set() and manager.stats["llm_summaries"] >= 1
+    assert "turn 0" in prompts[0]
+
+
+def test_summary_failure_is_counted():
+    async def summarize(prompt):
+        raise RuntimeError("quota")
+
+    async def scenario():
+        manager = HistoryManager(summarize, budget=300, keep_turns=4, block_turns=6)
+        manager.compact(conversation(16))
+        await asyncio.sleep(0.01)
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert manager.stats["summary_errors"] >= 1 and manager._tasks == set()
@@ -0,0 +1,42 @@
+import time
+import asyncio
+import threading
+from db_client import AsyncDBGateway
+
+
+class SlowQuery:
+    """Truy vấn chạy lâu hơn timeout của gateway; đếm số truy vấn đang chạy"""
+    running = 0
+    lock = threading.Lock()
+
+    def execute(self):
+        with SlowQuery.lock:
+            SlowQuery.running += 1
+        time.sleep(0.2)
+        with SlowQuery.lock:
+            SlowQuery.running -= 1
+        return "ok"
+
+
+def test_timed_out_queries_keep_their_slot_until_finished():
+    gateway = AsyncDBGateway(client=None, max_workers=2, timeout=0.05)
+
+    async def call():
+        try:
+            await gateway.execute(SlowQuery())
+        except asyncio.TimeoutError:
+            pass
+
+    async def scenario():
+        calls = asyncio.gather(*(call() for _ in range(6)))
+        # Truy vấn đã timeout vẫn chiếm thread: tổng đang chạy + chờ trong pool không vượt max_workers
+        outstanding = 0
+        while not calls.done():
+            outstanding = max(outstanding, SlowQuery.running + gateway._executor._work_queue.qsize())
+            await asyncio.sleep(0.01)
+        while gateway.stats["in_flight"]:
+            await asyncio.sleep(0.01)
+        return outstanding
+    outstanding = asyncio.run(scenario())
+    assert outstanding <= 2
+    assert gateway.stats["timeouts"] == 6
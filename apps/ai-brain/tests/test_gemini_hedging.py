@@ -0,0 +1,82 @@
+import asyncio
+import json
+from gemini_service import GeminiService
+
+def reply(text="Xin chào"):
+    return json.dumps({"text": text, "robot_move": None, "emotion": "happy"}, ensure_ascii=False)
+
+
+class FakeModels:
+    """_generate giả: mỗi model có độ trễ và kết quả (chuỗi hoặc Exception) cho trước"""
+
+    def __init__(self, **behaviour):
+        self.behaviour = behaviour  # "primary"/"fallback" -> (giây, kết quả)
+        self.calls = []
+        self.cancelled = []
+
+    async def generate(self, service, model_name, contents, system=None):
+        role = "primary" if model_name == service.primary_model else "fallback"
+        self.calls.append(role)
+        delay, result = self.behaviour[role]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(role)
+            raise
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def infer(models, hedge_after=0.05):
+    async def scenario():
+        service = GeminiService()
+        service.policy = "hedged"
+        service.hedge_after = hedge_after
+        service._generate = lambda *args: models.generate(service, *args)
+        try:
+            return await service._infer([{"role": "user", "parts": ["hi"]}]), service
+        except Exception as e:
+            return e, service
+
+    return asyncio.run(scenario())
+
+
+def test_fast_primary_does_not_hedge():
+    models = FakeModels(primary=(0.0, reply()), fallback=(0.0, reply()))
+    result, service = infer(models)
+    assert result["text"] == "Xin chào"
+    assert models.calls == ["primary"]
+    assert service.latency[service.primary_model].stats["wins"] == 1
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    models = FakeModels(primary=(5.0, reply()), fallback=(0.01, reply("Dự phòng")))
+    result, service = infer(models)
+    assert result["text"] == "Dự phòng"
+    assert models.calls == ["primary", "fallback"]
+    assert models.cancelled == ["primary"]
+    assert service.latency[service.fallback_model].stats["wins"] == 1
+    assert service.latency[service.primary_model].stats["cancelled"] == 1
+
+
+def test_failing_primary_hedges_immediately():
+    models = FakeModels(primary=(0.0, RuntimeError("500")), fallback=(0.0, reply()))
+    result, _ = infer(models, hedge_after=5.0)  # Không chờ hết ngân sách trễ
+    assert result["text"] == "Xin chào"
+    assert models.calls == ["primary", "fallback"]
+
+
+def test_invalid_primary_reply_is_kept_as_backup():
+    models = FakeModels(primary=(0.0, "Chỉ là văn bản"), fallback=(0.0, RuntimeError("503")))
+    result, _ = infer(models)
+    assert result["text"] == "Chỉ là văn bản"
+
+
+def test_both_failing_raises_last_error():
+    models = FakeModels(primary=(0.0, RuntimeError("primary down")), fallback=(0.01, RuntimeError("fallback down")))
+    result, service = infer(models)
+    assert isinstance(result, RuntimeError) and str(result) == "fallback down"
+    assert models.calls == ["primary", "fallback"] and models.cancelled == []
+    assert service.latency[service.primary_model].stats["errors"] == 1
+    assert service.latency[service.fallback_model].stats["errors"] == 1
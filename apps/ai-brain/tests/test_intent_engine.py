@@ -0,0 +1,49 @@
+import pytest
+from intent_engine import IntentEngine
+
+
+@pytest.fixture
+def engine():
+    return IntentEngine()
+
+
+@pytest.mark.parametrize("text, lang, direction", [
+    ("go forward", "en-US", "forward"),
+    ("turn right", "en-US", "right"),
+    ("đi tiến", "vi-VN", "forward"),
+    ("rẽ phải", "vi-VN", "right"),
+    ("re phai", "vi-VN", "right"),
+    ("  Left  ", "en-US", "left"),
+    ("tiến", "vi-VN", "forward"),
+    ("lùi lại chậm thôi", "vi-VN", "backward"),
+])
+def test_imperative_moves(engine, text, lang, direction):
+    intent = engine.classify(text, lang)
+    assert intent["intent"] == "move"
+    assert intent["direction"] == direction
+
+
+@pytest.mark.parametrize("text, lang", [
+    ("thank you, that's right", "en-US"),
+    ("all right", "en-US"),
+    ("I look forward to it", "en-US"),
+    ("tôi tên là Tiến", "vi-VN"),
+])
+def test_bare_direction_words_in_chat_are_not_moves(engine, text, lang):
+    assert engine.classify(text, lang) is None
+
+
+def test_slow_speed(engine):
+    assert engine.classify("lùi lại chậm thôi", "vi-VN")["speed"] == 40
+
+
+@pytest.mark.parametrize("text, lang", [
+    ("đừng đi tiến", "vi-VN"),
+    ("don't go forward", "en-US"),
+    ("do not turn left", "en-US"),
+    ("không rẽ phải", "vi-VN"),
+    ("never go back", "en-US"),
+    ("go back to the story", "en-US"),
+])
+def test_negated_or_contextual_commands_go_to_gemini(engine, text, lang):
+    assert engine.classify(text, lang) is None
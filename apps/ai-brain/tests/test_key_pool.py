@@ -0,0 +1,118 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+from google.api_core import exceptions as gexc
+import key_pool
+from key_pool import ApiKeyPool, NoKeyAvailable
+
+MODEL = "gemini-2.5-flash"
+
+
+def use(pool, exc=None):
+    """Mượn một key rồi trả lại ngay (exc: lỗi của request)"""
+    key = pool._pick(MODEL)
+    pool.release(key, MODEL, exc, 0.01)
+    return key.secret
+
+
+@pytest.fixture
+def pool():
+    return ApiKeyPool(["key-aaaa", "key-bbbb", "key-cccc"])
+
+
+def test_rotates_across_keys(pool):
+    assert [use(pool) for _ in range(6)] == ["key-aaaa", "key-bbbb", "key-cccc"] * 2
+
+
+def test_prefers_key_with_fewer_requests_in_flight(pool):
+    busy = pool._pick(MODEL)
+    other = pool._pick(MODEL)
+    pool.release(other, MODEL, None, 0.01)
+    assert pool._pick(MODEL) is not busy
+
+
+def test_429_cools_key_down(pool):
+    assert use(pool, gexc.ResourceExhausted("429 quota exceeded")) == "key-aaaa"
+    key = pool.keys[0]
+    assert key.stats["rate_limited"] == 1 and key.cooldown_until[MODEL] > time.monotonic()
+    assert "key-aaaa" not in [use(pool) for _ in range(6)]
+    # Hết cooldown: dùng lại được, nhưng xếp sau các key chưa lỗi cho tới khi gọi thành công
+    key.cooldown_until[MODEL] = time.monotonic() - 1
+    assert use(pool) != "key-aaaa"
+    for other in pool.keys[1:]:
+        other.disabled = True
+    assert use(pool) == "key-aaaa"
+    assert key.failures == 0
+
+
+def test_cooldown_follows_retry_delay_and_grows(pool):
+    key = pool.keys[0]
+    key.failures = 1
+    assert ApiKeyPool._cooldown(key, "429 please retry in 37s") == 38
+    assert ApiKeyPool._cooldown(key, "quota exceeded") == key_pool.KEY_COOLDOWN_BASE
+    key.failures = 3
+    assert ApiKeyPool._cooldown(key, "quota exceeded") == key_pool.KEY_COOLDOWN_BASE * 4
+    assert ApiKeyPool._cooldown(key, "quota exceeded per day") == key_pool.KEY_DAILY_COOLDOWN
+
+
+def test_cooldown_is_per_model(pool):
+    use(pool, gexc.ResourceExhausted("429"))
+    for other in pool.keys[1:]:
+        other.disabled = True
+    with pytest.raises(NoKeyAvailable):
+        pool._pick(MODEL)
+    assert pool._pick("gemini-3-pro-preview").secret == "key-aaaa"
+
+
+def test_invalid_key_is_disabled(pool):
+    use(pool, gexc.PermissionDenied("API key not valid"))
+    assert pool.keys[0].disabled
+    assert "key-aaaa" not in [use(pool) for _ in range(4)]
+
+
+def test_all_keys_exhausted_raises(pool):
+    for _ in range(3):
+        use(pool, gexc.TooManyRequests("429"))
+    with pytest.raises(NoKeyAvailable):
+        pool._pick(MODEL)
+    assert pool.stats["no_key"] == 1
+
+
+def test_cancelled_request_is_not_a_key_error(pool):
+    use(pool, asyncio.CancelledError())
+    assert pool.keys[0].stats["errors"] == 0 and pool.keys[0].failures == 0
+
+
+def test_acquire_waits_briefly_when_rpm_limited(monkeypatch):
+    monkeypatch.setattr(key_pool, "KEY_RPM_LIMIT", 1)
+    pool = ApiKeyPool(["key-aaaa"])
+    use(pool)
+    pool.keys[0].recent[MODEL][0] = time.monotonic() - 59.95  # Còn ~50 ms là ra khỏi cửa sổ 60 s
+
+    async def scenario():
+        async with await pool.acquire(MODEL) as key:
+            return key.secret
+
+    assert asyncio.run(scenario()) == "key-aaaa"
+    assert pool.stats["waited"] == 1
+
+
+def test_model_uses_leased_key_client():
+    from gemini_service import GeminiService
+    service = GeminiService()
+    key = SimpleNamespace(secret="key-aaaa", client=object())
+    model = service._model(MODEL, key)
+    assert model._async_client is key.client
+    assert service._model(MODEL, key) is model
+
+
+def test_unknown_sdk_layout_falls_back_to_shared_client(monkeypatch):
+    import gemini_service
+    configured = []
+    monkeypatch.setattr(gemini_service.genai, "configure", lambda **kwargs: configured.append(kwargs))
+    service = gemini_service.GeminiService()
+    key = SimpleNamespace(secret="key-aaaa", client=object())
+    assert service._bind_client(SimpleNamespace(), key) is False
+    assert service._bind_client(SimpleNamespace(), key) is False
+    assert configured == [{"api_key": "key-aaaa"}]
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+from lock_on import LockOnStateMachine, SEARCHING, CANDIDATE, LOCKED
+
+FPS = 30.0
+SQUARE = np.float32([[0, 0], [100, 0], [100, 100], [0, 100]])  # Mã lớn, đứng yên -> độ tin cậy cao
+
+
+class Clip:
+    """Đưa từng khung vào state machine với thời gian giả lập cố định (1/FPS mỗi khung)"""
+
+    def __init__(self, **options):
+        self.lock = LockOnStateMachine(window=8, votes=5, min_confidence=0.5,
+                                       release_frames=15, rearm_seconds=5, **options)
+        self.frame = 0
+
+    def step(self, *marker_ids, corners=SQUARE):
+        ids = np.array([[i] for i in marker_ids]) if marker_ids else None
+        event = self.lock.update(ids, [corners.reshape(1, 4, 2)] * len(marker_ids), self.frame / FPS)
+        self.frame += 1
+        return event
+
+    def run(self, frames, *marker_ids):
+        return [e for e in (self.step(*marker_ids) for _ in range(frames)) if e is not None]
+
+    def wait(self, seconds):
+        return self.run(int(seconds * FPS))
+
+
+@pytest.fixture
+def clip():
+    return Clip()
+
+
+def test_locks_after_n_of_m_votes(clip):
+    assert clip.run(4, 7) == []
+    assert clip.lock.state == CANDIDATE
+    event = clip.step(7)
+    assert event["marker_id"] == 7 and event["votes"] == 5
+    assert clip.lock.state == LOCKED and clip.lock.locked_id == 7
+    assert clip.run(10, 7) == []  # Một sự kiện cho mỗi lượt tiếp cận
+
+
+def test_votes_count_within_window(clip):
+    # Thấy 5 trong 8 khung (có khung mất) vẫn khoá
+    events = [clip.step(*ids) for ids in ([3], [], [3], [3], [], [3], [3])]
+    assert [e["marker_id"] for e in events if e] == [3]
+    # Chỉ 4 trong 8 khung: không bao giờ khoá
+    sparse = Clip()
+    assert [sparse.step(*([3] if i % 2 else [])) for i in range(40)] == [None] * 40
+
+
+def test_low_confidence_does_not_lock(clip):
+    # Mã nhỏ (10x10 px) và rung mạnh giữa các khung: điểm diện tích lẫn độ ổn định đều thấp
+    tiny = SQUARE / 10
+    skewed = tiny + np.float32([[3, 0], [0, 0], [-3, 0], [0, 0]])
+    assert [clip.step(5, corners=skewed if i % 2 else tiny) for i in range(20)] == [None] * 20
+    assert clip.lock.state == CANDIDATE
+
+
+def test_release_after_timeout(clip):
+    clip.run(5, 7)
+    assert clip.run(14) == []
+    assert clip.lock.state == LOCKED  # Khuất 14 khung: vẫn giữ khoá
+    clip.step()
+    assert clip.lock.state == SEARCHING and clip.lock.locked_id is None
+    assert clip.lock.stats["released"] == 1
+
+
+def test_short_dropout_does_not_release(clip):
+    clip.run(5, 7)
+    clip.run(10)
+    clip.run(1, 7)
+    assert clip.run(10) == []
+    assert clip.lock.state == LOCKED and clip.lock.stats["released"] == 0
+
+
+def test_reappearing_too_soon_is_suppressed(clip):
+    assert len(clip.run(5, 7)) == 1
+    clip.wait(1)  # Nhả khoá (15 khung) nhưng chưa đủ 5 s vắng mặt
+    assert clip.lock.state == SEARCHING
+    assert clip.run(10, 7) == []
+    assert clip.lock.state == LOCKED and clip.lock.stats["suppressed"] == 1
+
+
+def test_rearms_after_absence(clip):
+    assert len(clip.run(5, 7)) == 1
+    clip.wait(5)
+    events = clip.run(5, 7)
+    assert [e["marker_id"] for e in events] == [7]
+    assert clip.lock.stats["locks"] == 2
+
+
+def test_flicker_between_two_ids_never_locks(clip):
+    # Hai mã nhấp nháy xen kẽ: mỗi mã chỉ 4/8 phiếu
+    events = [clip.step(1 if i % 2 else 2) for i in range(40)]
+    assert events == [None] * 40
+    assert clip.lock.stats["locks"] == 0
+
+
+def test_switches_when_locked_marker_is_gone(clip):
+    clip.run(5, 1)
+    events = clip.run(5, 2)
+    assert [e["marker_id"] for e in events] == [2]
+    assert clip.lock.locked_id == 2 and clip.lock.stats["switches"] == 1
+
+
+def test_keeps_lock_while_both_visible(clip):
+    clip.run(5, 1)
+    assert clip.run(20, 1, 2) == []
+    assert clip.lock.locked_id == 1
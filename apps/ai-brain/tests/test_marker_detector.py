@@ -0,0 +1,53 @@
+import threading
+import numpy as np
+from marker_detector import MarkerDetector, TRACK_MIN_ROI, FRAME_SIZE
+
+SHAPE = FRAME_SIZE[::-1]  # (h, w)
+
+
+def tracking(corners, velocity=(0, 0)):
+    detector = MarkerDetector(tracking=True, pyramid_scale=1.0, adaptive=False)
+    detector._track = (0, np.float32(corners), np.float32(velocity))
+    return detector
+
+
+def square(x, y, size):
+    return [[x, y], [x + size, y], [x + size, y + size], [x, y + size]]
+
+
+def test_small_marker_roi_is_clamped_up_to_minimum():
+    roi = tracking(square(300, 200, 8))._predict_roi(SHAPE)
+    assert roi is not None
+    x0, y0, x1, y1 = roi
+    assert x1 - x0 >= TRACK_MIN_ROI and y1 - y0 >= TRACK_MIN_ROI
+    assert x0 <= 304 <= x1 and y0 <= 204 <= y1  # Giữ tâm dự đoán
+
+
+def test_roi_follows_velocity_and_stays_in_frame():
+    x0, y0, x1, y1 = tracking(square(620, 460, 10), velocity=(10, 10))._predict_roi(SHAPE)
+    assert (x1, y1) == FRAME_SIZE
+    assert x1 - x0 >= TRACK_MIN_ROI and y1 - y0 >= TRACK_MIN_ROI
+
+
+def test_roi_margin_around_large_marker():
+    x0, y0, x1, y1 = tracking(square(200, 150, 100))._predict_roi(SHAPE)
+    assert (x0, y0, x1, y1) == (140, 90, 360, 310)
+
+
+def test_marker_predicted_outside_frame_rescans():
+    assert tracking(square(630, 200, 10), velocity=(50, 0))._predict_roi(SHAPE) is None
+
+
+def test_stats_are_thread_safe():
+    detector = MarkerDetector(tracking=False)
+
+    def work():
+        for _ in range(20000):
+            detector._count("full")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert detector.metrics()["full"] == 80000
@@ -0,0 +1,53 @@
+import asyncio
+import mqtt_hub
+from mqtt_hub import AsyncMqttHub
+
+
+def test_queued_publish_fails_after_ttl_while_broker_is_down(monkeypatch):
+    monkeypatch.setattr(mqtt_hub, "MQTT_OUTBOX_TTL", 0.2)
+
+    async def scenario():
+        # Cổng 1 không có broker: kết nối thất bại, hub nằm trong vòng back-off
+        hub = AsyncMqttHub("127.0.0.1", 1, [], lambda topic, payload: None)
+        task = asyncio.create_task(hub.run())
+        future = hub.publish("wro/robot/config", "{}", qos=1, retain=True)
+        try:
+            return await asyncio.wait_for(future, timeout=2), hub.stats
+        finally:
+            task.cancel()
+    ok, stats = asyncio.run(scenario())
+    assert ok is False
+    assert stats["expired"] == 1
+    assert stats["outbox"] == 0
+
+
+def test_urgent_commands_survive_outage(monkeypatch):
+    monkeypatch.setattr(mqtt_hub, "MQTT_OUTBOX_TTL", 0.2)
+
+    async def scenario():
+        hub = AsyncMqttHub("127.0.0.1", 1, [], lambda topic, payload: None)
+        task = asyncio.create_task(hub.run())
+        move = hub.publish("wro/robot/commands", "move:forward:100")
+        emergency = hub.publish("wro/robot/commands", "emergency", urgent=True)
+        try:
+            moved = await asyncio.wait_for(move, timeout=2)
+            await asyncio.sleep(0.3)
+            return moved, emergency.done(), [entry[1] for entry in hub._outbox]
+        finally:
+            task.cancel()
+    moved, emergency_done, queued = asyncio.run(scenario())
+    assert moved is False
+    assert not emergency_done        # Vẫn chờ broker quay lại để gửi
+    assert queued == ["emergency"]
+
+
+def test_full_outbox_drops_motion_before_urgent(monkeypatch):
+    monkeypatch.setattr(mqtt_hub, "MQTT_OUTBOX_SIZE", 2)
+
+    async def scenario():
+        hub = AsyncMqttHub("127.0.0.1", 1, [], lambda topic, payload: None)
+        hub.publish("t", "stop", urgent=True)
+        hub.publish("t", "move:1")
+        hub.publish("t", "move:2")
+        return [entry[1] for entry in hub._outbox]
+    assert asyncio.run(scenario()) == ["stop", "move:2"]
@@ -0,0 +1,36 @@
+import asyncio
+from response_cache import ResponseCache
+from gemini_service import GeminiService
+
+
+def test_cache_is_shared_across_threads(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite3"))
+    key = ResponseCache.make_key("prompt", "vi-VN")
+
+    async def scenario():
+        await asyncio.to_thread(cache.put, key, {"text": "xin chào"})
+        return await asyncio.to_thread(cache.get, key)
+    assert asyncio.run(scenario()) == {"text": "xin chào"}
+
+    reopened = ResponseCache(path=str(tmp_path / "cache.sqlite3"))
+    assert reopened.variant_count(key) == 1
+
+
+def test_site_narration_from_fallback_model_is_cached(tmp_path, monkeypatch):
+    service = GeminiService()
+    service.cache = ResponseCache(path=str(tmp_path / "cache.sqlite3"))
+    calls = []
+
+    async def fallback_answer(prompt, lang):
+        calls.append(prompt)  # Giả lập model chính lỗi, model dự phòng trả lời
+        return {"text": "Tràng An là di sản kép.", "robot_move": None, "emotion": "happy"}
+    monkeypatch.setattr(service, "get_response", fallback_answer)
+
+    async def scenario():
+        first = await service.describe_site("Tràng An", "vi-VN")
+        service.primary_model = "another-model"
+        second = await service.describe_site("Tràng An", "vi-VN")
+        return first, second
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert len(calls) == 1
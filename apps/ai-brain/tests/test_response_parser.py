@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from json_stream import PartialJsonExtractor
+from response_parser import ResponseParser
+
+
+@pytest.fixture
+def parser():
+    return ResponseParser()
+
+
+def test_skips_objects_outside_schema(parser):
+    reply = parser.parse('I think {"a":1} then {"text":"x"}', strict=True)
+    assert reply["text"] == "x"
+
+
+def test_non_strict_skips_objects_outside_schema(parser):
+    assert parser.parse('I think {"a":1} then {"text":"x"}')["text"] == "x"
+
+
+def test_strict_requires_non_empty_text(parser):
+    with pytest.raises(ValueError):
+        parser.parse('{"a": 1}', strict=True)
+    with pytest.raises(ValueError):
+        parser.parse('{"text": "  ", "emotion": "happy"}', strict=True)
+
+
+def test_repairs_truncated_reply(parser):
+    reply = parser.parse('{"robot_move": "Forward", "emotion": "happy", "text": "Đi thôi', strict=True)
+    assert reply == {"text": "Đi thôi", "robot_move": "forward", "emotion": "happy"}
+    assert parser.stats["repaired"] == 1
+
+
+PROSE_THEN_JSON = ['Example {"a": 1} ok ', '{"robot_move":"forward","text":"Hello there. ', 'How are you?"}']
+
+
+def stream(chunks):
+    """Chạy stream_response trên các đoạn cho sẵn, trả về danh sách sự kiện"""
+    from gemini_service import GeminiService
+
+    async def fake_stream(model_name, contents, system=None):
+        for chunk in chunks:
+            yield chunk
+
+    async def collect():
+        service = GeminiService()
+        service.api_keys = ["test"]
+        service._generate_stream = fake_stream
+        return [event async for event in service.stream_response("hi", "en-US")]
+
+    return asyncio.run(collect())
+
+
+def test_extractor_skips_objects_outside_schema(parser):
+    extractor = PartialJsonExtractor("text", accept=parser.matches)
+    text = "".join(extractor.feed(chunk)[0] for chunk in PROSE_THEN_JSON)
+    assert text == "Hello there. How are you?"
+    assert extractor.done and extractor.fields["robot_move"] == "forward"
+    assert extractor.skipped == 1
+
+
+def test_stream_prose_then_json():
+    events = stream(PROSE_THEN_JSON)
+    assert events[0] == ("move", "forward")
+    assert " ".join(value for kind, value in events if kind == "text") == "Hello there. How are you?"
+    assert events[-1] == ("done", {"text": "Hello there. How are you?", "robot_move": "forward", "emotion": "neutral"})
+
+
+@pytest.mark.parametrize("chunks", [
+    PROSE_THEN_JSON,
+    ['```json\n{"robot_move": "Forward", "emotion": "happy", ', '"text": "Đi thôi', '"}\n```'],
+    ['{"robot_move": "backward", "text": "Lùi nhé'],   # Bị cắt giữa chừng
+    ['{"a": 1} chỉ có ví dụ'],                          # Không có đối tượng theo schema
+    ['Xin chào, tôi là robot.'],                        # Không có JSON
+])
+def test_stream_agrees_with_parse(chunks):
+    events = stream(chunks)
+    expected = ResponseParser().parse("".join(chunks))
+    assert events[-1] == ("done", expected)
+    moves = [value for kind, value in events if kind == "move"]
+    assert moves == ([expected["robot_move"]] if expected["robot_move"] else [])
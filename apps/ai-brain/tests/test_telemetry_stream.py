@@ -0,0 +1,107 @@
+import asyncio
+import json
+import telemetry_stream
+from telemetry_stream import TelemetryStream, quantize_rate
+
+
+class FakeBroadcaster:
+    def __init__(self):
+        self.sent = []   # (ws, frame đã giải mã)
+        self.accept = True
+
+    def send(self, ws, frame, kind, resync=None):
+        self.sent.append((ws, json.loads(frame)))
+        return self.accept
+
+    def frames(self, ws):
+        return [frame for target, frame in self.sent if target == ws]
+
+
+def stream(state):
+    broadcaster = FakeBroadcaster()
+    return TelemetryStream(state, broadcaster), broadcaster
+
+
+def tick(telemetry, rate_hz, now):
+    telemetry._tick(telemetry._tiers[rate_hz], now)
+
+
+def test_delta_contains_only_changed_fields():
+    state = {"battery": 80, "speed": 0, "mode": "auto"}
+    telemetry, broadcaster = stream(state)
+    telemetry.subscribe("ws", rate_hz=5, delta=True)
+    tick(telemetry, 5, 0.0)
+    state["speed"] = 40
+    tick(telemetry, 5, 0.2)
+    tick(telemetry, 5, 0.4)  # Không đổi gì: không gửi
+    first, second = broadcaster.frames("ws")
+    assert first == {"type": "telemetry", "seq": 1, "battery": 80, "speed": 0, "mode": "auto"}
+    assert second == {"type": "telemetry", "delta": True, "seq": 2, "speed": 40}
+
+
+def test_full_frame_clients_always_get_everything():
+    state = {"battery": 80, "speed": 0}
+    telemetry, broadcaster = stream(state)
+    telemetry.subscribe("legacy")
+    tick(telemetry, 1, 0.0)
+    tick(telemetry, 1, 1.0)
+    assert [f.get("battery") for f in broadcaster.frames("legacy")] == [80, 80]
+    assert all("delta" not in f for f in broadcaster.frames("legacy"))
+
+
+def test_keyframe_sent_periodically():
+    state = {"battery": 80, "speed": 0}
+    telemetry, broadcaster = stream(state)
+    telemetry.subscribe("ws", rate_hz=10, delta=True)
+    now = 0.0
+    while now < telemetry_stream.KEYFRAME_INTERVAL * 2 + 0.5:
+        state["speed"] += 1
+        tick(telemetry, 10, now)
+        now += 0.1
+    keyframes = [f["seq"] for f in broadcaster.frames("ws") if "delta" not in f]
+    assert len(keyframes) == 3  # Lúc đăng ký + mỗi KEYFRAME_INTERVAL
+    assert all("battery" in f for f in broadcaster.frames("ws") if "delta" not in f)
+
+
+def test_dropped_frame_forces_resync():
+    state = {"battery": 80, "speed": 0}
+    telemetry, broadcaster = stream(state)
+    telemetry.subscribe("ws", rate_hz=5, delta=True)
+    tick(telemetry, 5, 0.0)
+    broadcaster.accept = False
+    state["speed"] = 10
+    tick(telemetry, 5, 0.2)
+    broadcaster.accept = True
+    state["speed"] = 20
+    tick(telemetry, 5, 0.4)
+    assert "delta" not in broadcaster.frames("ws")[-1]
+    assert telemetry.stats["resyncs"] == 1
+
+
+def test_same_tier_serialises_once():
+    telemetry, broadcaster = stream({"battery": 80})
+    for ws in ("a", "b", "c"):
+        telemetry.subscribe(ws, rate_hz=2)
+    tick(telemetry, 2, 0.0)
+    assert len(broadcaster.sent) == 3 and telemetry.stats["serialized"] == 1
+
+
+def test_rates_are_quantized():
+    assert quantize_rate(7) == 5 and quantize_rate("30") == 20 and quantize_rate("fast") == 1
+
+
+def test_tiers_are_throttled_independently():
+    async def scenario():
+        telemetry, broadcaster = stream({"battery": 80})
+        telemetry.subscribe("slow", rate_hz=2)
+        telemetry.subscribe("fast", rate_hz=20)
+        task = asyncio.create_task(telemetry.run())
+        await asyncio.sleep(1.05)
+        task.cancel()
+        telemetry.unsubscribe("fast")
+        return telemetry, broadcaster
+
+    telemetry, broadcaster = asyncio.run(scenario())
+    assert 2 <= len(broadcaster.frames("slow")) <= 3
+    assert 15 <= len(broadcaster.frames("fast")) <= 22
+    assert set(telemetry._tiers) == {2}
@@ -0,0 +1,248 @@
+"""
+Vision Benchmark for WRO 2026
+Chạy các cấu hình detector trên video đã quay và cảnh tổng hợp (từ ảnh mã trong assets/markers),
+báo cáo FPS, độ trễ từng bước, recall và tỉ lệ khoá nhầm.
+
+    python vision_bench.py                                  # Chỉ cảnh tổng hợp
+    python vision_bench.py --clip run1.mp4:0 --clip empty.mp4:none --json bench.json
+"""
+import os
+import re
+import json
+import time
+import glob
+import argparse
+import numpy as np
+import cv2
+import cv2.aruco as aruco
+from marker_detector import MarkerDetector, FRAME_SIZE
+from latency_stats import LatencyHistogram
+from lock_on import LockOnStateMachine
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MARKER_DIR = os.path.join(BASE_DIR, "assets", "markers")
+# Mã js-aruco của web-app (generate_vision_markers.py) không thuộc DICT_4X4_50: dùng làm nhiễu
+DISTRACTOR_DIR = os.path.join(BASE_DIR, "..", "web-app", "public", "markers")
+BENCH_FPS = 30.0           # Thời gian giả lập của khung (cho trễ nhả khoá theo giây)
+LOCK_DEBOUNCE_FRAMES = 60  # Quy tắc khoá cũ (debounce 2 s ở 30 fps), giữ để so sánh
+
+# Cấu hình detector cần so sánh: tên -> tham số MarkerDetector
+CONFIGS = {
+    "baseline": dict(tracking=False, pyramid_scale=1.0, profile="phone_screen", adaptive=False),
+    "pyramid": dict(tracking=False, pyramid_scale=0.5, profile="phone_screen", adaptive=False),
+    "tracking": dict(tracking=True, pyramid_scale=1.0, profile="phone_screen", adaptive=False),
+    "full": dict(tracking=True, pyramid_scale=0.5, profile="phone_screen", adaptive=True),
+    "printed": dict(tracking=False, pyramid_scale=1.0, profile="printed", adaptive=False),
+    "low_light": dict(tracking=False, pyramid_scale=1.0, profile="low_light", adaptive=False),
+}
+
+
+def load_markers(directory=MARKER_DIR):
+    """{id: ảnh xám} từ marker_<id>_<tên>.png; thiếu thư mục thì sinh lại như generate_markers.py"""
+    markers = {}
+    for path in glob.glob(os.path.join(directory, "marker_*.png")):
+        match = re.match(r"marker_(\d+)_", os.path.basename(path))
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if match and image is not None:
+            markers[int(match.group(1))] = image
+    if not markers:
+        aruco_dict = aruco.getPredefinedDictionary(aruco.DICT_4X4_50)
+        markers = {i: aruco.generateImageMarker(aruco_dict, i, 400) for i in range(4)}
+    return markers
+
+
+def load_distractors(directory=DISTRACTOR_DIR):
+    images = [cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in glob.glob(os.path.join(directory, "*.png"))]
+    return [image for image in images if image is not None]
+
+
+class SceneGenerator:
+    """Sinh chuỗi khung hình robot tiến lại gần một mã: phối cảnh, blur, chói, thay đổi kích thước"""
+
+    def __init__(self, markers, distractors, seed=1):
+        self.markers = markers
+        self.distractors = distractors
+        self.rng = np.random.default_rng(seed)
+
+    def background(self):
+        w, h = FRAME_SIZE
+        base = self.rng.uniform(60, 200)
+        noise = self.rng.normal(0, 12, (h // 8, w // 8))
+        texture = cv2.resize(noise, (w, h), interpolation=cv2.INTER_CUBIC)
+        gradient = np.linspace(-30, 30, w)[None, :] * self.rng.choice([-1, 1])
+        return np.clip(base + texture + gradient, 0, 255).astype(np.uint8)
+
+    def sequence(self, frames):
+        """Trả về danh sách (khung BGR, id đúng hoặc None)"""
+        rng = self.rng
+        negative = rng.random() < 0.2  # 20% chuỗi không có mã (đo khoá nhầm)
+        marker_id = None
+        if negative:
+            image = self.distractors[rng.integers(len(self.distractors))] if self.distractors else None
+        else:
+            marker_id = int(rng.choice(list(self.markers)))
+            image = self.markers[marker_id]
+
+        background = self.background()
+        start_size, end_size = rng.uniform(25, 60), rng.uniform(120, 260)
+        start_pos = rng.uniform([60, 60], [560, 400])
+        end_pos = np.array(FRAME_SIZE) / 2 + rng.normal(0, 40, 2)
+        tilt = rng.uniform(-0.35, 0.35, 2)          # Phối cảnh (nghiêng theo x/y)
+        angle = rng.uniform(-25, 25)
+        blur = int(rng.choice([0, 0, 3, 5, 9]))
+        glare = rng.random() < 0.3
+        brightness = rng.choice([1.0, 1.0, 0.6, 0.3])
+
+        result = []
+        for i in range(frames):
+            t = i / max(frames - 1, 1)
+            frame = background.copy()
+            if image is not None:
+                size = start_size + (end_size - start_size) * t
+                center = start_pos + (end_pos - start_pos) * t + rng.normal(0, 1.5, 2)  # Rung nhẹ
+                self._paste(frame, image, center, size, angle, tilt)
+            if blur:
+                frame = cv2.blur(frame, (blur, 1))  # Blur chuyển động ngang
+            frame = frame.astype(np.float32) * brightness
+            if glare:
+                frame += self._glare(t)
+            frame = np.clip(frame + rng.normal(0, 3, frame.shape), 0, 255).astype(np.uint8)
+            result.append((cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR), marker_id))
+        return result
+
+    @staticmethod
+    def _paste(frame, image, center, size, angle, tilt):
+        # Thêm viền trắng (quiet zone) như khi in/hiển thị thật
+        pad = image.shape[0] // 6
+        padded = cv2.copyMakeBorder(image, pad, pad, pad, pad, cv2.BORDER_CONSTANT, value=255)
+        n = padded.shape[0]
+        src = np.float32([[0, 0], [n, 0], [n, n], [0, n]])
+        half = size * (1 + 2 * pad / image.shape[0]) / 2
+        square = np.float32([[-1, -1], [1, -1], [1, 1], [-1, 1]])
+        # Phối cảnh: co một cạnh theo tilt
+        square[:, 0] *= 1 + tilt[0] * square[:, 1]
+        square[:, 1] *= 1 + tilt[1] * square[:, 0]
+        theta = np.deg2rad(angle)
+        rotation = np.float32([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+        dst = (square @ rotation.T) * half + center
+        matrix = cv2.getPerspectiveTransform(src, dst.astype(np.float32))
+        h, w = frame.shape
+        warped = cv2.warpPerspective(padded, matrix, (w, h), flags=cv2.INTER_LINEAR)
+        mask = cv2.warpPerspective(np.full_like(padded, 255), matrix, (w, h))
+        np.copyto(frame, warped, where=mask > 127)
+
+    def _glare(self, t):
+        w, h = FRAME_SIZE
+        cx, cy = self.rng.uniform(0, w), self.rng.uniform(0, h)
+        y, x = np.ogrid[:h, :w]
+        radius = 80 + 80 * t
+        return 160 * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * radius ** 2))
+
+
+def load_clip(spec):
+    """'video.mp4:0' -> các khung với id đúng 0; ':none' = video không có mã"""
+    path, _, label = spec.partition(":")
+    expected = None if label in ("", "none") else int(label)
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append((frame, expected))
+    cap.release()
+    if not frames:
+        print(f"⚠️ Cannot read clip: {path}")
+    return frames
+
+
+def run_config(name, options, sequences):
+    """Chạy một cấu hình trên mọi chuỗi (detector mới cho mỗi chuỗi để tracking không rò rỉ)"""
+    prep = LatencyHistogram(buckets=(0.5, 1, 2, 4, 8, 16))
+    detect = LatencyHistogram(buckets=(1, 2, 4, 8, 16, 32, 64))
+    positives = hits = wrong_ids = 0
+    locks = false_locks = 0
+    legacy_locks = legacy_false = 0
+    total = 0.0
+    frames = 0
+    for sequence in sequences:
+        detector = MarkerDetector(**options)
+        lock_on = LockOnStateMachine()
+        last_lock, last_lock_frame = None, -LOCK_DEBOUNCE_FRAMES
+        for index, (frame, expected) in enumerate(sequence):
+            started = time.perf_counter()
+            result = detector.detect(frame)
+            detector.observe(result)
+            elapsed = (time.perf_counter() - started) * 1000
+            total += elapsed
+            frames += 1
+            prep.record(result["prep_ms"])
+            detect.record(elapsed - result["prep_ms"])
+
+            seen = [] if result["ids"] is None else [int(i[0]) for i in result["ids"]]
+            if expected is not None:
+                positives += 1
+                hits += expected in seen
+            wrong_ids += any(i != expected for i in seen)
+
+            event = lock_on.update(result["ids"], result["corners"], index / BENCH_FPS)
+            if event is not None:
+                locks += 1
+                false_locks += event["marker_id"] != expected
+
+            # Quy tắc cũ của vision_service (debounce theo khung)
+            for marker_id in seen:
+                if marker_id != last_lock or index - last_lock_frame > LOCK_DEBOUNCE_FRAMES:
+                    legacy_locks += 1
+                    legacy_false += marker_id != expected
+                    last_lock, last_lock_frame = marker_id, index
+
+    return {
+        "config": name,
+        "frames": frames,
+        "fps": round(frames / (total / 1000), 1) if total else None,
+        "prep_ms_avg": prep.snapshot()["avg_ms"],
+        "detect_ms_avg": detect.snapshot()["avg_ms"],
+        "detect_ms_p95": detect.snapshot()["p95_ms"],
+        "recall": round(hits / positives, 3) if positives else None,
+        "wrong_id_frames": wrong_ids,
+        "locks": locks,
+        "false_lock_rate": round(false_locks / locks, 3) if locks else 0.0,
+        "debounce_locks": legacy_locks,
+        "debounce_false_lock_rate": round(legacy_false / legacy_locks, 3) if legacy_locks else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the vision pipeline")
+    parser.add_argument("--sequences", type=int, default=30, help="Số chuỗi cảnh tổng hợp")
+    parser.add_argument("--frames", type=int, default=30, help="Số khung mỗi chuỗi")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--configs", default=",".join(CONFIGS), help="Danh sách cấu hình, cách nhau dấu phẩy")
+    parser.add_argument("--clip", action="append", default=[], help="video[:id|none], lặp lại được")
+    parser.add_argument("--markers", default=MARKER_DIR)
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    generator = SceneGenerator(load_markers(args.markers), load_distractors(), seed=args.seed)
+    print(f"🧪 Generating {args.sequences} synthetic sequences x {args.frames} frames...")
+    sequences = [generator.sequence(args.frames) for _ in range(args.sequences)]
+    sequences += [clip for clip in (load_clip(spec) for spec in args.clip) if clip]
+
+    results = []
+    for name in args.configs.split(","):
+        result = run_config(name, CONFIGS[name], sequences)
+        results.append(result)
+        print(f"  {name:<10} fps={result['fps']:<7} detect={result['detect_ms_avg']}ms "
+              f"(p95 {result['detect_ms_p95']}) prep={result['prep_ms_avg']}ms "
+              f"recall={result['recall']} locks={result['locks']} (debounce {result['debounce_locks']}) "
+              f"false_lock={result['false_lock_rate']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"seed": args.seed, "sequences": len(sequences), "results": results}, f, indent=2)
+        print(f"✅ Saved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+
+DEBUG_STREAM_FPS = 5        # Khung/giây gửi cho client debug (không cần mượt)
+DEBUG_JPEG_QUALITY = 60
+BOUNDARY = "frame"
+
+
+class MjpegDebugServer:
+    """Luồng MJPEG khung hình đã chú thích, chỉ vẽ/nén khi có client đang xem
+
+    Mở http://<hub>:<port>/ trong trình duyệt. render_latest() trả về khung BGR
+    (hoặc None nếu chưa có) và chỉ được gọi từ luồng của client đang kết nối.
+    """
+
+    def __init__(self, port, render_latest, fps=DEBUG_STREAM_FPS):
+        self.port = port
+        self.render_latest = render_latest
+        self.interval = 1.0 / fps
+        self.stats = {"clients": 0, "frames": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("0.0.0.0", port), self._handler())
+        self._server.daemon_threads = True
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="vision-debug", daemon=True).start()
+        print(f"🖥️ Vision debug stream: http://localhost:{self.port}/")
+
+    def stop(self):
+        self._server.shutdown()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/stream.mjpg"):
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+                self.end_headers()
+                server._stream(self.wfile)
+
+            def log_message(self, format, *args):
+                pass  # Không in log mỗi request
+
+        return Handler
+
+    def _stream(self, wfile):
+        with self._lock:
+            self.stats["clients"] += 1
+        try:
+            while True:
+                started = time.monotonic()
+                frame = self.render_latest()
+                if frame is not None:
+                    ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, DEBUG_JPEG_QUALITY])
+                    if ok:
+                        wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode())
+                        wfile.write(jpeg.tobytes())
+                        wfile.write(b"\r\n")
+                        self.stats["frames"] += 1
+                time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client đóng tab
+        finally:
+            with self._lock:
+                self.stats["clients"] -= 1
@@ -0,0 +1,179 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from latency_stats import LatencyHistogram
+
+VISION_WORKERS = int(os.getenv("VISION_WORKERS", "2"))  # Số luồng detect song song (OpenCV nhả GIL khi detect)
+VISION_STATS_INTERVAL = 5.0                              # Giây giữa các lần in thống kê
+
+
+class RateMeter:
+    """Đo tốc độ (sự kiện/giây) theo cửa sổ trượt ~1 s"""
+
+    def __init__(self):
+        self.count = 0
+        self.rate = 0.0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def tick(self):
+        self.count += 1
+        self._window_count += 1
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed >= 1.0:
+            self.rate = self._window_count / elapsed
+            self._window_start = now
+            self._window_count = 0
+
+
+class FrameGrabber:
+    """Luồng đọc camera liên tục, chỉ giữ khung hình mới nhất (khung cũ chưa xử lý bị bỏ)"""
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.fps = RateMeter()
+        self.dropped = 0
+        self.running = False
+        self._cond = threading.Condition()
+        self._latest = None  # (seq, frame, captured_at)
+        self._seq = 0
+        self._taken = 0      # seq của khung mới nhất đã được lấy đi xử lý
+        self._thread = threading.Thread(target=self._run, name="vision-capture", daemon=True)
+
+    def start(self):
+        self.running = True
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+
+    def _run(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            if not ret:
+                print("⚠️ Failed to grab frame")
+                self.stop()
+                break
+            captured_at = time.monotonic()
+            self.fps.tick()
+            with self._cond:
+                if self._taken < self._seq:
+                    self.dropped += 1  # Khung trước chưa ai lấy: bị thay
+                self._seq += 1
+                self._latest = (self._seq, frame, captured_at)
+                self._cond.notify_all()
+
+    def wait_newer(self, seq, timeout=1.0):
+        """Chờ khung hình có seq > seq; trả về (seq, frame, captured_at) hoặc None"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: not self.running or (self._latest is not None and self._latest[0] > seq),
+                timeout,
+            )
+            if self._latest is not None and self._latest[0] > seq:
+                self._taken = self._latest[0]
+                return self._latest
+            return None
+
+
+class VisionPipeline:
+    """Pipeline capture -> detect (pool) -> decision; render là tuỳ chọn và không chặn detect
+
+    detect(frame) chạy trên worker, trả về dict kết quả; on_result(result) được gọi theo
+    đúng thứ tự khung hình (kết quả cũ về muộn bị bỏ).
+    """
+
+    def __init__(self, cap, detect, on_result, workers=VISION_WORKERS):
+        self.grabber = FrameGrabber(cap)
+        self.detect = detect
+        self.on_result = on_result
+        self.workers = workers
+        self.latest = None  # Kết quả mới nhất (cho render)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vision-detect")
+        self._slots = threading.Semaphore(workers)
+        self._lock = threading.Lock()
+        self._last_seq = 0
+        self._dispatcher = threading.Thread(target=self._dispatch, name="vision-dispatch", daemon=True)
+        self.detect_fps = RateMeter()
+        self.render_fps = RateMeter()
+        self.detect_latency = LatencyHistogram(buckets=(5, 10, 20, 40, 80, 160, 320))
+        self.decision_latency = LatencyHistogram(buckets=(5, 10, 20, 40, 80, 160, 320))
+        self.stats = {"stale": 0, "errors": 0}
+        self.extra_stats = None  # Hàm trả về thống kê thêm (vd. của detector) để in cùng
+        self._stats_at = time.monotonic()
+
+    @property
+    def running(self):
+        return self.grabber.running
+
+    def start(self):
+        self.grabber.start()
+        self._dispatcher.start()
+
+    def stop(self):
+        self.grabber.stop()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _dispatch(self):
+        seq = 0
+        while self.running:
+            # Chỉ lấy khung mới khi có worker rảnh -> luôn detect khung mới nhất
+            self._slots.acquire()
+            item = self.grabber.wait_newer(seq)
+            if item is None:
+                self._slots.release()
+                continue
+            seq = item[0]
+            try:
+                self._pool.submit(self._work, *item)
+            except RuntimeError:
+                self._slots.release()  # Pool đã đóng
+                break
+
+    def _work(self, seq, frame, captured_at):
+        try:
+            started = time.monotonic()
+            result = self.detect(frame)
+            done = time.monotonic()
+            self.detect_latency.record((done - started) * 1000)
+            result.update(seq=seq, frame=frame, captured_at=captured_at)
+            with self._lock:
+                if seq <= self._last_seq:
+                    self.stats["stale"] += 1
+                    return
+                self._last_seq = seq
+                self.detect_fps.tick()
+                self.on_result(result)
+                self.latest = result
+                self.decision_latency.record((time.monotonic() - captured_at) * 1000)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"⚠️ Vision worker error: {e}")
+        finally:
+            self._slots.release()
+            self._report()
+
+    def _report(self):
+        now = time.monotonic()
+        if now - self._stats_at < VISION_STATS_INTERVAL:
+            return
+        self._stats_at = now
+        print(f"📊 Vision: {self.metrics()}")
+
+    def metrics(self):
+        detect = self.detect_latency.snapshot()
+        decision = self.decision_latency.snapshot()
+        return {
+            "capture_fps": round(self.grabber.fps.rate, 1),
+            "detect_fps": round(self.detect_fps.rate, 1),
+            "render_fps": round(self.render_fps.rate, 1),
+            "dropped_frames": self.grabber.dropped,
+            "detect_ms_avg": detect["avg_ms"], "detect_ms_p95": detect["p95_ms"],
+            "frame_to_decision_ms_avg": decision["avg_ms"], "frame_to_decision_ms_p95": decision["p95_ms"],
+            **self.stats,
+            **(self.extra_stats() if self.extra_stats else {}),
+        }
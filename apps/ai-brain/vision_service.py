@@ -1,40 +1,146 @@
 import cv2
-import cv2.aruco as aruco
 import paho.mqtt.client as mqtt
 import os
 import time
 import json
+import argparse
 from dotenv import load_dotenv
+from vision_pipeline import VisionPipeline
+from vision_debug_stream import MjpegDebugServer
+from marker_detector import MarkerDetector, camera_matrix, estimate_pose
+from lock_on import LockOnStateMachine, LOCKED
 
 # Load configurations
 load_dotenv()
 MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
 TOPIC_CMD = "wro/robot/commands"
+TOPIC_EVENTS = "wro/vision/events"  # Sự kiện có cấu trúc cho Hub (command_listener.py)
+PERSISTENCE_SECONDS = 0.3  # Giữ khung ngắm trên preview sau khi mất mã
+VISION_HEADLESS = os.getenv("VISION_HEADLESS", "0") == "1"    # Không vẽ, không cửa sổ (chạy thi đấu)
+VISION_TRACKING = os.getenv("VISION_TRACKING", "1") == "1"   # Tìm trong ROI quanh mã đã khoá
+VISION_DEBUG_PORT = int(os.getenv("VISION_DEBUG_PORT", "0"))  # >0: bật luồng MJPEG debug
+VISION_DIRECT_STOP = os.getenv("VISION_DIRECT_STOP", "0") == "1"  # Tự gửi "stop" (chạy không có Hub)
+POSE_INTERVAL = 0.2  # Giây giữa các cập nhật khoảng cách khi đang khoá mã (cho Hub điều tốc tiếp cận)
+
+SHARED_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../packages/shared-config/config.json")
+TEST_MARKER_IDS = (17, 34, 42)  # Mã thử trên bàn, không gắn di sản
+
+def load_sites(path=SHARED_CONFIG_PATH):
+    """Marker ID -> di sản, theo thứ tự heritage_info (giống generate_markers.py).
+    id/name lấy nguyên từ shared-config để Hub/web-app và cache lời kể (prewarm_narration.py) khớp."""
+    with open(path, encoding="utf-8") as f:
+        heritage = json.load(f).get("heritage_info", {})
+    sites = {
+        marker_id: {"name": site["name"], "slug": site["id"], "action": "stop"}
+        for marker_id, site in enumerate(heritage.values())
+    }
+    for marker_id in TEST_MARKER_IDS:
+        sites[marker_id] = {"name": f"Test Marker (ID {marker_id})", "slug": f"test_{marker_id}", "action": "stop"}
+    return sites
 
 # Mapping Marker IDs to Heritage Sites and Actions
-SITES = {
-    0: {"name": "Tràng An", "action": "stop"},
-    1: {"name": "Cột Cờ Kỳ Đài", "action": "stop"},
-    2: {"name": "Chùa Một Cột", "action": "stop"},
-    17: {"name": "Test Marker (ID 17)", "action": "stop"},
-    34: {"name": "Test Marker (ID 34)", "action": "stop"},
-    42: {"name": "Test Marker (ID 42)", "action": "stop"}
-}
+SITES = load_sites()
 
 # MQTT Setup
 client = mqtt.Client()
 try:
     client.connect(MQTT_BROKER, 1883, 60)
+    client.loop_start()  # Luồng nền giữ keepalive và gửi QoS 1
     print(f"✅ Connected to MQTT Broker: {MQTT_BROKER}")
 except Exception as e:
     print(f"❌ Failed to connect to MQTT: {e}")
 
+def site_name(marker_id):
+    """Tên di sản theo ID mã"""
+    return SITES[marker_id]["name"] if marker_id in SITES else f"Unknown ({marker_id})"
+
 def send_robot_command(cmd):
     """Send command to robot via MQTT"""
     client.publish(TOPIC_CMD, cmd)
     print(f"📤 Sent Command: {cmd}")
 
-def run_vision():
+def publish_vision_event(event, qos=0):
+    """Gửi sự kiện JSON cho Hub (không chặn luồng detect)"""
+    client.publish(TOPIC_EVENTS, json.dumps(event, ensure_ascii=False), qos=qos)
+
+class LockOnTracker:
+    """Quyết định dừng robot từ kết quả detect (chạy theo thứ tự khung hình)"""
+
+    def __init__(self):
+        self.lock_on = LockOnStateMachine()
+        self.camera = camera_matrix()
+        self.last_pose_at = 0
+        self.marker_corners = {}  # marker_id -> góc lần thấy gần nhất (khoá theo N-trong-M có thể rơi vào khung vắng mã)
+        # Biến cho visual persistence (giữ khung hình mượt mà)
+        self.last_seen_at = 0
+        self.last_corners = None
+        self.last_id_text = ""
+
+    def on_result(self, result):
+        ids, corners = result["ids"], result["corners"]
+        event = self.lock_on.update(ids, corners, result.get("captured_at", time.monotonic()))
+        if ids is not None:
+            self.last_seen_at = time.monotonic()
+            self.last_corners = corners[0].reshape((4, 2)).astype(int)
+            self.last_id_text = site_name(int(ids[0][0]))
+            for i in range(len(ids)):
+                self.marker_corners[int(ids[i][0])] = corners[i]
+
+        # Một sự kiện site_discovered cho mỗi lượt tiếp cận; Hub quyết định dừng/giảm tốc và kể chuyện
+        if event is not None:
+            marker_id = event["marker_id"]
+            message = {"type": "site_discovered", **self.pose_message(marker_id),
+                       "confidence": event["confidence"]}
+            print(f"🎯 LOCKED-ON [ID {marker_id}]: {site_name(marker_id)} "
+                  f"({event['votes']}/{self.lock_on.window} frames, conf {event['confidence']}, "
+                  f"{message['distance_m']} m, {message['bearing_deg']}°)")
+            publish_vision_event(message, qos=1)
+            self.last_pose_at = time.monotonic()
+            if VISION_DIRECT_STOP:
+                send_robot_command("stop")
+        elif self.lock_on.state == LOCKED and time.monotonic() - self.last_pose_at >= POSE_INTERVAL:
+            marker_id = self.lock_on.locked_id
+            if ids is not None and marker_id in ids.ravel():
+                publish_vision_event({"type": "marker_pose", **self.pose_message(marker_id)})
+                self.last_pose_at = time.monotonic()
+
+    def pose_message(self, marker_id):
+        """Trường chung của sự kiện: mã, di sản, khoảng cách/góc lệch (solvePnP), thời điểm"""
+        site = SITES.get(marker_id, {})
+        pose = estimate_pose(self.marker_corners[marker_id], self.camera)
+        return {
+            "marker_id": marker_id,
+            "site_id": site.get("slug", f"marker_{marker_id}"),
+            "site_name": site_name(marker_id),
+            "distance_m": round(pose[0], 2) if pose else None,
+            "bearing_deg": round(pose[1], 1) if pose else None,
+            "timestamp": time.time(),
+        }
+
+def render(result, tracker, pipeline):
+    """Vẽ overlay lên khung hình đã detect (chạy ở luồng chính, không chặn detect)"""
+    frame = result["view"].copy()
+
+    # Đèn trạng thái: xanh = đã khoá, vàng = thấy mã nhưng chưa đủ phiếu, đỏ = "Searching"
+    if tracker.lock_on.state == LOCKED:
+        status_color = (0, 255, 0)
+    else:
+        status_color = (0, 255, 255) if result["ids"] is not None else (0, 0, 255)
+
+    # Hiển thị PERSISTENCE (Khung hình giữ lại ~0.3 s để tránh bị nháy)
+    if tracker.last_corners is not None and time.monotonic() - tracker.last_seen_at < PERSISTENCE_SECONDS:
+        # Vẽ khung xanh bảo vệ quanh mã
+        cv2.polylines(frame, [tracker.last_corners], True, (0, 255, 0), 4)
+        # Ghi thông tin mục tiêu
+        cv2.putText(frame, f"TARGET: {tracker.last_id_text}", (10, 80), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 255), 2)
+
+    # Hiển thị FPS và Trạng thái LED (To hơn)
+    cv2.putText(frame, f"FPS: {pipeline.detect_fps.rate:.1f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    cv2.rectangle(frame, (600, 10), (630, 40), status_color, -1) 
+    return frame
+
+def run_vision(headless=VISION_HEADLESS, debug_port=VISION_DEBUG_PORT):
     # Initialize Camera
     cap = cv2.VideoCapture(0)
     if not cap.isOpened():
@@ -44,103 +150,73 @@ def run_vision():
     # TỐI ƯU 1: Cố định độ phân giải thấp để tăng tốc độ xử lý
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-
-    # ArUco Settings (Tăng độ nhạy tối đa)
-    aruco_dict = aruco.getPredefinedDictionary(aruco.DICT_4X4_50)
-    parameters = aruco.DetectorParameters()
-    
-    # TINH CHỈNH ĐỘ NHẠY: Giúp nhận diện tốt hơn trên màn hình điện thoại
-    parameters.adaptiveThreshWinSizeMin = 3
-    parameters.adaptiveThreshWinSizeMax = 23
-    parameters.adaptiveThreshWinSizeStep = 5 # Quét kỹ hơn
-    parameters.adaptiveThreshConstant = 7
-    parameters.minMarkerPerimeterRate = 0.05 # Nhận diện cả mã nhỏ/xa
-    parameters.polygonalApproxAccuracyRate = 0.05
-    
-    detector = aruco.ArucoDetector(aruco_dict, parameters)
-
-    print("👁️ The Observer is watching (Super Optimized Mode)...")
-    
-    # Khởi tạo các biến theo dõi
-    last_detected_id = -1
-    last_detection_time = 0
-    frame_count = 0
-    start_time = time.time()
-    
-    # Biến cho visual persistence (giữ khung hình mượt mà)
-    persistence_counter = 0
-    last_corners = None
-    last_id_text = ""
-
-    while True:
-        ret, original_frame = cap.read()
-        if not ret:
-            print("⚠️ Failed to grab frame")
-            break
-        
-        # Resize nhẹ để cân bằng giữa tốc độ và độ chính xác
-        frame = cv2.resize(original_frame, (640, 480))
-        
-        frame_count += 1
-        current_time = time.time()
-        fps = frame_count / (current_time - start_time) if (current_time - start_time) > 0 else 0
-
-        # Chuyển xám đơn giản (Bỏ equalizeHist vì gây lóa trên màn hình điện thoại)
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Detect ArUco markers
-        corners, ids, rejected = detector.detectMarkers(gray)
-
-        # Mặc định trạng thái "Searching"
-        status_color = (0, 0, 255) # Đỏ
-        
-        if ids is not None:
-            status_color = (0, 255, 0) # Xanh lá
-            persistence_counter = 10 # Giữ khung hình trong 10 frame tiếp theo
-            
-            for i in range(len(ids)):
-                marker_id = int(ids[i][0])
-                marker_corners = corners[i].reshape((4, 2)).astype(int)
-                last_corners = marker_corners
-                
-                # Xác định tên di sản
-                if marker_id in SITES:
-                    site_name = SITES[marker_id]['name']
-                else:
-                    site_name = f"Unknown ({marker_id})"
-                
-                last_id_text = site_name
-
-                # Logic điều khiển Robot (Debounce 2 giây)
-                if marker_id != last_detected_id or (current_time - last_detection_time > 2):
-                    print(f"🎯 LOCKED-ON [ID {marker_id}]: {site_name}")
-                    send_robot_command("stop")
-                    last_detected_id = marker_id
-                    last_detection_time = current_time
-
-        # Hiển thị PERSISTENCE (Khung hình giữ lại để tránh bị nháy)
-        if persistence_counter > 0 and last_corners is not None:
-            # Vẽ khung xanh bảo vệ quanh mã
-            cv2.polylines(frame, [last_corners], True, (0, 255, 0), 4)
-            # Ghi thông tin mục tiêu
-            cv2.putText(frame, f"TARGET: {last_id_text}", (10, 80), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 255), 2)
-            persistence_counter -= 1
-
-        # Hiển thị FPS và Trạng thái LED (To hơn)
-        cv2.putText(frame, f"FPS: {fps:.1f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        cv2.rectangle(frame, (600, 10), (630, 40), status_color, -1) 
-
-        # Show preview
-        cv2.imshow('Antigravyti - The Observer', frame)
+    # Buffer 1 khung: luôn đọc khung mới nhất, không đọc khung cũ đang xếp hàng trong driver
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    tracker = LockOnTracker()
+    detector = MarkerDetector(tracking=VISION_TRACKING)
+
+    def on_result(result):
+        detector.observe(result)  # Cập nhật ROI tracking trước khi khung sau được detect
+        tracker.on_result(result)
+
+    pipeline = VisionPipeline(cap, detector.detect, on_result)
+    pipeline.extra_stats = lambda: {**detector.metrics(), **tracker.lock_on.metrics()}
+    pipeline.start()
+
+    debug_server = None
+    if debug_port:
+        # Chỉ vẽ overlay + nén JPEG khi có người đang mở luồng debug
+        def render_latest():
+            result = pipeline.latest
+            return render(result, tracker, pipeline) if result is not None else None
+        debug_server = MjpegDebugServer(debug_port, render_latest)
+        debug_server.start()
+
+    mode = "Headless" if headless else "Preview"
+    print(f"👁️ The Observer is watching (Pipelined, {mode} Mode)...")
+
+    try:
+        if headless:
+            # Không vẽ, không imshow/waitKey: toàn bộ CPU dành cho detect và AI Bridge
+            while pipeline.running:
+                time.sleep(0.5)
+        else:
+            preview_loop(pipeline, tracker)
+    except KeyboardInterrupt:
+        print("⏹️ Stopping Vision AI...")
+    finally:
+        if debug_server:
+            debug_server.stop()
+        pipeline.stop()
+        cap.release()
+        if not headless:
+            cv2.destroyAllWindows()
+
+def preview_loop(pipeline, tracker):
+    last_rendered = 0
+    while pipeline.running:
+        result = pipeline.latest
+        if result is None or result["seq"] == last_rendered:
+            # Chưa có kết quả mới: chỉ xử lý sự kiện cửa sổ
+            key = cv2.waitKey(5)
+        else:
+            last_rendered = result["seq"]
+            # Show preview
+            cv2.imshow('Antigravyti - The Observer', render(result, tracker, pipeline))
+            pipeline.render_fps.tick()
+            key = cv2.waitKey(1)
 
         # Key to exit
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        if key & 0xFF == ord('q'):
             print("⏹️ Stopping Vision AI...")
             break
 
-    cap.release()
-    cv2.destroyAllWindows()
-
 if __name__ == "__main__":
-    run_vision()
+    parser = argparse.ArgumentParser(description="WRO 2026 - The Observer (ArUco vision)")
+    parser.add_argument("--headless", action="store_true", default=VISION_HEADLESS,
+                        help="Không mở cửa sổ preview (hoặc VISION_HEADLESS=1)")
+    parser.add_argument("--debug-port", type=int, default=VISION_DEBUG_PORT,
+                        help="Cổng HTTP cho luồng MJPEG debug, 0 = tắt (hoặc VISION_DEBUG_PORT)")
+    args = parser.parse_args()
+    run_vision(headless=args.headless, debug_port=args.debug_port)
@@ -64,8 +64,12 @@ export default function SimulatorPage() {
                 };
                 socket.onmessage = (event) => {
                     const data = JSON.parse(event.data);
-                    if (data.type === 'voice_response') {
-                        window.dispatchEvent(new CustomEvent('ai-speak', { detail: { text: data.text } }));
+                    if (data.type === 'voice_response_chunk') {
+                        window.dispatchEvent(new CustomEvent('ai-speak', { detail: { text: data.text, queue: data.seq > 0 } }));
+                    } else if (data.type === 'voice_response') {
+                        if (!data.streamed) {
+                            window.dispatchEvent(new CustomEvent('ai-speak', { detail: { text: data.text } }));
+                        }
                         addLog(`AI: ${data.text}`, 'system');
 
                         // Update history with AI response
@@ -75,7 +79,9 @@ export default function SimulatorPage() {
                         if (data.emotion) setEmotion(data.emotion);
                         setIsAITalking(true);
                         // Trigger logic that ends talking
-                        window.dispatchEvent(new CustomEvent('ai-speak', { detail: { text: data.text } }));
+                        if (!data.streamed) {
+                            window.dispatchEvent(new CustomEvent('ai-speak', { detail: { text: data.text } }));
+                        }
                     } else if (data.type === 'event' && data.event === 'site_discovered') {
                         setActiveQuizStation(data.station_id);
                         addLog(`Discovery: ${data.site_name}`, 'info');
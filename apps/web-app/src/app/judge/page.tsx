@@ -335,10 +335,17 @@ export default function JudgePage() {
                             }
                         }
                         setLatency(data.latency || 0);
+                    } else if (data.type === 'voice_response_chunk') {
+                        // Streamed answer: speak each sentence as soon as it arrives
+                        setCurrentSubtitle(prev => data.seq === 0 ? data.text : `${prev} ${data.text}`);
+                        window.dispatchEvent(new CustomEvent('ai-speak', { detail: { text: data.text, queue: data.seq > 0 } }));
                     } else if (data.type === 'voice_response') {
                         setCurrentSubtitle(data.text);
                         // Trigger TTS (VoiceAssistant will handle the 'talking' emotion update via Global Store)
-                        window.dispatchEvent(new CustomEvent('ai-speak', { detail: { text: data.text } }));
+                        // Streamed answers were already spoken chunk by chunk
+                        if (!data.streamed) {
+                            window.dispatchEvent(new CustomEvent('ai-speak', { detail: { text: data.text } }));
+                        }
                     } else if (data.type === 'event' && data.event === 'site_discovered') {
                         const siteId = data.station_id;
                         console.log("📍 Site Discovered via AI Brain:", siteId);
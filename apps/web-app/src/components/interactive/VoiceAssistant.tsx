@@ -27,6 +27,8 @@ export default function VoiceAssistant({ onCommand, lang: activeLanguage, onLang
     const inputRef = useRef<HTMLInputElement>(null);
     const { setEmotion } = useRobotEmotion();
     const utteranceRef = useRef<SpeechSynthesisUtterance | null>(null);
+    // Streamed chunks that arrive while a cancel is still settling
+    const pendingChunksRef = useRef<string[] | null>(null);
 
     // Initialize Speech Recognition
     useEffect(() => {
@@ -86,58 +88,74 @@ export default function VoiceAssistant({ onCommand, lang: activeLanguage, onLang
         window.speechSynthesis.onvoiceschanged = loadVoices;
     }, [activeLanguage]);
 
-    const speakResponse = useCallback((text: string) => {
+    // Queue one utterance behind whatever is already speaking (speechSynthesis plays them in order)
+    const enqueueUtterance = useCallback((text: string) => {
+        const utterance = new SpeechSynthesisUtterance(text);
+        utteranceRef.current = utterance;
+
+        const voice = availableVoices.find(v => v.name === selectedVoiceName) ||
+            availableVoices.find(v => v.lang.startsWith(activeLanguage.split('-')[0]));
+
+        if (voice) utterance.voice = voice;
+        utterance.lang = activeLanguage;
+        utterance.rate = 1.0;
+        utterance.pitch = 1.0;
+
+        utterance.onstart = () => {
+            setEmotion('talking');
+        };
+
+        utterance.onend = (e) => {
+            // IMPORTANT: Only dispatch 'ai-speak-end' if the speech was NOT interrupted or canceled.
+            // In most browsers, an interrupted speak will either NOT fire onend or fire it with 0 duration/charIndex.
+            // However, the most reliable way is to check if this utterance is still the current one
+            // (for streamed answers that is the last queued chunk).
+            if (utteranceRef.current === utterance) {
+                setEmotion('neutral');
+                utteranceRef.current = null;
+                console.log("✅ Speech finished naturally:", text);
+                window.dispatchEvent(new CustomEvent('ai-speak-end', { detail: { text } }));
+            }
+        };
+
+        utterance.onerror = (e) => {
+            if (e.error === 'interrupted' || e.error === 'canceled') {
+                console.log("🛑 Speech interrupted/canceled:", text);
+            } else {
+                console.error("Speech Error:", e.error);
+            }
+            if (utteranceRef.current === utterance) {
+                setEmotion('neutral');
+                utteranceRef.current = null;
+            }
+        };
+
+        window.speechSynthesis.speak(utterance);
+    }, [availableVoices, selectedVoiceName, activeLanguage, setEmotion]);
+
+    const speakResponse = useCallback((text: string, queue = false) => {
         if (!window.speechSynthesis || responseMode === 'text') return;
 
+        // Streamed chunk: append to the current answer instead of interrupting it
+        if (queue) {
+            if (pendingChunksRef.current) pendingChunksRef.current.push(text);
+            else enqueueUtterance(text);
+            return;
+        }
+
         // Force stop previous to avoid overlapping
         window.speechSynthesis.cancel();
         setEmotion('neutral');
         utteranceRef.current = null;
+        pendingChunksRef.current = [text];
 
         // Small timeout to let cancel finish and NOT trigger event handlers for new one early
         setTimeout(() => {
-            const utterance = new SpeechSynthesisUtterance(text);
-            utteranceRef.current = utterance;
-
-            const voice = availableVoices.find(v => v.name === selectedVoiceName) ||
-                availableVoices.find(v => v.lang.startsWith(activeLanguage.split('-')[0]));
-
-            if (voice) utterance.voice = voice;
-            utterance.lang = activeLanguage;
-            utterance.rate = 1.0;
-            utterance.pitch = 1.0;
-
-            utterance.onstart = () => {
-                setEmotion('talking');
-            };
-
-            utterance.onend = (e) => {
-                // IMPORTANT: Only dispatch 'ai-speak-end' if the speech was NOT interrupted or canceled.
-                // In most browsers, an interrupted speak will either NOT fire onend or fire it with 0 duration/charIndex.
-                // However, the most reliable way is to check if this utterance is still the current one.
-                if (utteranceRef.current === utterance) {
-                    setEmotion('neutral');
-                    utteranceRef.current = null;
-                    console.log("✅ Speech finished naturally:", text);
-                    window.dispatchEvent(new CustomEvent('ai-speak-end', { detail: { text } }));
-                }
-            };
-
-            utterance.onerror = (e) => {
-                if (e.error === 'interrupted' || e.error === 'canceled') {
-                    console.log("🛑 Speech interrupted/canceled:", text);
-                } else {
-                    console.error("Speech Error:", e.error);
-                }
-                if (utteranceRef.current === utterance) {
-                    setEmotion('neutral');
-                    utteranceRef.current = null;
-                }
-            };
-
-            window.speechSynthesis.speak(utterance);
+            const chunks = pendingChunksRef.current || [];
+            pendingChunksRef.current = null;
+            chunks.forEach(enqueueUtterance);
         }, 100);
-    }, [availableVoices, selectedVoiceName, activeLanguage, responseMode, setEmotion]);
+    }, [enqueueUtterance, responseMode, setEmotion]);
 
     const toggleListening = () => {
         if (window.speechSynthesis) {
@@ -177,13 +195,14 @@ export default function VoiceAssistant({ onCommand, lang: activeLanguage, onLang
 
     useEffect(() => {
         const handleAiSpeak = (e: any) => {
-            const { text, action } = e.detail;
+            const { text, action, queue } = e.detail;
             if (action === 'stop') {
+                pendingChunksRef.current = null;
                 window.speechSynthesis.cancel();
                 setEmotion('neutral');
                 return;
             }
-            if (text) speakResponse(text);
+            if (text) speakResponse(text, !!queue);
         };
 
         window.addEventListener('ai-speak', handleAiSpeak);
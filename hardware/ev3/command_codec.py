@@ -0,0 +1,127 @@
+# Codec lệnh dùng chung cho AI Brain Hub (CPython) và EV3 (Pybricks MicroPython)
+# Giữ cú pháp tương thích MicroPython: không f-string, không typing/dataclass.
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+DIRECTIONS = ("forward", "backward", "left", "right", "stop")
+AUX_PORTS = ("aux1", "aux2")
+UNITS = ("rotations", "degrees")
+
+# Bảng lệnh: tên -> (opcode, các trường (tên, kiểu, mặc định, ràng buộc))
+#   enum : ràng buộc là tuple giá trị hợp lệ, mã hoá nhị phân bằng chỉ số (1 byte)
+#   int  : ràng buộc là (min, max), giá trị bị kẹp vào khoảng (int16)
+#   float: ràng buộc là (min, max), giá trị bị kẹp vào khoảng (float32)
+COMMANDS = {
+    "move": (1, (
+        ("direction", "enum", "stop", DIRECTIONS),
+        ("speed", "int", 100, (0, 100)),
+    )),
+    "aux_move": (2, (
+        ("port", "enum", "aux1", AUX_PORTS),
+        ("value", "float", 0, (-10000, 10000)),
+        ("unit", "enum", "rotations", UNITS),
+    )),
+    "stop": (3, ()),
+    "emergency": (4, ()),
+}
+
+BINARY_MAGIC = 0xA5
+_STRUCT_CODES = {"enum": "B", "int": "h", "float": "f"}
+
+
+class CommandError(ValueError):
+    pass
+
+
+def _compile():
+    by_opcode = {}
+    formats = {}
+    for name in COMMANDS:
+        opcode, fields = COMMANDS[name]
+        by_opcode[opcode] = name
+        formats[name] = ">BB" + "".join(_STRUCT_CODES[f[1]] for f in fields)
+    return by_opcode, formats
+
+
+# Tính sẵn một lần lúc import (EV3 không phải dựng lại mỗi lệnh)
+_BY_OPCODE, _FORMATS = _compile()
+
+
+def _coerce(field, value):
+    name, kind, default, rule = field
+    if value is None:
+        value = default
+    if kind == "enum":
+        if value not in rule:
+            raise CommandError("{}: invalid value {!r}".format(name, value))
+        return value
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise CommandError("{}: not a number {!r}".format(name, value))
+    value = min(max(value, rule[0]), rule[1])
+    return int(value) if kind == "int" else value
+
+
+def normalize(command, params=None):
+    """Kiểm tra + chuẩn hoá tham số theo bảng lệnh, trả về tuple giá trị theo thứ tự trường"""
+    spec = COMMANDS.get(command)
+    if spec is None:
+        raise CommandError("unknown command {!r}".format(command))
+    params = params or {}
+    return tuple(_coerce(field, params.get(field[0])) for field in spec[1])
+
+
+def encode(command, params=None, binary=False):
+    """Mã hoá lệnh: dạng chữ 'move:forward:100' (mặc định) hoặc khung nhị phân cố định"""
+    values = normalize(command, params)
+    if binary:
+        fields = COMMANDS[command][1]
+        packed = [fields[i][3].index(v) if fields[i][1] == "enum" else v for i, v in enumerate(values)]
+        return struct.pack(_FORMATS[command], BINARY_MAGIC, COMMANDS[command][0], *packed)
+    if not values:
+        return command
+    return ":".join([command] + ["{}".format(v) for v in values])
+
+
+def decode(payload):
+    """Giải mã payload (str hoặc bytes) -> (command, values). Lệnh không thuộc bảng -> (None, ())"""
+    if isinstance(payload, (bytes, bytearray)):
+        if payload and payload[0] == BINARY_MAGIC:
+            return _decode_binary(payload)
+        try:
+            payload = payload.decode("utf-8")
+        except UnicodeError:
+            raise CommandError("bad text frame")
+
+    parts = payload.split(":")
+    command = parts[0]
+    spec = COMMANDS.get(command)
+    if spec is None:
+        return None, ()
+    fields = spec[1]
+    if len(parts) - 1 != len(fields):
+        raise CommandError("{}: expected {} fields".format(command, len(fields)))
+    return command, tuple(_coerce(fields[i], parts[i + 1]) for i in range(len(fields)))
+
+
+def _decode_binary(payload):
+    if len(payload) < 2 or payload[1] not in _BY_OPCODE:
+        raise CommandError("bad binary frame")
+    command = _BY_OPCODE[payload[1]]
+    fields = COMMANDS[command][1]
+    try:
+        raw = struct.unpack(_FORMATS[command], payload)[2:]
+    except Exception:
+        raise CommandError("{}: bad frame length".format(command))
+    values = []
+    for i in range(len(fields)):
+        if fields[i][1] == "enum":
+            if raw[i] >= len(fields[i][3]):
+                raise CommandError("{}: enum index out of range".format(fields[i][0]))
+            values.append(fields[i][3][raw[i]])
+        else:
+            values.append(raw[i])
+    return command, tuple(values)
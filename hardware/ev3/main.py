@@ -6,6 +6,7 @@ from pybricks.robotics import DriveBase
 from umqtt.robust import MQTTClient
 import time
 import json
+import command_codec
 
 # --- KHỞI TẠO CƠ BẢN ---
 ev3 = EV3Brick()
@@ -133,7 +134,7 @@ def init_hardware(config):
             
             ev3.screen.print("✅ HW Ready")
             print("🤖 Robot Profile: {}".format(config.get('name', 'Unknown')))
-            return # Thành công!
+            return True # Thành công!
             
         except Exception as e:
             print("Init Attempt {} Failed: {}".format(attempt + 1, e))
@@ -141,13 +142,15 @@ def init_hardware(config):
             if attempt == 2:
                 ev3.screen.print("❌ HW Error")
 
-# Biến tránh spam lệnh
-last_payload = ""
+# Biến tránh spam lệnh (so sánh bytes thô, áp dụng cho cả khung nhị phân)
+last_payload = b""
+# Cấu hình phần cứng đang áp dụng (bỏ qua config trùng để không dừng motor giữa chừng)
+applied_config = None
 
 def stop_robot():
     """Dừng robot ngay lập tức (Hard Brake) - Tối ưu tốc độ phản hồi"""
     global robot, motors, last_payload
-    last_payload = "" 
+    last_payload = b"" 
     try:
         if robot:
             robot.stop()
@@ -162,29 +165,31 @@ def stop_robot():
         pass
 
 def on_message(topic, msg):
-    global robot, motors, last_payload
+    global robot, motors, last_payload, applied_config
     try:
         topic_str = topic.decode("utf-8")
-        payload = msg.decode("utf-8")
         
         # Chặn lệnh lặp lại quá nhanh (Spam)
-        if payload == last_payload:
+        if msg == last_payload:
             return
-        last_payload = payload
+        last_payload = msg
         
         if topic_str == TOPIC_CFG:
             # Nhận cấu hình mới
-            config = json.loads(payload)
-            init_hardware(config)
+            config = json.loads(msg.decode("utf-8"))
+            if config == applied_config:
+                print("⚙️ Config unchanged, skip re-init")
+                return
+            if init_hardware(config):
+                applied_config = config
             
         elif topic_str == TOPIC_CMD:
-            # print("📩 CMD:", payload) # Uncomment nếu cần debug lệnh
-            parts = payload.split(":")
-            action = parts[0]
+            # print("📩 CMD:", msg) # Uncomment nếu cần debug lệnh
+            # Codec dùng chung với Hub: nhận cả dạng chữ "move:forward:100" lẫn khung nhị phân
+            action, args = command_codec.decode(msg)
             
             if action == "move" and robot:
-                direction = parts[1]
-                speed_pct = int(parts[2])
+                direction, speed_pct = args
                 
                 # Tỉ lệ quy đổi: 100% = 600 mm/s (tốc độ chạy thẳng nhanh hơn)
                 linear_speed = (speed_pct / 100.0) * 600
@@ -198,9 +203,7 @@ def on_message(topic, msg):
                 elif direction == "stop": stop_robot()
                 
             elif action == "aux_move":
-                port_key = parts[1]
-                value = float(parts[2])
-                unit = parts[3]
+                port_key, value, unit = args
                 
                 if port_key in motors:
                     motor = motors[port_key]